@@ -32,7 +32,6 @@ The data structure needs to be:
 # Import python libs
 from __future__ import print_function
 import os
-import glob
 import time
 import copy
 import getpass
@@ -41,6 +40,7 @@ from datetime import datetime
 
 # Import salt libs
 import salt.config
+import salt.loader
 import salt.payload
 import salt.transport
 import salt.utils
@@ -48,6 +48,7 @@ import salt.utils.verify
 import salt.utils.event
 import salt.utils.minions
 import salt.syspaths as syspaths
+from salt.utils.event import tagify
 from salt.exceptions import (
     EauthAuthenticationError, SaltInvocationError, SaltReqTimeoutError
 )
@@ -136,7 +137,9 @@ class LocalClient(object):
         self.event = salt.utils.event.get_event(
                 'master',
                 self.opts['sock_dir'],
-                self.opts['transport'])
+                self.opts['transport'],
+                shards=self.opts.get('master_event_shards'))
+        self.returners = None
 
     def __read_master_key(self):
         '''
@@ -217,6 +220,7 @@ class LocalClient(object):
                                 arg=arg,
                                 expr_form=tgt_type,
                                 timeout=timeout,
+                                listen=True,
                                 **kwargs)
 
         if not pub_data:
@@ -228,6 +232,17 @@ class LocalClient(object):
                                 minions,
                                 self._get_timeout(timeout))
 
+    def _job_cache(self, fun):
+        '''
+        Return the named function of the master job cache, the returners are
+        only loaded once the job cache is first needed
+        '''
+        if self.returners is None:
+            self.returners = salt.loader.returners(
+                    self.opts, {}, whitelist=[self.opts['master_job_cache']])
+        return self.returners[
+                '{0}.{1}'.format(self.opts['master_job_cache'], fun)]
+
     def _check_pub_data(self, pub_data):
         '''
         Common checks on the pub_data data structure returned from running pub
@@ -266,12 +281,17 @@ class LocalClient(object):
             ret='',
             timeout=None,
             kwarg=None,
+            listen=False,
             **kwargs):
         '''
         Asynchronously send a command to connected minions
 
         Prep the job directory and publish a command to any targeted minions.
 
+        :param listen: Subscribe to the events of the job for one of the
+            ``get_*returns`` methods to wait on its returns, they unsubscribe
+            once they are done.
+
         :return: A dictionary of (validated) ``pub_data`` or an empty
             dictionary on failure. The ``pub_data`` contains the job ID and a
             list of all minions that are expected to return data.
@@ -284,8 +304,10 @@ class LocalClient(object):
         arg = condition_kwarg(arg, kwarg)
         jid = ''
 
-        # Subscribe to all events and subscribe as early as possible
-        self.event.subscribe(jid)
+        # Subscribe to all events and subscribe as early as possible, once
+        # the jid is known only the events of the job are received, the
+        # waiters on the returns unsubscribe once they are done
+        listen_all = listen and self.event.subscribe(jid)
 
         pub_data = self.pub(
             tgt,
@@ -297,7 +319,18 @@ class LocalClient(object):
             timeout=self._get_timeout(timeout),
             **kwargs)
 
-        return self._check_pub_data(pub_data)
+        job_tag = None
+        if listen_all:
+            if pub_data and pub_data.get('jid') not in (None, '0'):
+                job_tag = tagify([pub_data['jid']], 'job')
+                self.event.subscribe(job_tag)
+            self.event.unsubscribe(jid)
+
+        ret = self._check_pub_data(pub_data)
+        if not ret and job_tag is not None:
+            # Nothing waits on a job which was not sent
+            self.event.unsubscribe(job_tag)
+        return ret
 
     def cmd_async(
             self,
@@ -538,6 +571,7 @@ class LocalClient(object):
                                 expr_form,
                                 ret,
                                 timeout,
+                                listen=True,
                                 **kwargs)
 
         if not pub_data:
@@ -576,6 +610,7 @@ class LocalClient(object):
             expr_form,
             ret,
             timeout,
+            listen=True,
             **kwargs)
 
         if not pub_data:
@@ -638,6 +673,7 @@ class LocalClient(object):
             expr_form,
             ret,
             timeout,
+            listen=True,
             **kwargs)
 
         if not pub_data:
@@ -691,6 +727,7 @@ class LocalClient(object):
             expr_form,
             ret,
             timeout,
+            listen=True,
             **kwargs)
 
         if not pub_data:
@@ -725,6 +762,7 @@ class LocalClient(object):
             expr_form,
             ret,
             timeout,
+            listen=True,
             **kwargs)
 
         if not pub_data:
@@ -751,96 +789,95 @@ class LocalClient(object):
 
         :returns: all of the information for the JID
         '''
+        if not isinstance(minions, set):
+            if isinstance(minions, basestring):
+                minions = set([minions])
+            elif isinstance(minions, (list, tuple)):
+                minions = set(list(minions))
+
         if verbose:
             msg = 'Executing job with jid {0}'.format(jid)
             print(msg)
             print('-' * len(msg) + '\n')
         if timeout is None:
             timeout = self.opts['timeout']
-        fret = {}
         inc_timeout = timeout
-        jid_dir = salt.utils.jid_dir(jid,
-                                     self.opts['cachedir'],
-                                     self.opts['hash_type'])
         start = int(time.time())
         found = set()
-        wtag = os.path.join(jid_dir, 'wtag*')
         # Check to see if the jid is real, if not return the empty dict
-        if not os.path.isdir(jid_dir):
+        if not self._job_cache('get_load')(jid):
             yield {}
+        cache_read = False
         last_time = False
-        # Wait for the hosts to check in
-        while True:
-            for fn_ in os.listdir(jid_dir):
-                ret = {}
-                if fn_.startswith('.'):
-                    continue
-                if fn_ not in found:
-                    retp = os.path.join(jid_dir, fn_, 'return.p')
-                    outp = os.path.join(jid_dir, fn_, 'out.p')
-                    if not os.path.isfile(retp):
+        tag = tagify([jid], 'job')
+        self.event.subscribe(tag)
+        try:
+            # Wait for the hosts to check in
+            while True:
+                # Wait 0 == forever, use a minimum of 1s
+                wait = max(1, start + timeout - int(time.time()))
+                if not cache_read:
+                    wait = 1
+                raw = self.event.get_event(wait, tag)
+                if raw is not None:
+                    if 'minions' in raw.get('data', {}):
+                        minions.update(raw['data']['minions'])
                         continue
-                    while fn_ not in ret:
-                        try:
-                            check = True
-                            ret_data = self.serial.load(
-                                salt.utils.fopen(retp, 'rb')
-                            )
-                            if ret_data is None:
-                                # Sometimes the ret data is read at the wrong
-                                # time and returns None, do a quick re-read
-                                if check:
-                                    continue
-                            ret[fn_] = {'ret': ret_data}
-                            if os.path.isfile(outp):
-                                ret[fn_]['out'] = self.serial.load(
-                                    salt.utils.fopen(outp, 'rb')
-                                )
-                        except Exception:
-                            pass
-                    found.add(fn_)
-                    fret.update(ret)
+                    if 'syndic' in raw:
+                        minions.update(raw['syndic'])
+                        continue
+                    if 'return' not in raw or raw['id'] in found:
+                        continue
+                    found.add(raw['id'])
+                    ret = {raw['id']: {'ret': raw['return']}}
+                    if 'out' in raw:
+                        ret[raw['id']]['out'] = raw['out']
                     yield ret
-            if glob.glob(wtag) and int(time.time()) <= start + timeout + 1:
-                # The timeout +1 has not been reached and there is still a
-                # write tag for the syndic
-                continue
-            if len(found.intersection(minions)) >= len(minions):
-                # All minions have returned, break out of the loop
-                break
-            if last_time:
-                if verbose:
-                    if self.opts.get('minion_data_cache', False) \
-                            or tgt_type in ('glob', 'pcre', 'list'):
-                        if len(found.intersection(minions)) >= len(minions):
-                            fail = sorted(list(minions.difference(found)))
-                            for minion in fail:
-                                yield({
-                                    minion: {
-                                        'out': 'no_return',
-                                        'ret': 'Minion did not return'
-                                    }
-                                })
-                break
-            if int(time.time()) > start + timeout:
-                # The timeout has been reached, check the jid to see if the
-                # timeout needs to be increased
-                jinfo = self.gather_job_info(jid, tgt, tgt_type, minions - found, **kwargs)
-                more_time = False
-                for id_ in jinfo:
-                    if jinfo[id_]:
-                        if verbose:
-                            print(
-                                'Execution is still running on {0}'.format(id_)
-                            )
-                        more_time = True
-                if more_time:
-                    timeout += inc_timeout
-                    continue
-                else:
-                    last_time = True
+                    if len(found.intersection(minions)) >= len(minions):
+                        # All minions have returned, break out of the loop
+                        break
                     continue
-            time.sleep(0.01)
+                if not cache_read:
+                    cache_read = True
+                    for id_, data in self._get_missed_returns(jid, found).items():
+                        yield {id_: data}
+                if len(found.intersection(minions)) >= len(minions):
+                    # All minions have returned, break out of the loop
+                    break
+                if last_time:
+                    if verbose:
+                        if self.opts.get('minion_data_cache', False) \
+                                or tgt_type in ('glob', 'pcre', 'list'):
+                            if len(found) < len(minions):
+                                fail = sorted(list(minions.difference(found)))
+                                for minion in fail:
+                                    yield({
+                                        minion: {
+                                            'out': 'no_return',
+                                            'ret': 'Minion did not return'
+                                        }
+                                    })
+                    break
+                if int(time.time()) > start + timeout:
+                    # The timeout has been reached, check the jid to see if the
+                    # timeout needs to be increased
+                    jinfo = self.gather_job_info(jid, tgt, tgt_type, minions - found, **kwargs)
+                    more_time = False
+                    for id_ in jinfo:
+                        if jinfo[id_]:
+                            if verbose:
+                                print(
+                                    'Execution is still running on {0}'.format(id_)
+                                )
+                            more_time = True
+                    if more_time:
+                        timeout += inc_timeout
+                        continue
+                    else:
+                        last_time = True
+                        continue
+        finally:
+            self.event.unsubscribe(tag)
 
     def get_iter_returns(
             self,
@@ -863,98 +900,96 @@ class LocalClient(object):
 
         if timeout is None:
             timeout = self.opts['timeout']
-        jid_dir = salt.utils.jid_dir(jid,
-                                     self.opts['cachedir'],
-                                     self.opts['hash_type'])
         start = int(time.time())
         timeout_at = start + timeout
         found = set()
-        wtag = os.path.join(jid_dir, 'wtag*')
         # Check to see if the jid is real, if not return the empty dict
-        if not os.path.isdir(jid_dir):
+        if not self._job_cache('get_load')(jid):
             yield {}
-        # Wait for the hosts to check in
-        syndic_wait = 0
-        last_time = False
-        log.debug("get_iter_returns for jid %s sent to %s will timeout at %s",
-                  jid, minions, datetime.fromtimestamp(timeout_at).time())
-        while True:
-            # Process events until timeout is reached or all minions have returned
-            time_left = timeout_at - int(time.time())
-            # Wait 0 == forever, use a minimum of 1s
-            wait = max(1, time_left)
-            raw = self.event.get_event(wait, jid)
-            if raw is None:
-                if len(found.intersection(minions)) >= len(minions):
-                    # All minions have returned, break out of the loop
-                    log.debug('jid %s found all minions %s', jid, found)
-                    if self.opts['order_masters']:
-                        if syndic_wait < self.opts.get('syndic_wait', 1):
-                            syndic_wait += 1
-                            timeout_at = int(time.time()) + 1
-                            log.debug('jid %s syndic_wait %s will now timeout at %s',
-                                      jid, syndic_wait, datetime.fromtimestamp(timeout_at).time())
-                            continue
-                    break
-            else:
-                if 'minions' in raw.get('data', {}):
-                    minions.update(raw['data']['minions'])
-                    continue
-                if 'syndic' in raw:
-                    minions.update(raw['syndic'])
-                    continue
-                if 'return' not in raw:
-                    continue
-                if kwargs.get('raw', False):
-                    found.add(raw['id'])
-                    yield raw
+        tag = tagify([jid], 'job')
+        self.event.subscribe(tag)
+        try:
+            # Wait for the hosts to check in
+            syndic_wait = 0
+            cache_read = False
+            last_time = False
+            log.debug("get_iter_returns for jid %s sent to %s will timeout at %s",
+                      jid, minions, datetime.fromtimestamp(timeout_at).time())
+            while True:
+                # Process events until timeout is reached or all minions have returned
+                time_left = timeout_at - int(time.time())
+                # Wait 0 == forever, use a minimum of 1s
+                wait = max(1, time_left)
+                if not cache_read:
+                    wait = 1
+                raw = self.event.get_event(wait, tag)
+                if raw is None and not cache_read:
+                    cache_read = True
+                    for id_, data in self._get_missed_returns(jid, found).items():
+                        log.debug('jid %s cached return from %s', jid, id_)
+                        if kwargs.get('raw', False):
+                            yield {'jid': jid,
+                                   'id': id_,
+                                   'return': data['ret'],
+                                   'out': data.get('out')}
+                        else:
+                            yield {id_: data}
+                if raw is None:
+                    if len(found.intersection(minions)) >= len(minions):
+                        # All minions have returned, break out of the loop
+                        log.debug('jid %s found all minions %s', jid, found)
+                        if self.opts['order_masters']:
+                            if syndic_wait < self.opts.get('syndic_wait', 1):
+                                syndic_wait += 1
+                                timeout_at = int(time.time()) + 1
+                                log.debug('jid %s syndic_wait %s will now timeout at %s',
+                                          jid, syndic_wait, datetime.fromtimestamp(timeout_at).time())
+                                continue
+                        break
                 else:
-                    found.add(raw['id'])
-                    ret = {raw['id']: {'ret': raw['return']}}
-                    if 'out' in raw:
-                        ret[raw['id']]['out'] = raw['out']
-                    log.debug('jid %s return from %s', jid, raw['id'])
-                    yield ret
-
-                continue
-            # Then event system timeout was reached and nothing was returned
-            if len(found.intersection(minions)) >= len(minions):
-                # All minions have returned, break out of the loop
-                log.debug('jid %s found all minions %s', jid, found)
-                if self.opts['order_masters']:
-                    if syndic_wait < self.opts.get('syndic_wait', 1):
-                        syndic_wait += 1
-                        timeout_at = int(time.time()) + 1
-                        log.debug('jid %s syndic_wait %s will now timeout at %s',
-                                  jid, syndic_wait, datetime.fromtimestamp(timeout_at).time())
+                    if 'minions' in raw.get('data', {}):
+                        minions.update(raw['data']['minions'])
                         continue
-                break
-            if glob.glob(wtag) and int(time.time()) <= timeout_at + 1:
-                # The timeout +1 has not been reached and there is still a
-                # write tag for the syndic
-                continue
-            if last_time:
-                if len(found) < len(minions):
-                    log.info('jid %s minions %s did not return in time',
-                             jid, (minions - found))
-                break
-            if int(time.time()) > timeout_at:
-                # The timeout has been reached, check the jid to see if the
-                # timeout needs to be increased
-                jinfo = self.gather_job_info(jid, tgt, tgt_type, minions - found, **kwargs)
-                still_running = [id_ for id_, jdat in jinfo.iteritems()
-                                 if jdat
-                                 ]
-                if still_running:
-                    timeout_at = int(time.time()) + timeout
-                    log.debug('jid %s still running on %s will now timeout at %s',
-                              jid, still_running, datetime.fromtimestamp(timeout_at).time())
-                    continue
-                else:
-                    last_time = True
-                    log.debug('jid %s not running on any minions last time', jid)
+                    if 'syndic' in raw:
+                        minions.update(raw['syndic'])
+                        continue
+                    if 'return' not in raw or raw['id'] in found:
+                        continue
+                    if kwargs.get('raw', False):
+                        found.add(raw['id'])
+                        yield raw
+                    else:
+                        found.add(raw['id'])
+                        ret = {raw['id']: {'ret': raw['return']}}
+                        if 'out' in raw:
+                            ret[raw['id']]['out'] = raw['out']
+                        log.debug('jid %s return from %s', jid, raw['id'])
+                        yield ret
+
                     continue
-            time.sleep(0.01)
+                if last_time:
+                    if len(found) < len(minions):
+                        log.info('jid %s minions %s did not return in time',
+                                 jid, (minions - found))
+                    break
+                if int(time.time()) > timeout_at:
+                    # The timeout has been reached, check the jid to see if the
+                    # timeout needs to be increased
+                    jinfo = self.gather_job_info(jid, tgt, tgt_type, minions - found, **kwargs)
+                    still_running = [id_ for id_, jdat in jinfo.iteritems()
+                                     if jdat
+                                     ]
+                    if still_running:
+                        timeout_at = int(time.time()) + timeout
+                        log.debug('jid %s still running on %s will now timeout at %s',
+                                  jid, still_running, datetime.fromtimestamp(timeout_at).time())
+                        continue
+                    else:
+                        last_time = True
+                        log.debug('jid %s not running on any minions last time', jid)
+                        continue
+        finally:
+            self.event.unsubscribe(tag)
 
     def get_returns(
             self,
@@ -967,9 +1002,6 @@ class LocalClient(object):
         minions = set(minions)
         if timeout is None:
             timeout = self.opts['timeout']
-        jid_dir = salt.utils.jid_dir(jid,
-                                     self.opts['cachedir'],
-                                     self.opts['hash_type'])
         start = int(time.time())
         timeout_at = start + timeout
         log.debug("get_returns for jid %s sent to %s will timeout at %s",
@@ -977,16 +1009,20 @@ class LocalClient(object):
 
         found = set()
         ret = {}
-        wtag = os.path.join(jid_dir, 'wtag*')
         # Check to see if the jid is real, if not return the empty dict
-        if not os.path.isdir(jid_dir):
-            log.warning("jid_dir (%s) does not exist", jid_dir)
+        if not self._job_cache('get_load')(jid):
+            log.warning("jid %s is not in the job cache", jid)
             return ret
+        cache_read = False
+        tag = tagify([jid], 'job')
+        self.event.subscribe(tag)
         # Wait for the hosts to check in
         while True:
             time_left = timeout_at - int(time.time())
             wait = max(1, time_left)
-            raw = self.event.get_event(wait, jid)
+            if not cache_read:
+                wait = 1
+            raw = self.event.get_event(wait, tag)
             if raw is not None and 'return' in raw:
                 found.add(raw['id'])
                 ret[raw['id']] = raw['return']
@@ -995,20 +1031,20 @@ class LocalClient(object):
                     log.debug("jid %s found all minions", jid)
                     break
                 continue
+            if raw is None and not cache_read:
+                cache_read = True
+                for id_, data in self._get_missed_returns(jid, found).items():
+                    ret[id_] = data['ret']
             # Then event system timeout was reached and nothing was returned
             if len(found.intersection(minions)) >= len(minions):
                 # All minions have returned, break out of the loop
                 log.debug("jid %s found all minions", jid)
                 break
-            if glob.glob(wtag) and int(time.time()) <= timeout_at + 1:
-                # The timeout +1 has not been reached and there is still a
-                # write tag for the syndic
-                continue
             if int(time.time()) > timeout_at:
                 log.info('jid %s minions %s did not return in time',
                          jid, (minions - found))
                 break
-            time.sleep(0.01)
+        self.event.unsubscribe(tag)
         return ret
 
     def get_full_returns(self, jid, minions, timeout=None):
@@ -1018,86 +1054,64 @@ class LocalClient(object):
         '''
         if timeout is None:
             timeout = self.opts['timeout']
-        jid_dir = salt.utils.jid_dir(jid,
-                                     self.opts['cachedir'],
-                                     self.opts['hash_type'])
-        start = 999999999999
-        gstart = int(time.time())
         ret = {}
-        wtag = os.path.join(jid_dir, 'wtag*')
         # Check to see if the jid is real, if not return the empty dict
-        if not os.path.isdir(jid_dir):
+        if not self._job_cache('get_load')(jid):
             return ret
+        # Listen before reading the cache so no return falls in between
+        tag = tagify([jid], 'job')
+        self.event.subscribe(tag)
+        ret.update(self.get_cache_returns(jid))
+        timeout_at = time.time() + timeout
         # Wait for the hosts to check in
-        while True:
-            for fn_ in os.listdir(jid_dir):
-                if fn_.startswith('.'):
-                    continue
-                if fn_ not in ret:
-                    retp = os.path.join(jid_dir, fn_, 'return.p')
-                    outp = os.path.join(jid_dir, fn_, 'out.p')
-                    if not os.path.isfile(retp):
-                        continue
-                    while fn_ not in ret:
-                        try:
-                            ret_data = self.serial.load(
-                                salt.utils.fopen(retp, 'rb'))
-                            ret[fn_] = {'ret': ret_data}
-                            if os.path.isfile(outp):
-                                ret[fn_]['out'] = self.serial.load(
-                                    salt.utils.fopen(outp, 'rb'))
-                        except Exception:
-                            pass
-            if ret and start == 999999999999:
-                start = int(time.time())
-            if glob.glob(wtag) and int(time.time()) <= start + timeout + 1:
-                # The timeout +1 has not been reached and there is still a
-                # write tag for the syndic
+        while len(set(ret.keys()).intersection(minions)) < len(minions):
+            time_left = timeout_at - time.time()
+            if time_left <= 0:
+                # No minions have replied within the specified timeout
+                break
+            raw = self.event.get_event(time_left, tag)
+            if raw is None:
+                break
+            if 'return' not in raw:
                 continue
-            if len(set(ret.keys()).intersection(minions)) >= len(minions):
-                return ret
-            if int(time.time()) > start + timeout:
-                return ret
-            if int(time.time()) > gstart + timeout and not ret:
-                # No minions have replied within the specified global timeout,
-                # return an empty dict
-                return ret
-            time.sleep(0.02)
+            if not ret:
+                # The timeout starts over once the first minion returned
+                timeout_at = time.time() + timeout
+            ret[raw['id']] = {'ret': raw['return']}
+            if 'out' in raw:
+                ret[raw['id']]['out'] = raw['out']
+        self.event.unsubscribe(tag)
+        return ret
+
+    def _get_missed_returns(self, jid, found):
+        '''
+        Read the job cache once for the returns which were fired on the event
+        bus before this client was listening, they are added to found
+        '''
+        ret = {}
+        for id_, data in self.get_cache_returns(jid).items():
+            if id_ not in found:
+                found.add(id_)
+                ret[id_] = data
+        return ret
 
     def get_cache_returns(self, jid):
         '''
         Execute a single pass to gather the contents of the job cache
         '''
         ret = {}
-        jid_dir = salt.utils.jid_dir(jid,
-                                     self.opts['cachedir'],
-                                     self.opts['hash_type'])
-        # If someone asks for the cache returns before we created them, we don't
-        # want to explode
-        try:
-            for fn_ in os.listdir(jid_dir):
-                if fn_.startswith('.'):
-                    continue
-                if fn_ not in ret:
-                    retp = os.path.join(jid_dir, fn_, 'return.p')
-                    outp = os.path.join(jid_dir, fn_, 'out.p')
-                    if not os.path.isfile(retp):
-                        continue
-                    while fn_ not in ret:
-                        try:
-                            ret_data = self.serial.load(
-                                salt.utils.fopen(retp, 'rb'))
-                            ret[fn_] = {'ret': ret_data}
-                            if os.path.isfile(outp):
-                                ret[fn_]['out'] = self.serial.load(
-                                    salt.utils.fopen(outp, 'rb'))
-                        except Exception:
-                            pass
-        except IOError:
-            pass
-
+        for fn_, data in self._job_cache('get_jid')(jid).items():
+            ret[fn_] = {'ret': data['return']}
+            if 'out' in data:
+                ret[fn_]['out'] = data['out']
         return ret
 
+    def get_cache_load(self, jid):
+        '''
+        Return the load of a job from the job cache
+        '''
+        return self._job_cache('get_load')(jid)
+
     def get_cli_static_event_returns(
             self,
             jid,
@@ -1116,24 +1130,22 @@ class LocalClient(object):
             print('-' * len(msg) + '\n')
         if timeout is None:
             timeout = self.opts['timeout']
-        jid_dir = salt.utils.jid_dir(jid,
-                                     self.opts['cachedir'],
-                                     self.opts['hash_type'])
         start = int(time.time())
         timeout_at = start + timeout
         found = set()
         ret = {}
-        wtag = os.path.join(jid_dir, 'wtag*')
         # Check to see if the jid is real, if not return the empty dict
-        if not os.path.isdir(jid_dir):
+        if not self._job_cache('get_load')(jid):
             return ret
+        tag = tagify([jid], 'job')
+        self.event.subscribe(tag)
         # Wait for the hosts to check in
         while True:
             # Process events until timeout is reached or all minions have returned
             time_left = timeout_at - int(time.time())
             # Wait 0 == forever, use a minimum of 1s
             wait = max(1, time_left)
-            raw = self.event.get_event(wait, jid)
+            raw = self.event.get_event(wait, tag)
             if raw is not None and 'return' in raw:
                 if 'minions' in raw.get('data', {}):
                     minions.update(raw['data']['minions'])
@@ -1151,10 +1163,6 @@ class LocalClient(object):
             if len(found.intersection(minions)) >= len(minions):
                 # All minions have returned, break out of the loop
                 break
-            if glob.glob(wtag) and int(time.time()) <= timeout_at + 1:
-                # The timeout +1 has not been reached and there is still a
-                # write tag for the syndic
-                continue
             if int(time.time()) > timeout_at:
                 if verbose:
                     if self.opts.get('minion_data_cache', False) \
@@ -1168,6 +1176,7 @@ class LocalClient(object):
                                 }
                 break
             time.sleep(0.01)
+        self.event.unsubscribe(tag)
         return ret
 
     def get_cli_event_returns(
@@ -1195,39 +1204,48 @@ class LocalClient(object):
             print('-' * len(msg) + '\n')
         if timeout is None:
             timeout = self.opts['timeout']
-        jid_dir = salt.utils.jid_dir(jid,
-                                     self.opts['cachedir'],
-                                     self.opts['hash_type'])
         start = time.time()
         timeout_at = start + timeout
         found = set()
-        wtag = os.path.join(jid_dir, 'wtag*')
         # Check to see if the jid is real, if not return the empty dict
-        if not os.path.isdir(jid_dir):
+        if not self._job_cache('get_load')(jid):
             yield {}
-        # Wait for the hosts to check in
-        syndic_wait = 0
-        last_time = False
-        while True:
-            # Process events until timeout is reached or all minions have returned
-            time_left = timeout_at - time.time()
-            # Wait 0 == forever, use a minimum of 1s
-            wait = max(1, time_left)
-            raw = self.event.get_event(wait, jid)
-            if raw is not None:
-                if 'minions' in raw.get('data', {}):
-                    minions.update(raw['data']['minions'])
-                    continue
-                if 'syndic' in raw:
-                    minions.update(raw['syndic'])
-                    continue
-                if 'return' not in raw:
+        tag = tagify([jid], 'job')
+        self.event.subscribe(tag)
+        try:
+            # Wait for the hosts to check in
+            syndic_wait = 0
+            last_time = False
+            while True:
+                # Process events until timeout is reached or all minions have returned
+                time_left = timeout_at - time.time()
+                # Wait 0 == forever, use a minimum of 1s
+                wait = max(1, time_left)
+                raw = self.event.get_event(wait, tag)
+                if raw is not None:
+                    if 'minions' in raw.get('data', {}):
+                        minions.update(raw['data']['minions'])
+                        continue
+                    if 'syndic' in raw:
+                        minions.update(raw['syndic'])
+                        continue
+                    if 'return' not in raw:
+                        continue
+                    found.add(raw.get('id'))
+                    ret = {raw['id']: {'ret': raw['return']}}
+                    if 'out' in raw:
+                        ret[raw['id']]['out'] = raw['out']
+                    yield ret
+                    if len(found.intersection(minions)) >= len(minions):
+                        # All minions have returned, break out of the loop
+                        if self.opts['order_masters']:
+                            if syndic_wait < self.opts.get('syndic_wait', 1):
+                                syndic_wait += 1
+                                timeout_at = time.time() + 1
+                                continue
+                        break
                     continue
-                found.add(raw.get('id'))
-                ret = {raw['id']: {'ret': raw['return']}}
-                if 'out' in raw:
-                    ret[raw['id']]['out'] = raw['out']
-                yield ret
+                # Then event system timeout was reached and nothing was returned
                 if len(found.intersection(minions)) >= len(minions):
                     # All minions have returned, break out of the loop
                     if self.opts['order_masters']:
@@ -1236,52 +1254,40 @@ class LocalClient(object):
                             timeout_at = time.time() + 1
                             continue
                     break
-                continue
-            # Then event system timeout was reached and nothing was returned
-            if len(found.intersection(minions)) >= len(minions):
-                # All minions have returned, break out of the loop
-                if self.opts['order_masters']:
-                    if syndic_wait < self.opts.get('syndic_wait', 1):
-                        syndic_wait += 1
-                        timeout_at = time.time() + 1
+                if last_time:
+                    if verbose or show_timeout:
+                        if self.opts.get('minion_data_cache', False) \
+                                or tgt_type in ('glob', 'pcre', 'list'):
+                            if len(found) < len(minions):
+                                fail = sorted(list(minions.difference(found)))
+                                for minion in fail:
+                                    yield({
+                                        minion: {
+                                            'out': 'no_return',
+                                            'ret': 'Minion did not return'
+                                        }
+                                    })
+                    break
+                if time.time() > timeout_at:
+                    # The timeout has been reached, check the jid to see if the
+                    # timeout needs to be increased
+                    jinfo = self.gather_job_info(jid, tgt, tgt_type, minions - found, **kwargs)
+                    more_time = False
+                    for id_ in jinfo:
+                        if jinfo[id_]:
+                            if verbose:
+                                print(
+                                    'Execution is still running on {0}'.format(id_)
+                                )
+                            more_time = True
+                    if more_time:
+                        timeout_at = time.time() + timeout
                         continue
-                break
-            if glob.glob(wtag) and time.time() <= timeout_at + 1:
-                # The timeout +1 has not been reached and there is still a
-                # write tag for the syndic
-                continue
-            if last_time:
-                if verbose or show_timeout:
-                    if self.opts.get('minion_data_cache', False) \
-                            or tgt_type in ('glob', 'pcre', 'list'):
-                        if len(found) < len(minions):
-                            fail = sorted(list(minions.difference(found)))
-                            for minion in fail:
-                                yield({
-                                    minion: {
-                                        'out': 'no_return',
-                                        'ret': 'Minion did not return'
-                                    }
-                                })
-                break
-            if time.time() > timeout_at:
-                # The timeout has been reached, check the jid to see if the
-                # timeout needs to be increased
-                jinfo = self.gather_job_info(jid, tgt, tgt_type, minions - found, **kwargs)
-                more_time = False
-                for id_ in jinfo:
-                    if jinfo[id_]:
-                        if verbose:
-                            print(
-                                'Execution is still running on {0}'.format(id_)
-                            )
-                        more_time = True
-                if more_time:
-                    timeout_at = time.time() + timeout
-                    continue
-                else:
-                    last_time = True
-            time.sleep(0.01)
+                    else:
+                        last_time = True
+                time.sleep(0.01)
+        finally:
+            self.event.unsubscribe(tag)
 
     def get_event_iter_returns(self, jid, minions, timeout=None):
         '''
@@ -1290,27 +1296,31 @@ class LocalClient(object):
         '''
         if timeout is None:
             timeout = self.opts['timeout']
-        jid_dir = salt.utils.jid_dir(jid,
-                                     self.opts['cachedir'],
-                                     self.opts['hash_type'])
         found = set()
         # Check to see if the jid is real, if not return the empty dict
-        if not os.path.isdir(jid_dir):
+        if not self._job_cache('get_load')(jid):
             yield {}
-        # Wait for the hosts to check in
-        while True:
-            raw = self.event.get_event(timeout)
-            if raw is None:
-                # Timeout reached
-                break
-            if 'minions' in raw.get('data', {}):
-                continue
-            found.add(raw['id'])
-            ret = {raw['id']: {'ret': raw['return']}}
-            if 'out' in raw:
-                ret[raw['id']]['out'] = raw['out']
-            yield ret
-            time.sleep(0.02)
+        tag = tagify([jid], 'job')
+        self.event.subscribe(tag)
+        try:
+            # Wait for the hosts to check in
+            while True:
+                raw = self.event.get_event(timeout, tag)
+                if raw is None:
+                    # Timeout reached
+                    break
+                if 'minions' in raw.get('data', {}):
+                    continue
+                if 'return' not in raw:
+                    continue
+                found.add(raw['id'])
+                ret = {raw['id']: {'ret': raw['return']}}
+                if 'out' in raw:
+                    ret[raw['id']]['out'] = raw['out']
+                yield ret
+                time.sleep(0.02)
+        finally:
+            self.event.unsubscribe(tag)
 
     def _prep_pub(self,
                   tgt,
@@ -87,10 +87,18 @@ VALID_OPTS = {
     'clean_dynamic_modules': bool,
     'open_mode': bool,
     'multiprocessing': bool,
+    'minion_workers': int,
+    'minion_worker_queue': int,
+    'minion_worker_timeout': int,
+    'minion_worker_recycle': int,
+    'return_batch_delay': float,
     'mine_interval': int,
     'ipc_mode': str,
     'ipv6': bool,
     'file_buffer_size': int,
+    'file_transfer_window': int,
+    'file_blobs': bool,
+    'file_delta_max_size': int,
     'tcp_pub_port': int,
     'tcp_pull_port': int,
     'log_file': str,
@@ -103,10 +111,14 @@ VALID_OPTS = {
     'log_granular_levels': dict,
     'test': bool,
     'cython_enable': bool,
+    'lazy_loader': bool,
+    'virtual_cache': bool,
     'state_verbose': bool,
     'state_output': str,
     'state_auto_order': bool,
     'state_events': bool,
+    'state_workers': int,
+    'state_render_cache': bool,
     'acceptance_wait_time': float,
     'acceptance_wait_time_max': float,
     'loop_interval': float,
@@ -130,8 +142,16 @@ VALID_OPTS = {
     'tcp_keepalive_intvl': float,
     'interface': str,
     'publish_port': int,
+    'zmq_filtering': bool,
     'auth_mode': int,
+    'auth_rate_limit': int,
     'worker_threads': int,
+    'slow_worker_threads': int,
+    'slow_worker_cmds': list,
+    'slow_worker_timeout': int,
+    'master_stats': bool,
+    'master_stats_event_iter': int,
+    'master_event_shards': list,
     'ret_port': int,
     'keep_jobs': int,
     'master_roots': dict,
@@ -155,6 +175,9 @@ VALID_OPTS = {
     'ext_pillar': list,
     'pillar_version': int,
     'pillar_opts': bool,
+    'pillar_cache': bool,
+    'pillar_cache_ttl': int,
+    'pillar_cache_events': list,
     'peer': dict,
     'syndic_master': str,
     'runner_dirs': list,
@@ -169,15 +192,18 @@ VALID_OPTS = {
     'fileserver_followsymlinks': bool,
     'fileserver_ignoresymlinks': bool,
     'fileserver_limit_traversal': bool,
+    'fileserver_watch': bool,
     'max_open_files': int,
     'auto_accept': bool,
     'master_tops': bool,
     'order_masters': bool,
     'job_cache': bool,
     'ext_job_cache': str,
+    'master_job_cache': str,
     'master_ext_job_cache': str,
     'minion_data_cache': bool,
     'publish_session': int,
+    'publish_session_rollover': int,
     'reactor': list,
     'reactor_refresh_interval': int,
     'serial': str,
@@ -261,10 +287,17 @@ DEFAULT_MINION_OPTS = {
     'open_mode': False,
     'auto_accept': True,
     'multiprocessing': True,
+    'minion_workers': 0,
+    'minion_worker_queue': 100,
+    'minion_worker_timeout': 0,
+    'minion_worker_recycle': 1000,
+    'return_batch_delay': 0,
     'mine_interval': 60,
     'ipc_mode': 'ipc',
     'ipv6': False,
     'file_buffer_size': 262144,
+    'file_transfer_window': 4,
+    'file_blobs': False,
     'tcp_pub_port': 4510,
     'tcp_pull_port': 4511,
     'log_file': os.path.join(salt.syspaths.LOGS_DIR, 'minion'),
@@ -278,10 +311,14 @@ DEFAULT_MINION_OPTS = {
     'test': False,
     'ext_job_cache': '',
     'cython_enable': False,
+    'lazy_loader': False,
+    'virtual_cache': False,
     'state_verbose': True,
     'state_output': 'full',
     'state_auto_order': True,
     'state_events': True,
+    'state_workers': 1,
+    'state_render_cache': False,
     'acceptance_wait_time': 10,
     'acceptance_wait_time_max': 0,
     'loop_interval': 1,
@@ -303,6 +340,7 @@ DEFAULT_MINION_OPTS = {
     'tcp_keepalive_idle': 300,
     'tcp_keepalive_cnt': -1,
     'tcp_keepalive_intvl': -1,
+    'zmq_filtering': False,
     'modules_max_memory': -1,
     'grains_refresh_every': 0,
     'minion_id_caching': True,
@@ -321,10 +359,18 @@ DEFAULT_MASTER_OPTS = {
     'interface': '0.0.0.0',
     'publish_port': '4505',
     'pub_hwm': 1000,
+    'zmq_filtering': False,
     'auth_mode': 1,
+    'auth_rate_limit': 0,
     'user': 'root',
     'worker_threads': 5,
+    'slow_worker_threads': 0,
+    'slow_worker_cmds': ['_pillar', '_ext_nodes', '_mine_get'],
+    'slow_worker_timeout': 7200,
+    'master_stats': False,
+    'master_stats_event_iter': 60,
     'sock_dir': os.path.join(salt.syspaths.SOCK_DIR, 'master'),
+    'master_event_shards': [],
     'ret_port': '4506',
     'timeout': 5,
     'keep_jobs': 24,
@@ -360,6 +406,9 @@ DEFAULT_MASTER_OPTS = {
     'ext_pillar': [],
     'pillar_version': 2,
     'pillar_opts': True,
+    'pillar_cache': False,
+    'pillar_cache_ttl': 3600,
+    'pillar_cache_events': [],
     'peer': {},
     'syndic_master': '',
     'runner_dirs': [],
@@ -370,12 +419,14 @@ DEFAULT_MASTER_OPTS = {
     'token_expire': 43200,
     'file_recv': False,
     'file_buffer_size': 1048576,
+    'file_delta_max_size': 4194304,
     'file_ignore_regex': None,
     'file_ignore_glob': None,
     'fileserver_backend': ['roots'],
     'fileserver_followsymlinks': True,
     'fileserver_ignoresymlinks': False,
     'fileserver_limit_traversal': False,
+    'fileserver_watch': False,
     'max_open_files': 100000,
     'hash_type': 'md5',
     'conf_file': os.path.join(salt.syspaths.CONFIG_DIR, 'master'),
@@ -389,6 +440,7 @@ DEFAULT_MASTER_OPTS = {
     'order_masters': False,
     'job_cache': True,
     'ext_job_cache': '',
+    'master_job_cache': 'local_cache',
     'master_ext_job_cache': '',
     'minion_data_cache': True,
     'enforce_mine_cache': False,
@@ -403,6 +455,7 @@ DEFAULT_MASTER_OPTS = {
     'log_granular_levels': {},
     'pidfile': os.path.join(salt.syspaths.PIDFILE_DIR, 'salt-master.pid'),
     'publish_session': 86400,
+    'publish_session_rollover': 120,
     'cluster_masters': [],
     'cluster_mode': 'paranoid',
     'range_server': 'range:80',
@@ -418,6 +471,8 @@ DEFAULT_MASTER_OPTS = {
     'loop_interval': 60,
     'nodegroups': {},
     'cython_enable': False,
+    'lazy_loader': False,
+    'virtual_cache': False,
     'enable_gpu_grains': False,
     # XXX: Remove 'key_logfile' support in 2014.1.0
     'key_logfile': os.path.join(salt.syspaths.LOGS_DIR, 'key'),
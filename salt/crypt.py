@@ -33,13 +33,32 @@ from salt.exceptions import (
 
 log = logging.getLogger(__name__)
 
+try:
+    # Compare the signatures in constant time in C
+    from hmac import compare_digest
+except ImportError:
+    # Python < 2.7.7
+    def compare_digest(a, b):
+        '''
+        Compare two strings in constant time
+        '''
+        if len(a) != len(b):
+            return False
+        result = 0
+        for zipped_x, zipped_y in zip(a, b):
+            result |= ord(zipped_x) ^ ord(zipped_y)
+        return result == 0
+
 
-def dropfile(cachedir, user=None):
+def dropfile(cachedir, user=None, aes=None, name='.dfn'):
     '''
-    Set an aes dropfile to update the publish session key
+    Set an aes dropfile to update the publish session key, return the key.
+
+    The .dfn_next dropfile holds the key announced to the minions during a key
+    rollover, writing a new .dfn key aborts the rollover.
     '''
     dfnt = os.path.join(cachedir, '.dfnt')
-    dfn = os.path.join(cachedir, '.dfn')
+    dfn = os.path.join(cachedir, name)
 
     def ready():
         '''
@@ -68,7 +87,8 @@ def dropfile(cachedir, user=None):
         log.warning('Waiting before writing {0}'.format(dfn))
         time.sleep(1)
 
-    aes = Crypticle.generate_key_string()
+    if aes is None:
+        aes = Crypticle.generate_key_string()
     mask = os.umask(191)
     with salt.utils.fopen(dfnt, 'w+') as fp_:
         fp_.write(aes)
@@ -77,11 +97,20 @@ def dropfile(cachedir, user=None):
             import pwd
             uid = pwd.getpwnam(user).pw_uid
             os.chown(dfnt, uid, -1)
-            shutil.move(dfnt, dfn)
         except (KeyError, ImportError, OSError, IOError):
             pass
+    try:
+        shutil.move(dfnt, dfn)
+    except (OSError, IOError):
+        pass
+    if name == '.dfn':
+        try:
+            os.remove(os.path.join(cachedir, '.dfn_next'))
+        except OSError:
+            pass
 
     os.umask(mask)
+    return aes
 
 
 def gen_keys(keydir, keyname, keysize, user=None):
@@ -368,6 +397,15 @@ class Auth(object):
                         'clean out the keys. The Salt Minion will now exit.'
                     )
                     sys.exit(0)
+                elif payload['load'].get('defer'):
+                    log.info(
+                        'The Salt Master is busy authenticating other '
+                        'minions, this salt minion will wait for {0} seconds '
+                        'before attempting to re-authenticate'.format(
+                            self.opts['acceptance_wait_time']
+                        )
+                    )
+                    return 'defer'
                 else:
                     log.error(
                         'The Salt Master has cached the public key for this '
@@ -427,11 +465,17 @@ class Crypticle(object):
     PICKLE_PAD = 'pickle::'
     AES_BLOCK_SIZE = 16
     SIG_SIZE = hashlib.sha256().digest_size
+    # The keys announced to replace a key, every crypticle of the process
+    # with the old key rolls over to the new one
+    ROLLOVERS = {}
 
     def __init__(self, opts, key_string, key_size=192):
+        self.key_string = key_string
         self.keys = self.extract_keys(key_string, key_size)
         self.key_size = key_size
         self.serial = salt.payload.Serial(opts)
+        # The keys only used to decrypt, during a key rollover
+        self.decrypt_keys = []
 
     @classmethod
     def generate_key_string(cls, key_size=192):
@@ -444,57 +488,89 @@ class Crypticle(object):
         assert len(key) == key_size / 8 + cls.SIG_SIZE, 'invalid key'
         return key[:-cls.SIG_SIZE], key[-cls.SIG_SIZE:]
 
-    def encrypt(self, data):
+    def accept(self, key_string):
+        '''
+        Also decrypt the data encrypted with the key announced to replace the
+        current key
+        '''
+        self.decrypt_keys = [self.extract_keys(key_string, self.key_size)]
+
+    def rollover(self, key_string):
+        '''
+        Encrypt with the announced key from now on, the data encrypted with
+        the current key is still decrypted until the next rollover
+        '''
+        self.ROLLOVERS[self.key_string] = key_string
+        self._roll()
+
+    def _roll(self):
+        while self.key_string in self.ROLLOVERS:
+            self.decrypt_keys = [self.keys]
+            self.key_string = self.ROLLOVERS[self.key_string]
+            self.keys = self.extract_keys(self.key_string, self.key_size)
+
+    def encrypt(self, data, prefix=''):
         '''
         encrypt data with AES-CBC and sign it with HMAC-SHA256
         '''
+        self._roll()
         aes_key, hmac_key = self.keys
-        pad = self.AES_BLOCK_SIZE - len(data) % self.AES_BLOCK_SIZE
-        data = data + pad * chr(pad)
+        pad = self.AES_BLOCK_SIZE - \
+            (len(prefix) + len(data)) % self.AES_BLOCK_SIZE
+        # The prefix and the padding are added with a single copy of the data
+        data = ''.join((prefix, data, pad * chr(pad)))
         iv_bytes = os.urandom(self.AES_BLOCK_SIZE)
         cypher = AES.new(aes_key, AES.MODE_CBC, iv_bytes)
-        data = iv_bytes + cypher.encrypt(data)
-        sig = hmac.new(hmac_key, data, hashlib.sha256).digest()
-        return data + sig
+        data = cypher.encrypt(data)
+        mac = hmac.new(hmac_key, iv_bytes, hashlib.sha256)
+        mac.update(data)
+        return ''.join((iv_bytes, data, mac.digest()))
 
-    def decrypt(self, data):
+    def _decrypt(self, data):
         '''
-        verify HMAC-SHA256 signature and decrypt data with AES-CBC
+        Verify the HMAC-SHA256 signature and return the padded decrypted data
         '''
-        aes_key, hmac_key = self.keys
-        sig = data[-self.SIG_SIZE:]
-        data = data[:-self.SIG_SIZE]
-        mac_bytes = hmac.new(hmac_key, data, hashlib.sha256).digest()
-        if len(mac_bytes) != len(sig):
+        self._roll()
+        if len(data) < self.AES_BLOCK_SIZE + self.SIG_SIZE:
             log.debug('Failed to authenticate message')
             raise AuthenticationError('message authentication failed')
-        result = 0
-        for zipped_x, zipped_y in zip(mac_bytes, sig):
-            result |= ord(zipped_x) ^ ord(zipped_y)
-        if result != 0:
+        sig = data[-self.SIG_SIZE:]
+        # Sign the data without copying it
+        signed = buffer(data, 0, len(data) - self.SIG_SIZE)
+        for aes_key, hmac_key in [self.keys] + self.decrypt_keys:
+            mac_bytes = hmac.new(hmac_key, signed, hashlib.sha256).digest()
+            if compare_digest(mac_bytes, sig):
+                break
+        else:
             log.debug('Failed to authenticate message')
             raise AuthenticationError('message authentication failed')
-        iv_bytes = data[:self.AES_BLOCK_SIZE]
-        data = data[self.AES_BLOCK_SIZE:]
-        cypher = AES.new(aes_key, AES.MODE_CBC, iv_bytes)
-        data = cypher.decrypt(data)
+        cypher = AES.new(aes_key, AES.MODE_CBC, data[:self.AES_BLOCK_SIZE])
+        return cypher.decrypt(data[self.AES_BLOCK_SIZE:-self.SIG_SIZE])
+
+    def decrypt(self, data):
+        '''
+        verify HMAC-SHA256 signature and decrypt data with AES-CBC
+        '''
+        data = self._decrypt(data)
         return data[:-ord(data[-1])]
 
     def dumps(self, obj):
         '''
         Serialize and encrypt a python object
         '''
-        return self.encrypt(self.PICKLE_PAD + self.serial.dumps(obj))
+        return self.encrypt(self.serial.dumps(obj), prefix=self.PICKLE_PAD)
 
     def loads(self, data):
         '''
         Decrypt and un-serialize a python object
         '''
-        data = self.decrypt(data)
+        data = self._decrypt(data)
         # simple integrity check to verify that we got meaningful data
         if not data.startswith(self.PICKLE_PAD):
             return {}
-        return self.serial.loads(data[len(self.PICKLE_PAD):])
+        # Strip the prefix and the padding with a single copy
+        return self.serial.loads(
+            data[len(self.PICKLE_PAD):-ord(data[-1])])
 
 
 class SAuth(Auth):
@@ -518,6 +594,11 @@ class SAuth(Auth):
                 self.opts['auth_timeout'],
                 self.opts.get('_safe_auth', True)
             )
+            if creds == 'defer':
+                # The master is over its auth_rate_limit, salt-call waits its
+                # turn as well
+                time.sleep(self.opts['acceptance_wait_time'])
+                continue
             if creds == 'retry':
                 if self.opts.get('caller'):
                     print('Minion failed to authenticate with the master, '
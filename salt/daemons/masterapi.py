@@ -9,8 +9,6 @@ import os
 import re
 import logging
 import getpass
-import shutil
-import datetime
 try:
     import pwd
 except ImportError:
@@ -22,6 +20,7 @@ except ImportError:
 import salt.crypt
 import salt.utils
 import salt.client
+import salt.loader
 import salt.payload
 import salt.pillar
 import salt.state
@@ -33,7 +32,6 @@ import salt.search
 import salt.key
 import salt.fileserver
 import salt.transport.table
-import salt.utils.atomicfile
 import salt.utils.event
 import salt.utils.verify
 import salt.utils.minions
@@ -67,30 +65,21 @@ def master_keys(opts):
             serial='msgpack')
 
 
-def clean_old_jobs(opts):
+def clean_old_jobs(opts, returners=None):
     '''
     Clean out the old jobs from the job cache
     '''
-    if opts['keep_jobs'] != 0:
-        jid_root = os.path.join(opts['cachedir'], 'jobs')
-        cur = '{0:%Y%m%d%H}'.format(datetime.datetime.now())
-
-        if os.path.exists(jid_root):
-            for top in os.listdir(jid_root):
-                t_path = os.path.join(jid_root, top)
-                for final in os.listdir(t_path):
-                    f_path = os.path.join(t_path, final)
-                    jid_file = os.path.join(f_path, 'jid')
-                    if not os.path.isfile(jid_file):
-                        continue
-                    with salt.utils.fopen(jid_file, 'r') as fn_:
-                        jid = fn_.read()
-                    if len(jid) < 18:
-                        # Invalid jid, scrub the dir
-                        shutil.rmtree(f_path)
-                    elif int(cur) - int(jid[:10]) > \
-                            opts['keep_jobs']:
-                        shutil.rmtree(f_path)
+    if returners is None:
+        returners = salt.loader.returners(
+                opts, {}, whitelist=[opts['master_job_cache']])
+    fstr = '{0}.clean_old_jobs'.format(opts['master_job_cache'])
+    try:
+        returners[fstr]()
+    except KeyError:
+        log.critical(
+            'The master job cache "{0}" does not have a clean_old_jobs '
+            'function!'.format(opts['master_job_cache'])
+        )
 
 
 def access_keys(opts):
@@ -180,6 +169,10 @@ class RemoteFuncs(object):
                 self.opts,
                 states=False,
                 rend=False)
+        # Keep the compiled pillar data in memory
+        self.pillar_cache = None
+        if self.opts['pillar_cache']:
+            self.pillar_cache = salt.pillar.PillarCache(self.opts)
         self.__setup_fileserver()
 
     def __setup_fileserver(self):
@@ -188,7 +181,10 @@ class RemoteFuncs(object):
         '''
         fs_ = salt.fileserver.Fileserver(self.opts)
         self._serve_file = fs_.serve_file
+        self._serve_files = fs_.serve_files
         self._file_hash = fs_.file_hash
+        self._file_hashes = fs_.file_hashes
+        self._file_delta = fs_.file_delta
         self._file_list = fs_.file_list
         self._file_list_emptydirs = fs_.file_list_emptydirs
         self._dir_list = fs_.dir_list
@@ -406,25 +402,26 @@ class RemoteFuncs(object):
         '''
         if any(key not in load for key in ('id', 'grains')):
             return False
-        pillar = salt.pillar.Pillar(
-                self.opts,
-                load['grains'],
-                load['id'],
-                load.get('saltenv', load.get('env')),
-                load.get('ext'),
-                self.mminion.functions)
-        data = pillar.compile_pillar()
+        saltenv = load.get('saltenv', load.get('env'))
+        data = None
+        if self.pillar_cache is not None:
+            key = self.pillar_cache.key(
+                    load['id'], load['grains'], saltenv, load.get('ext'))
+            data = self.pillar_cache.get(key)
+        if data is None:
+            pillar = salt.pillar.Pillar(
+                    self.opts,
+                    load['grains'],
+                    load['id'],
+                    saltenv,
+                    load.get('ext'),
+                    self.mminion.functions,
+                    cache=self.pillar_cache)
+            data = pillar.compile_pillar()
+            if self.pillar_cache is not None:
+                self.pillar_cache.set(key, data)
         if self.opts.get('minion_data_cache', False):
-            cdir = os.path.join(self.opts['cachedir'], 'minions', load['id'])
-            if not os.path.isdir(cdir):
-                os.makedirs(cdir)
-            datap = os.path.join(cdir, 'data.p')
-            with salt.utils.fopen(datap, 'w+b') as fp_:
-                fp_.write(
-                        self.serial.dumps(
-                            {'grains': load['grains'],
-                             'pillar': data})
-                            )
+            self.ckminions.registry.store(load['id'], load['grains'], data)
         return data
 
     def _minion_event(self, load):
@@ -455,64 +452,32 @@ class RemoteFuncs(object):
             return False
         if load['jid'] == 'req':
         # The minion is returning a standalone job, request a jobid
-            load['jid'] = salt.utils.prep_jid(
-                    self.opts['cachedir'],
-                    self.opts['hash_type'],
-                    load.get('nocache', False))
-        log.info('Got return from {id} for job {jid}'.format(**load))
-        self.event.fire_event(load, load['jid'])  # old dup event
-        self.event.fire_event(load, tagify([load['jid'], 'ret', load['id']], 'job'))
-        self.event.fire_ret_load(load)
+            load['jid'] = self.__job_cache('prep_jid')(
+                    nocache=load.get('nocache', False))
+        self.__fire_return(load)
         if self.opts['master_ext_job_cache']:
             fstr = '{0}.returner'.format(self.opts['master_ext_job_cache'])
             self.mminion.returners[fstr](load)
             return
         if not self.opts['job_cache'] or self.opts.get('ext_job_cache'):
             return
-        jid_dir = salt.utils.jid_dir(
-                load['jid'],
-                self.opts['cachedir'],
-                self.opts['hash_type']
-                )
-        if not os.path.isdir(jid_dir):
-            log.error(
-                'An inconsistency occurred, a job was received with a job id '
-                'that is not present on the master: {jid}'.format(**load)
-            )
-            return False
-        if os.path.exists(os.path.join(jid_dir, 'nocache')):
-            return
-        hn_dir = os.path.join(jid_dir, load['id'])
-        if not os.path.isdir(hn_dir):
-            os.makedirs(hn_dir)
-        # Otherwise the minion has already returned this jid and it should
-        # be dropped
-        else:
-            log.error(
-                'An extra return was detected from minion {0}, please verify '
-                'the minion, this could be a replay attack'.format(
-                    load['id']
-                )
-            )
-            return False
+        return self.__job_cache('returner')(load)
 
-        self.serial.dump(
-            load['return'],
-            # Use atomic open here to avoid the file being read before it's
-            # completely written to. Refs #1935
-            salt.utils.atomicfile.atomic_open(
-                os.path.join(hn_dir, 'return.p'), 'w+b'
-            )
-        )
-        if 'out' in load:
-            self.serial.dump(
-                load['out'],
-                # Use atomic open here to avoid the file being read before
-                # it's completely written to. Refs #1935
-                salt.utils.atomicfile.atomic_open(
-                    os.path.join(hn_dir, 'out.p'), 'w+b'
-                )
-            )
+    def __fire_return(self, load):
+        '''
+        Announce a minion return on the event bus
+        '''
+        log.info('Got return from {id} for job {jid}'.format(**load))
+        self.event.fire_event(load, load['jid'])  # old dup event
+        self.event.fire_event(load, tagify([load['jid'], 'ret', load['id']], 'job'))
+        self.event.fire_ret_load(load)
+
+    def __job_cache(self, fun):
+        '''
+        Return the named function of the master job cache
+        '''
+        return self.mminion.returners[
+            '{0}.{1}'.format(self.opts['master_job_cache'], fun)]
 
     def _syndic_return(self, load):
         '''
@@ -522,40 +487,58 @@ class RemoteFuncs(object):
         # Verify the load
         if any(key not in load for key in ('return', 'jid', 'id')):
             return None
-        # set the write flag
-        jid_dir = salt.utils.jid_dir(
-                load['jid'],
-                self.opts['cachedir'],
-                self.opts['hash_type']
-                )
-        if not os.path.isdir(jid_dir):
-            os.makedirs(jid_dir)
-            if 'load' in load:
-                with salt.utils.fopen(os.path.join(jid_dir, '.load.p'), 'w+b') as fp_:
-                    self.serial.dump(load['load'], fp_)
-        wtag = os.path.join(jid_dir, 'wtag_{0}'.format(load['id']))
-        try:
-            with salt.utils.fopen(wtag, 'w+') as fp_:
-                fp_.write('')
-        except (IOError, OSError):
-            log.error(
-                'Failed to commit the write tag for the syndic return, are '
-                'permissions correct in the cache dir: {0}?'.format(
-                    self.opts['cachedir']
-                )
-            )
-            return False
+        if 'load' in load and not self.__job_cache('get_load')(load['jid']):
+            self.__job_cache('save_load')(load['jid'], load['load'])
 
         # Format individual return loads
+        rets = []
         for key, item in load['return'].items():
             ret = {'jid': load['jid'],
                    'id': key,
                    'return': item}
             if 'out' in load:
                 ret['out'] = load['out']
-            self._return(ret)
-        if os.path.isfile(wtag):
-            os.remove(wtag)
+            rets.append(ret)
+        if self.opts['master_ext_job_cache'] \
+                or not self.opts['job_cache'] \
+                or self.opts.get('ext_job_cache'):
+            for ret in rets:
+                self._return(ret)
+            return
+        for ret in rets:
+            self.__fire_return(ret)
+        # Store all of the returns at once, clients never see a partial
+        # syndic return
+        self.__job_cache('returner_batch')(rets)
+
+    def _return_batch(self, load):
+        '''
+        Handle the returns of many jobs a minion sends at once, see the
+        return_batch_delay minion option
+        '''
+        if 'id' not in load or not isinstance(load.get('returns'), list):
+            return False
+        if not salt.utils.verify.valid_id(self.opts, load['id']):
+            return False
+        rets = []
+        for ret in load['returns']:
+            if not isinstance(ret, dict) or \
+                    any(key not in ret for key in ('return', 'jid')):
+                continue
+            # A minion only returns its own jobs
+            ret['id'] = load['id']
+            if ret['jid'] == 'req' or self.opts['master_ext_job_cache'] \
+                    or not self.opts['job_cache'] \
+                    or self.opts.get('ext_job_cache'):
+                self._return(ret)
+                continue
+            rets.append(ret)
+        if rets:
+            for ret in rets:
+                self.__fire_return(ret)
+            # Store all of the returns in one go
+            self.__job_cache('returner_batch')(rets)
+        return True
 
     def minion_runner(self, load):
         '''
@@ -1272,17 +1255,13 @@ class LocalFuncs(object):
                 }
         # Retrieve the jid
         if not load['jid']:
-            load['jid'] = salt.utils.prep_jid(
-                    self.opts['cachedir'],
-                    self.opts['hash_type'],
-                    extra.get('nocache', False)
+            fstr = '{0}.prep_jid'.format(self.opts['master_job_cache'])
+            load['jid'] = self.mminion.returners[fstr](
+                    nocache=extra.get('nocache', False)
                     )
-        self.event.fire_event({'minions': minions}, load['jid'])
-        jid_dir = salt.utils.jid_dir(
-                load['jid'],
-                self.opts['cachedir'],
-                self.opts['hash_type']
-                )
+        self.event.fire_event({'minions': minions}, load['jid'])  # old dup event
+        self.event.fire_event({'minions': minions},
+                              tagify([load['jid'], 'minions'], 'job'))
 
         new_job_load = {
                 'jid': load['jid'],
@@ -1298,19 +1277,12 @@ class LocalFuncs(object):
         self.event.fire_event(new_job_load, 'new_job')  # old dup event
         self.event.fire_event(new_job_load, tagify([load['jid'], 'new'], 'job'))
 
-        # Verify the jid dir
-        if not os.path.isdir(jid_dir):
-            os.makedirs(jid_dir)
         # Save the invocation information
-        self.serial.dump(
-                load,
-                salt.utils.fopen(os.path.join(jid_dir, '.load.p'), 'w+b')
-                )
+        fstr = '{0}.save_load'.format(self.opts['master_job_cache'])
+        self.mminion.returners[fstr](load['jid'], load)
         # save the minions to a cache so we can see in the UI
-        self.serial.dump(
-                minions,
-                salt.utils.fopen(os.path.join(jid_dir, '.minions.p'), 'w+b')
-                )
+        fstr = '{0}.save_minions'.format(self.opts['master_job_cache'])
+        self.mminion.returners[fstr](load['jid'], minions)
         if self.opts['ext_job_cache']:
             try:
                 fstr = '{0}.save_load'.format(self.opts['ext_job_cache'])
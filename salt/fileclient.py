@@ -7,6 +7,7 @@ Classes that manage file clients
 import contextlib
 import logging
 import hashlib
+import itertools
 import os
 import shutil
 import subprocess
@@ -22,6 +23,8 @@ import salt.loader
 import salt.payload
 import salt.transport
 import salt.utils
+import salt.utils.atomicfile
+import salt.utils.rdiff
 import salt.utils.templates
 import salt.utils.gzip_util
 from salt._compat import (
@@ -119,6 +122,13 @@ class Client(object):
         '''
         raise NotImplementedError
 
+    def get_files(self, paths, saltenv='base'):
+        '''
+        Copy a list of salt:// files to the minion cache, return the list of
+        cache locations
+        '''
+        return [self.get_file(path, '', True, saltenv) for path in paths]
+
     def file_list_emptydirs(self, saltenv='base', prefix='', env=None):
         '''
         List the empty dirs
@@ -160,8 +170,15 @@ class Client(object):
         ret = []
         if isinstance(paths, str):
             paths = paths.split(',')
+        # The files on the master are fetched together
+        master_paths = [path for path in paths if path.startswith('salt://')]
+        cached = dict(zip(master_paths,
+                          self.get_files(master_paths, saltenv)))
         for path in paths:
-            ret.append(self.cache_file(path, saltenv))
+            if path in cached:
+                ret.append(cached[path])
+            else:
+                ret.append(self.cache_file(path, saltenv))
         return ret
 
     def cache_master(self, saltenv='base', env=None):
@@ -178,10 +195,9 @@ class Client(object):
             # Backwards compatibility
             saltenv = env
 
-        ret = []
-        for path in self.file_list(saltenv):
-            ret.append(self.cache_file('salt://{0}'.format(path), saltenv))
-        return ret
+        return self.get_files(
+                ['salt://{0}'.format(path) for path in self.file_list(saltenv)],
+                saltenv)
 
     def cache_dir(self, path, saltenv='base', include_empty=False,
                   include_pat=None, exclude_pat=None, env=None):
@@ -213,11 +229,13 @@ class Client(object):
         )
         #go through the list of all files finding ones that are in
         #the target directory and caching them
+        paths = []
         for fn_ in self.file_list(saltenv):
             if fn_.strip() and fn_.startswith(path):
                 if salt.utils.check_include_exclude(
                         fn_, include_pat, exclude_pat):
-                    ret.append(self.cache_file('salt://' + fn_, saltenv))
+                    paths.append('salt://' + fn_)
+        ret.extend(self.get_files(paths, saltenv))
 
         if include_empty:
             # Break up the path into a list containing the bottom-level
@@ -873,11 +891,68 @@ class RemoteClient(Client):
     '''
     def __init__(self, opts):
         Client.__init__(self, opts)
-        channel = salt.transport.Channel.factory(self.opts)
-        if channel.ttype == 'zeromq':
-            self.auth = salt.crypt.SAuth(opts)
+        self.channel = salt.transport.Channel.factory(self.opts)
+        self.channel_pid = os.getpid()
+        if self.channel.ttype == 'zeromq':
+            self.auth = self.channel.auth
         else:
             self.auth = ''
+        # Every request to the master and every channel opened for them,
+        # see channel_reuse()
+        self.channel_stats = {'requests': 0, 'opened': 1}
+
+    def _get_channel(self):
+        '''
+        Return the channel of this client. The channel is kept for all
+        requests, it is only opened again after a fork or when a request
+        timed out, a REQ socket cannot be used again once a reply went
+        missing.
+        '''
+        if self.channel is None or self.channel_pid != os.getpid():
+            self.channel = salt.transport.Channel.factory(
+                    self.opts,
+                    auth=self.auth)
+            self.channel_pid = os.getpid()
+            self.channel_stats['opened'] += 1
+        return self.channel
+
+    def _send(self, load):
+        '''
+        Send a load to the master over the channel of this client
+        '''
+        channel = self._get_channel()
+        self.channel_stats['requests'] += 1
+        try:
+            return channel.send(load)
+        except SaltReqTimeoutError:
+            self.channel = None
+            raise
+
+    def _send_iter(self, loads, window):
+        '''
+        Send the loads to the master over the channel of this client with up
+        to window requests in flight, yield the replies in order
+        '''
+        replies = self._get_channel().send_iter(loads, window)
+        try:
+            for data in replies:
+                self.channel_stats['requests'] += 1
+                yield data
+        except SaltReqTimeoutError:
+            self.channel = None
+            raise
+        finally:
+            replies.close()
+
+    def channel_reuse(self):
+        '''
+        Return the share of requests which were sent over an already open
+        channel
+        '''
+        if not self.channel_stats['requests']:
+            return 0.0
+        return 1 - float(self.channel_stats['opened']) / \
+            self.channel_stats['requests']
 
     def get_file(self,
                  path,
@@ -902,33 +977,131 @@ class RemoteClient(Client):
             # Backwards compatibility
             saltenv = env
 
+        rel_path = self._check_proto(path)
+        # The hash of the master is used to skip the download and to verify
+        # the downloaded file
+        hash_server = self.hash_file(path, saltenv)
+        if dest:
+            destdir = os.path.dirname(dest)
+            if not os.path.isdir(destdir):
+                if makedirs:
+                    os.makedirs(destdir)
+                else:
+                    return False
+            return self._fetch_file(rel_path, dest, saltenv, gzip, hash_server)
+        with self._cache_loc(rel_path, saltenv) as cache_dest:
+            return self._fetch_file(
+                    rel_path, cache_dest, saltenv, gzip, hash_server)
+
+    def get_files(self, paths, saltenv='base'):
+        '''
+        Copy a list of salt:// files to the minion cache in a handful of
+        requests. The hashes of the cached copies are sent to the master in
+        one request, the files which changed are then streamed back together.
+        Return the list of cache locations, '' for the files which are not
+        on the master.
+        '''
+        if not paths:
+            return []
+        rel_paths = [self._check_proto(path) for path in paths]
+        dests = {}
+        files = []
+        cumask = os.umask(63)
+        try:
+            for path in set(rel_paths):
+                with self._cache_loc(path, saltenv) as dest:
+                    dests[path] = dest
+                hsum = ''
+                if os.path.isfile(dest):
+                    hsum = salt.utils.get_hash(
+                            dest, self.opts.get('hash_type', 'md5'))
+                files.append([path, hsum])
+            load = {'saltenv': saltenv,
+                    'files': files,
+                    'cmd': '_file_hashes'}
+            try:
+                changed = self._send(load)
+            except SaltReqTimeoutError:
+                return ['' for path in paths]
+            if not isinstance(changed, dict):
+                # The master does not know about batches
+                return Client.get_files(self, paths, saltenv)
+
+            ret = dict(dests)
+            fetch = []
+            for path, hash_server in changed.items():
+                if not hash_server:
+                    ret[path] = ''
+                elif not (os.path.isfile(dests[path])
+                          and self._hash_matches(dests[path], hash_server)):
+                    # The hash types of master and minion can differ
+                    fetch.append(path)
+            if self.opts.get('file_blobs'):
+                # Files found in the blob store are not streamed, neither are
+                # the files with a previous version of more than one chunk,
+                # those are patched
+                buffer_size = self.opts.get('file_buffer_size', 262144)
+                fetch = [
+                    path for path in fetch
+                    if not self._fetch_blob(
+                        path, dests[path], saltenv, changed[path],
+                        delta=os.path.isfile(dests[path])
+                        and os.path.getsize(dests[path]) > buffer_size)
+                ]
+            log.debug(
+                'Fetching {0} of {1} files from saltenv {2!r}'.format(
+                    len(fetch), len(dests), saltenv
+                )
+            )
+            streamed = self._stream_files(fetch, dests, saltenv)
+            for path in fetch:
+                partial = '{0}.partial'.format(dests[path])
+                if path not in streamed:
+                    ret[path] = ''
+                elif not self._hash_matches(partial, changed[path]):
+                    # Fall back to a single download, which is retried
+                    log.warn('Bad download of file {0}'.format(path))
+                    os.remove(partial)
+                    ret[path] = self._fetch_file(
+                            path, dests[path], saltenv, None, changed[path])
+                else:
+                    if os.path.isdir(dests[path]):
+                        salt.utils.rm_rf(dests[path])
+                    salt.utils.atomicfile.atomic_rename(partial, dests[path])
+                    if self.opts.get('file_blobs'):
+                        self._store_blob(dests[path], changed[path])
+        finally:
+            os.umask(cumask)
+        return [ret[path] for path in rel_paths]
+
+    def _fetch_file(self, path, dest, saltenv, gzip, hash_server):
+        '''
+        Download a file from the master to dest unless dest already matches
+        hash_server. The file is written to dest.partial and only moved in
+        place once its hash was verified, a download which was cut off is
+        resumed where it stopped.
+        '''
         #--  Hash compare local copy with master and skip download
         #    if no diference found.
-        dest2check = dest
-        if not dest2check:
-            rel_path = self._check_proto(path)
-            with self._cache_loc(rel_path, saltenv) as cache_dest:
-                dest2check = cache_dest
-
-        if dest2check and os.path.isfile(dest2check):
-            hash_local = self.hash_file(dest2check, saltenv)
-            hash_server = self.hash_file(path, saltenv)
-            if hash_local == hash_server:
-                log.info(
-                    'Fetching file from saltenv {0!r}, ** skipped ** '
-                    'latest already in cache {1!r}'.format(
-                        saltenv, path
-                    )
+        if os.path.isfile(dest) and self._hash_matches(dest, hash_server):
+            log.info(
+                'Fetching file from saltenv {0!r}, ** skipped ** '
+                'latest already in cache {1!r}'.format(
+                    saltenv, path
                 )
-                return dest2check
+            )
+            if self.opts.get('file_blobs'):
+                self._store_blob(dest, hash_server)
+            return dest
+        if self.opts.get('file_blobs') and hash_server \
+                and self._fetch_blob(path, dest, saltenv, hash_server):
+            return dest
 
         log.debug(
             'Fetching file from saltenv {0!r}, ** attempting ** {1!r}'.format(
                 saltenv, path
             )
         )
-        d_tries = 0
-        path = self._check_proto(path)
         load = {'path': path,
                 'saltenv': saltenv,
                 'cmd': '_serve_file'}
@@ -936,71 +1109,249 @@ class RemoteClient(Client):
             gzip = int(gzip)
             load['gzip'] = gzip
 
-        fn_ = None
-        if dest:
-            destdir = os.path.dirname(dest)
-            if not os.path.isdir(destdir):
-                if makedirs:
-                    os.makedirs(destdir)
-                else:
-                    return False
-            fn_ = salt.utils.fopen(dest, 'wb+')
-        while True:
-            if not fn_:
-                load['loc'] = 0
-            else:
-                load['loc'] = fn_.tell()
+        partial = '{0}.partial'.format(dest)
+        if not hash_server and os.path.exists(partial):
+            # Without a hash the resumed download could not be verified
+            os.remove(partial)
+        for d_tries in range(1, 4):
             try:
-                channel = salt.transport.Channel.factory(
-                        self.opts,
-                        auth=self.auth)
-                data = channel.send(load)
+                with salt.utils.fopen(partial, 'ab') as fn_:
+                    found = self._stream_file(fn_, load)
             except SaltReqTimeoutError:
                 return ''
-
-            if not data['data']:
-                if not fn_ and data['dest']:
-                    # This is a 0 byte file on the master
-                    with self._cache_loc(data['dest'], saltenv) as cache_dest:
-                        dest = cache_dest
-                        with salt.utils.fopen(cache_dest, 'wb+') as ofile:
-                            ofile.write(data['data'])
-                if 'hsum' in data and d_tries < 3:
-                    # Master has prompted a file verification, if the
-                    # verification fails, re-download the file. Try 3 times
-                    d_tries += 1
-                    with salt.utils.fopen(dest, 'rb') as fp_:
-                        hsum = getattr(
-                            hashlib,
-                            data.get('hash_type', 'md5')
-                        )(fp_.read()).hexdigest()
-                        if hsum != data['hsum']:
-                            log.warn('Bad download of file {0}, attempt {1} '
-                                     'of 3'.format(path, d_tries))
-                            continue
+            if not found:
+                # The file is not on the master
+                os.remove(partial)
+                return ''
+            if not hash_server or self._hash_matches(partial, hash_server):
                 break
-            if not fn_:
-                with self._cache_loc(data['dest'], saltenv) as cache_dest:
-                    dest = cache_dest
-                    # If a directory was formerly cached at this path, then
-                    # remove it to avoid a traceback trying to write the file
-                    if os.path.isdir(dest):
-                        salt.utils.rm_rf(dest)
-                    fn_ = salt.utils.fopen(dest, 'wb+')
-            if data.get('gzip', None):
-                data = salt.utils.gzip_util.uncompress(data['data'])
-            else:
-                data = data['data']
-            fn_.write(data)
-        if fn_:
-            fn_.close()
-            log.info(
-                'Fetching file from saltenv {0!r}, ** done ** {1!r}'.format(
-                    saltenv, path
-                )
+            # If the verification fails, re-download the file. Try 3 times
+            log.warn('Bad download of file {0}, attempt {1} '
+                     'of 3'.format(path, d_tries))
+            os.remove(partial)
+        else:
+            return ''
+        # If a directory was formerly cached at this path, then
+        # remove it to avoid a traceback trying to write the file
+        if os.path.isdir(dest):
+            salt.utils.rm_rf(dest)
+        salt.utils.atomicfile.atomic_rename(partial, dest)
+        if self.opts.get('file_blobs') and hash_server:
+            self._store_blob(dest, hash_server)
+        log.info(
+            'Fetching file from saltenv {0!r}, ** done ** {1!r}'.format(
+                saltenv, path
+            )
+        )
+        log.debug(
+            'Fileclient channel reuse {0:.1%} over {1} requests'.format(
+                self.channel_reuse(), self.channel_stats['requests']
             )
+        )
         return dest
 
+    def _stream_file(self, fn_, load):
+        '''
+        Append the file served for load to fn_, starting from the end of fn_.
+        The first chunk is requested on its own, its length is the chunk size
+        of the master, the rest of the chunks are requested
+        file_transfer_window at a time. Return False if the master does not
+        have the file.
+        '''
+        fn_.seek(0, os.SEEK_END)
+        start = fn_.tell()
+        data = self._send(dict(load, loc=start))
+        if not data.get('dest'):
+            return False
+        chunk = self._chunk_data(data)
+        fn_.write(chunk)
+        size = len(chunk)
+        window = self.opts.get('file_transfer_window', 1)
+        if not size:
+            return True
+        if window > 1 and hasattr(self.channel, 'send_iter'):
+            loads = (dict(load, loc=start + size * num)
+                     for num in itertools.count(1))
+            replies = self._send_iter(loads, window)
+            try:
+                for data in replies:
+                    chunk = self._chunk_data(data)
+                    fn_.write(chunk)
+                    if len(chunk) < size:
+                        # Short read, the end of the file
+                        break
+            finally:
+                replies.close()
+            return True
+        while chunk:
+            chunk = self._chunk_data(self._send(dict(load, loc=fn_.tell())))
+            fn_.write(chunk)
+        return True
+
+    def _stream_files(self, paths, dests, saltenv):
+        '''
+        Stream the files in paths from the master to the partial files of
+        their dests, return the set of files which were received completely
+        '''
+        ret = set()
+        load = {'saltenv': saltenv,
+                'files': paths,
+                'index': 0,
+                'loc': 0,
+                'cmd': '_serve_files'}
+        handles = {}
+        try:
+            while load['index'] < len(paths):
+                data = self._send(load)
+                if not isinstance(data, dict):
+                    break
+                for path, chunk in data['data']:
+                    if path not in handles:
+                        handles[path] = salt.utils.fopen(
+                                '{0}.partial'.format(dests[path]), 'wb')
+                    handles[path].write(chunk)
+                # Every file before the new index is complete
+                for path in paths[load['index']:data['index']]:
+                    if path in handles:
+                        handles.pop(path).close()
+                        ret.add(path)
+                load['index'] = data['index']
+                load['loc'] = data['loc']
+        except SaltReqTimeoutError:
+            log.error('Timed out streaming files from saltenv {0!r}'.format(
+                saltenv))
+        finally:
+            for path, fn_ in handles.items():
+                fn_.close()
+                os.remove(fn_.name)
+        return ret
+
+    def _blob_loc(self, hash_server):
+        '''
+        Return the location of the file with the hash hash_server in the blob
+        store, the cached files of all saltenvs are hard links to the blobs
+        '''
+        return os.path.join(self.opts['cachedir'],
+                            'blobs',
+                            hash_server.get('hash_type', 'md5'),
+                            hash_server['hsum'][:2],
+                            hash_server['hsum'])
+
+    def _link(self, src, dest):
+        '''
+        Hard link src to dest, copy it where hard links are not available
+        '''
+        try:
+            os.link(src, dest)
+        except (AttributeError, OSError):
+            shutil.copyfile(src, dest)
+
+    def _store_blob(self, dest, hash_server):
+        '''
+        Add the verified file at dest to the blob store
+        '''
+        blob = self._blob_loc(hash_server)
+        if os.path.isfile(blob):
+            return
+        try:
+            if not os.path.isdir(os.path.dirname(blob)):
+                os.makedirs(os.path.dirname(blob))
+            self._link(dest, blob)
+        except (IOError, OSError) as exc:
+            log.debug('Unable to store {0} in the blob store: {1}'.format(
+                dest, exc))
+
+    def _fetch_blob(self, path, dest, saltenv, hash_server, delta=True):
+        '''
+        Put the file which matches hash_server at dest without downloading
+        all of it. The file is taken from the blob store, or if delta is True,
+        patched from the version already cached at dest. Return False if the
+        file has to be downloaded whole.
+        '''
+        blob = self._blob_loc(hash_server)
+        partial = '{0}.partial'.format(dest)
+        if os.path.isfile(blob):
+            if self._hash_matches(blob, hash_server):
+                if os.path.exists(partial):
+                    os.remove(partial)
+                self._link(blob, partial)
+                if os.path.isdir(dest):
+                    salt.utils.rm_rf(dest)
+                salt.utils.atomicfile.atomic_rename(partial, dest)
+                log.info(
+                    'Fetching file from saltenv {0!r}, ** linked ** {1!r} '
+                    'from the blob store'.format(saltenv, path)
+                )
+                return True
+            # The blob was changed through one of its links
+            os.remove(blob)
+        if not delta or not os.path.isfile(dest) or os.path.exists(partial):
+            return False
+        bsize = salt.utils.rdiff.block_size(os.path.getsize(dest))
+        with salt.utils.fopen(dest, 'rb') as fp_:
+            sig = salt.utils.rdiff.signature(fp_, bsize)
+        if not sig:
+            # Smaller than a block, nothing to reuse
+            return False
+        load = {'path': path,
+                'saltenv': saltenv,
+                'sig': sig,
+                'block_size': bsize,
+                'loc': 0,
+                'cmd': '_file_delta'}
+        literal = 0
+        with salt.utils.fopen(dest, 'rb') as basis:
+            with salt.utils.fopen(partial, 'wb') as fn_:
+                # The delta comes in chunks of the file
+                while True:
+                    try:
+                        data = self._send(load)
+                    except SaltReqTimeoutError:
+                        data = None
+                    if not isinstance(data, dict) \
+                            or data.get('delta') is None:
+                        # The master does not serve a delta of this file
+                        break
+                    salt.utils.rdiff.patch(basis, data['delta'], bsize, fn_)
+                    literal += sum(len(op_) for op_ in data['delta']
+                                   if isinstance(op_, basestring))
+                    if data.get('done', True) \
+                            or data.get('loc', 0) <= load['loc']:
+                        break
+                    load['loc'] = data['loc']
+        if not isinstance(data, dict) or data.get('delta') is None:
+            os.remove(partial)
+            return False
+        if not self._hash_matches(partial, hash_server):
+            log.warn('Bad delta of file {0}'.format(path))
+            os.remove(partial)
+            return False
+        salt.utils.atomicfile.atomic_rename(partial, dest)
+        self._store_blob(dest, hash_server)
+        log.info(
+            'Fetching file from saltenv {0!r}, ** patched ** {1!r}, {2} '
+            'literal bytes'.format(saltenv, path, literal)
+        )
+        return True
+
+    def _chunk_data(self, data):
+        '''
+        Return the file data of a _serve_file reply
+        '''
+        if data.get('gzip', None):
+            return salt.utils.gzip_util.uncompress(data['data'])
+        return data['data']
+
+    def _hash_matches(self, path, hash_server):
+        '''
+        Check a local file against the hash_file reply of the master
+        '''
+        if not hash_server:
+            return False
+        return salt.utils.get_hash(
+                path, hash_server.get('hash_type', 'md5')
+                ) == hash_server.get('hsum')
+
     def file_list(self, saltenv='base', prefix='', env=None):
         '''
         List the files on the master
@@ -1019,10 +1370,7 @@ class RemoteClient(Client):
                 'prefix': prefix,
                 'cmd': '_file_list'}
         try:
-            channel = salt.transport.Channel.factory(
-                    self.opts,
-                    auth=self.auth)
-            return channel.send(load)
+            return self._send(load)
         except SaltReqTimeoutError:
             return ''
 
@@ -1044,10 +1392,7 @@ class RemoteClient(Client):
                 'prefix': prefix,
                 'cmd': '_file_list_emptydirs'}
         try:
-            channel = salt.transport.Channel.factory(
-                    self.opts,
-                    auth=self.auth)
-            channel.send(load)
+            return self._send(load)
         except SaltReqTimeoutError:
             return ''
 
@@ -1069,10 +1414,7 @@ class RemoteClient(Client):
                 'prefix': prefix,
                 'cmd': '_dir_list'}
         try:
-            channel = salt.transport.Channel.factory(
-                    self.opts,
-                    auth=self.auth)
-            return channel.send(load)
+            return self._send(load)
         except SaltReqTimeoutError:
             return ''
 
@@ -1084,10 +1426,7 @@ class RemoteClient(Client):
                 'prefix': prefix,
                 'cmd': '_symlink_list'}
         try:
-            channel = salt.transport.Channel.factory(
-                    self.opts,
-                    auth=self.auth)
-            return channel.send(load)
+            return self._send(load)
         except SaltReqTimeoutError:
             return ''
 
@@ -1124,10 +1463,7 @@ class RemoteClient(Client):
                 'saltenv': saltenv,
                 'cmd': '_file_hash'}
         try:
-            channel = salt.transport.Channel.factory(
-                    self.opts,
-                    auth=self.auth)
-            return channel.send(load)
+            return self._send(load)
         except SaltReqTimeoutError:
             return ''
 
@@ -1148,10 +1484,7 @@ class RemoteClient(Client):
         load = {'saltenv': saltenv,
                 'cmd': '_file_list'}
         try:
-            channel = salt.transport.Channel.factory(
-                    self.opts,
-                    auth=self.auth)
-            return channel.send(load)
+            return self._send(load)
         except SaltReqTimeoutError:
             return ''
 
@@ -1161,10 +1494,7 @@ class RemoteClient(Client):
         '''
         load = {'cmd': '_master_opts'}
         try:
-            channel = salt.transport.Channel.factory(
-                    self.opts,
-                    auth=self.auth)
-            return channel.send(load)
+            return self._send(load)
         except SaltReqTimeoutError:
             return ''
 
@@ -1173,15 +1503,12 @@ class RemoteClient(Client):
         Return the metadata derived from the external nodes system on the
         master.
         '''
-        channel = salt.transport.Channel.factory(
-                self.opts,
-                auth=self.auth)
         load = {'cmd': '_ext_nodes',
                 'id': self.opts['id'],
                 'opts': self.opts}
         if self.auth:
             load['tok'] = self.auth.gen_token('salt')
         try:
-            return channel.send(load)
+            return self._send(load)
         except SaltReqTimeoutError:
             return ''
@@ -14,6 +14,8 @@ import errno
 # Import salt libs
 import salt.loader
 import salt.utils
+import salt.utils.atomicfile
+import salt.utils.rdiff
 
 log = logging.getLogger(__name__)
 
@@ -165,7 +167,7 @@ def diff_mtime_map(map1, map2):
         return True
 
     # check if the mtimes are the same
-    if cmp(sorted(map1), sorted(map2)) != 0:
+    if map1 != map2:
         log.debug('diff_mtime_map: the maps are different')
         return True
 
@@ -174,6 +176,121 @@ def diff_mtime_map(map1, map2):
     return False
 
 
+def changed_mtime_map(map1, map2):
+    '''
+    Return the paths which are new or have another mtime in map2 and the
+    paths of map1 which are gone from map2
+    '''
+    changed = [path for path, mtime in map2.iteritems()
+               if map1.get(path) != mtime]
+    removed = [path for path in map1 if path not in map2]
+    return changed, removed
+
+
+class HashIndex(object):
+    '''
+    The hashes of the files served by a fileserver backend, kept in memory
+    and keyed by the full path of the file. An entry holds as long as the
+    mtime and size of the file are unchanged, so a hash is served with a
+    single stat. The update() of the backend saves the index to a file, the
+    MWorkers load it when they miss.
+    '''
+    def __init__(self, opts, backend):
+        self.opts = opts
+        self.path = os.path.join(opts['cachedir'], backend, 'hash_index.p')
+        self.serial = salt.payload.Serial(opts)
+        self.hashes = {}
+        self.mtime = None
+
+    def _load(self):
+        '''
+        Load the saved index if it changed since it was last loaded, return
+        True if it was loaded
+        '''
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return False
+        if mtime == self.mtime:
+            return False
+        try:
+            with salt.utils.fopen(self.path, 'rb') as fp_:
+                data = self.serial.load(fp_)
+        except Exception:
+            log.debug('Unable to load the hash index {0}'.format(self.path))
+            return False
+        self.mtime = mtime
+        if data.get('hash_type') != self.opts['hash_type']:
+            return False
+        self.hashes.update(data['hashes'])
+        return True
+
+    def _valid(self, path, stat):
+        '''
+        Return the hash of path if the index holds it for the current stat of
+        the file
+        '''
+        entry = self.hashes.get(path)
+        if entry and entry[0] == stat.st_mtime and entry[1] == stat.st_size:
+            return entry[2]
+        return None
+
+    def get(self, path):
+        '''
+        Return the hash of the file at path
+        '''
+        stat = os.stat(path)
+        hsum = self._valid(path, stat)
+        if hsum is None and self._load():
+            hsum = self._valid(path, stat)
+        if hsum is None:
+            hsum = salt.utils.get_hash(path, self.opts['hash_type'])
+            self.hashes[path] = [stat.st_mtime, stat.st_size, hsum]
+        return hsum
+
+    def update(self, paths):
+        '''
+        Hash the files in paths which are new or changed, drop the rest of
+        the index and save it for the other processes
+        '''
+        self._load()
+        hashes = {}
+        for path in paths:
+            try:
+                self.get(path)
+            except (IOError, OSError):
+                continue
+            hashes[path] = self.hashes[path]
+        self.hashes = hashes
+        self._save()
+
+    def update_paths(self, changed, removed):
+        '''
+        Hash the changed files, drop the removed ones and save the index. The
+        other files of the index are neither stat'ed nor hashed again.
+        '''
+        self._load()
+        for path in removed:
+            self.hashes.pop(path, None)
+        for path in changed:
+            try:
+                self.get(path)
+            except (IOError, OSError):
+                self.hashes.pop(path, None)
+        self._save()
+
+    def _save(self):
+        '''
+        Save the index for the other processes
+        '''
+        if not os.path.isdir(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path))
+        with salt.utils.atomicfile.atomic_open(self.path, 'w+b') as fp_:
+            fp_.write(self.serial.dumps({'hash_type': self.opts['hash_type'],
+                                         'hashes': self.hashes}))
+        self.mtime = os.path.getmtime(self.path)
+
+
 def reap_fileserver_cache_dir(cache_base, find_func):
     '''
     Remove unused cache items assuming the cache directory follows a directory
@@ -373,6 +490,43 @@ class Fileserver(object):
             return self.servers[fstr](load, fnd)
         return ret
 
+    def serve_files(self, load):
+        '''
+        Serve up a chunk of the stream made of the files in load['files'],
+        one after the other. The stream is read from offset load['loc'] of
+        the file at load['index'] until file_buffer_size bytes were read, so
+        many small files are served in a single chunk. The reply holds the
+        pieces read as [path, data] pairs and the position to continue
+        from, every file before that index is complete. Files which are not
+        found are skipped.
+        '''
+        ret = {'data': [],
+               'index': 0,
+               'loc': 0}
+        if 'files' not in load or 'saltenv' not in load:
+            return ret
+        index = load.get('index', 0)
+        loc = load.get('loc', 0)
+        size = 0
+        while index < len(load['files']) \
+                and size < self.opts['file_buffer_size']:
+            path = load['files'][index]
+            chunk = self.serve_file(
+                    {'path': path, 'saltenv': load['saltenv'], 'loc': loc})
+            if chunk.get('dest'):
+                ret['data'].append([path, chunk['data']])
+                size += len(chunk['data'])
+            if chunk.get('dest') \
+                    and len(chunk['data']) >= self.opts['file_buffer_size']:
+                loc += len(chunk['data'])
+            else:
+                # A short read is the end of the file
+                index += 1
+                loc = 0
+        ret['index'] = index
+        ret['loc'] = loc
+        return ret
+
     def file_hash(self, load):
         '''
         Return the hash of a given file
@@ -396,6 +550,58 @@ class Fileserver(object):
             return self.servers[fstr](load, fnd)
         return ''
 
+    def file_hashes(self, load):
+        '''
+        Compare the [path, hsum] pairs in load['files'] with the files on the
+        master and return the hashes of the files which differ, keyed by
+        path. Files which are not found map to an empty string.
+        '''
+        ret = {}
+        if 'files' not in load or 'saltenv' not in load:
+            return ret
+        for path, hsum in load['files']:
+            hash_server = self.file_hash(
+                    {'path': path, 'saltenv': load['saltenv']})
+            if not hash_server or hash_server.get('hsum') != hsum:
+                ret[path] = hash_server
+        return ret
+
+    def file_delta(self, load):
+        '''
+        Return the delta which turns the file signed by load['sig'] into the
+        file at load['path'], along with the hash of the file. See
+        salt.utils.rdiff for the format of the signature and the delta.
+
+        The delta covers file_buffer_size bytes of the file from load['loc'],
+        the reply holds the loc of the next chunk and whether the delta is
+        done. Files larger than file_delta_max_size get no delta and are
+        fetched whole.
+        '''
+        ret = {'delta': None,
+               'hash': ''}
+        if 'path' not in load or 'saltenv' not in load \
+                or 'sig' not in load or 'block_size' not in load:
+            return ret
+        fnd = self.find_file(load['path'], load['saltenv'])
+        if not fnd.get('back') or not os.path.isfile(fnd['path']):
+            return ret
+        size = os.path.getsize(fnd['path'])
+        if size > self.opts['file_delta_max_size']:
+            return ret
+        fstr = '{0}.file_hash'.format(fnd['back'])
+        if fstr in self.servers:
+            ret['hash'] = self.servers[fstr](load, fnd)
+        loc = load.get('loc', 0)
+        limit = self.opts['file_buffer_size']
+        with salt.utils.fopen(fnd['path'], 'rb') as fp_:
+            fp_.seek(loc)
+            data = fp_.read(limit + load['block_size'] - 1)
+        ret['delta'], end = salt.utils.rdiff.delta_chunk(
+                data, load['sig'], load['block_size'], limit)
+        ret['loc'] = loc + end
+        ret['done'] = ret['loc'] >= size
+        return ret
+
     def file_list(self, load):
         '''
         Return a list of files from the dominant environment
@@ -52,6 +52,9 @@ log = logging.getLogger(__name__)
 # Define the module's virtual name
 __virtualname__ = 'hg'
 
+# The hashes of the checked out files, see _hash_index()
+_HASH_INDEX = None
+
 
 def __virtual__():
     '''
@@ -321,6 +324,15 @@ def update():
         # Hash file won't exist if no files have yet been served up
         pass
 
+    if __opts__['hash_type'] != 'blob_sha1' and (
+            data.get('changed', False) is True
+            or not os.path.isfile(_hash_index().path)):
+        # hash the checked out files for the MWorkers once the fetch brought
+        # in changes, the files checked out in between are hashed on demand
+        _hash_index().update(salt.fileserver.generate_mtime_map(
+            {'refs': [os.path.join(__opts__['cachedir'], 'hgfs/refs')]}
+        ))
+
 
 def envs(ignore_cache=False):
     '''
@@ -471,6 +483,16 @@ def serve_file(load, fnd):
     return ret
 
 
+def _hash_index():
+    '''
+    Return the hash index of the files checked out from the repos
+    '''
+    global _HASH_INDEX
+    if _HASH_INDEX is None:
+        _HASH_INDEX = salt.fileserver.HashIndex(__opts__, 'hgfs')
+    return _HASH_INDEX
+
+
 def file_hash(load, fnd):
     '''
     Return a file hash, the hash type is set in the master config file
@@ -492,22 +514,17 @@ def file_hash(load, fnd):
         short = base_branch
     relpath = fnd['rel']
     path = fnd['path']
-    hashdest = os.path.join(__opts__['cachedir'],
-                            'hgfs/hash',
-                            short,
-                            '{0}.hash.{1}'.format(relpath,
-                                                  __opts__['hash_type']))
-    if not os.path.isfile(hashdest):
-        with salt.utils.fopen(path, 'rb') as fp_:
-            ret['hsum'] = getattr(hashlib, __opts__['hash_type'])(
-                fp_.read()).hexdigest()
-        with salt.utils.fopen(hashdest, 'w+') as fp_:
-            fp_.write(ret['hsum'])
-        return ret
-    else:
+    if __opts__['hash_type'] == 'blob_sha1':
+        # The sha of the blob is written by find_file
+        hashdest = os.path.join(__opts__['cachedir'],
+                                'hgfs/hash',
+                                short,
+                                '{0}.hash.blob_sha1'.format(relpath))
         with salt.utils.fopen(hashdest, 'rb') as fp_:
             ret['hsum'] = fp_.read()
         return ret
+    ret['hsum'] = _hash_index().get(path)
+    return ret
 
 
 def _file_lists(load, form):
@@ -15,8 +15,139 @@ import salt.fileserver
 import salt.utils
 from salt.utils.event import tagify
 
+# Import third party libs
+try:
+    import pyinotify
+    HAS_PYINOTIFY = True
+except ImportError:
+    HAS_PYINOTIFY = False
+
 log = logging.getLogger(__name__)
 
+# The hashes of the files in the file_roots, see _hash_index()
+_HASH_INDEX = None
+
+
+def _hash_index():
+    '''
+    Return the hash index of the file_roots, which is shared with the other
+    MWorkers through the index saved by update()
+    '''
+    global _HASH_INDEX
+    if _HASH_INDEX is None:
+        _HASH_INDEX = salt.fileserver.HashIndex(__opts__, 'roots')
+    return _HASH_INDEX
+
+
+# The watcher of the file_roots, see _mtime_map_watcher()
+_WATCHER = None
+
+
+class _MtimeMapWatcher(object):
+    '''
+    Keep the mtime map of the file_roots up to date from inotify events, so
+    only the paths which changed are stat'ed again
+    '''
+    mask = (pyinotify.IN_CREATE | pyinotify.IN_DELETE | pyinotify.IN_MODIFY |
+            pyinotify.IN_ATTRIB | pyinotify.IN_MOVED_FROM |
+            pyinotify.IN_MOVED_TO) if HAS_PYINOTIFY else 0
+
+    def __init__(self, path_map):
+        self.path_map = path_map
+        self.changed = set()
+        # The files changed and removed by the last update()
+        self.modified = set()
+        self.removed = set()
+        self.rescan = False
+        # Set once the map was compared with the map saved by update()
+        self.synced = False
+        self.wm_ = pyinotify.WatchManager()
+        self.notifier = pyinotify.Notifier(self.wm_, self._queue, timeout=0)
+        roots = set()
+        for path_list in path_map.values():
+            roots.update(path_list)
+        for root in roots:
+            if os.path.isdir(root):
+                self.wm_.add_watch(root, self.mask, rec=True, auto_add=True)
+        # The watches are in place before the walk, nothing is missed
+        self.mtime_map = salt.fileserver.generate_mtime_map(path_map)
+
+    def _queue(self, event):
+        '''
+        Note the path of an inotify event
+        '''
+        if event.mask & pyinotify.IN_Q_OVERFLOW:
+            # Events were dropped, walk the file_roots again
+            self.rescan = True
+        else:
+            self.changed.add(event.pathname)
+
+    def update(self):
+        '''
+        Apply the pending events to the mtime map, return True if it changed
+        '''
+        while self.notifier.check_events(timeout=0):
+            self.notifier.read_events()
+            self.notifier.process_events()
+        self.modified = set()
+        self.removed = set()
+        if self.rescan:
+            old_mtime_map = self.mtime_map
+            self.mtime_map = salt.fileserver.generate_mtime_map(
+                    self.path_map)
+            self.changed.clear()
+            self.rescan = False
+            modified, removed = salt.fileserver.changed_mtime_map(
+                    old_mtime_map, self.mtime_map)
+            self.modified.update(modified)
+            self.removed.update(removed)
+            return old_mtime_map != self.mtime_map
+        if not self.changed:
+            return False
+        for path in self.changed:
+            if os.path.isfile(path):
+                self.mtime_map[path] = os.path.getmtime(path)
+                self.modified.add(path)
+                continue
+            # A removed file or directory, a directory moved in is walked
+            prefix = path + os.sep
+            for file_path in [file_path for file_path in self.mtime_map
+                              if file_path.startswith(prefix)]:
+                del self.mtime_map[file_path]
+                self.removed.add(file_path)
+            if self.mtime_map.pop(path, None) is not None:
+                self.removed.add(path)
+            if os.path.isdir(path):
+                for directory, dirnames, filenames in os.walk(path):
+                    for item in filenames:
+                        file_path = os.path.join(directory, item)
+                        self.mtime_map[file_path] = \
+                            os.path.getmtime(file_path)
+                        self.modified.add(file_path)
+        self.removed -= self.modified
+        self.changed.clear()
+        return True
+
+
+def _mtime_map_watcher():
+    '''
+    Return the watcher of the file_roots, or None if fileserver_watch is off
+    or inotify is not available
+    '''
+    global _WATCHER
+    if not __opts__.get('fileserver_watch', False):
+        return None
+    if _WATCHER is None:
+        if HAS_PYINOTIFY:
+            _WATCHER = _MtimeMapWatcher(__opts__['file_roots'])
+        else:
+            log.warning(
+                'fileserver_watch needs pyinotify, the file_roots are '
+                'walked on every update instead'
+            )
+            _WATCHER = False
+    return _WATCHER or None
+
 
 def find_file(path, saltenv='base', env=None, **kwargs):
     '''
@@ -102,42 +233,69 @@ def update():
     '''
     When we are asked to update (regular interval) lets reap the cache
     '''
-    try:
-        salt.fileserver.reap_fileserver_cache_dir(
-            os.path.join(__opts__['cachedir'], 'roots/hash'),
-            find_file
-        )
-    except (IOError, OSError):
-        # Hash file won't exist if no files have yet been served up
-        pass
+    # The hashes were kept in a file per served file before the hash index
+    old_hash_dir = os.path.join(__opts__['cachedir'], 'roots/hash')
+    if os.path.isdir(old_hash_dir):
+        salt.utils.rm_rf(old_hash_dir)
 
     mtime_map_path = os.path.join(__opts__['cachedir'], 'roots/mtime_map')
     # data to send on event
     data = {'changed': False,
             'backend': 'roots'}
 
-    old_mtime_map = {}
-    # if you have an old map, load that
-    if os.path.exists(mtime_map_path):
-        with salt.utils.fopen(mtime_map_path, 'rb') as fp_:
-            for line in fp_:
-                file_path, mtime = line.split(':', 1)
-                old_mtime_map[file_path] = mtime
-
-    # generate the new map
-    new_mtime_map = salt.fileserver.generate_mtime_map(__opts__['file_roots'])
-
-    # compare the maps, set changed to the return value
-    data['changed'] = salt.fileserver.diff_mtime_map(old_mtime_map, new_mtime_map)
-
-    # write out the new map
-    mtime_map_path_dir = os.path.dirname(mtime_map_path)
-    if not os.path.exists(mtime_map_path_dir):
-        os.makedirs(mtime_map_path_dir)
-    with salt.utils.fopen(mtime_map_path, 'w') as fp_:
-        for file_path, mtime in new_mtime_map.iteritems():
-            fp_.write('{file_path}:{mtime}\n'.format(file_path=file_path,
-                                                     mtime=mtime))
+    watcher = _mtime_map_watcher()
+    if watcher is not None and watcher.synced:
+        data['changed'] = watcher.update()
+        new_mtime_map = watcher.mtime_map
+        changed, removed = watcher.modified, watcher.removed
+    else:
+        old_mtime_map = {}
+        # if you have an old map, load that
+        if os.path.exists(mtime_map_path):
+            with salt.utils.fopen(mtime_map_path, 'rb') as fp_:
+                for line in fp_:
+                    file_path, mtime = line.rsplit(':', 1)
+                    old_mtime_map[file_path] = float(mtime)
+
+        # generate the new map
+        if watcher is not None:
+            # the watcher reports the changes from now on
+            watcher.update()
+            watcher.synced = True
+            new_mtime_map = watcher.mtime_map
+        else:
+            new_mtime_map = salt.fileserver.generate_mtime_map(
+                    __opts__['file_roots'])
+
+        # compare the maps, set changed to the return value
+        data['changed'] = salt.fileserver.diff_mtime_map(
+                old_mtime_map, new_mtime_map)
+        changed, removed = salt.fileserver.changed_mtime_map(
+                old_mtime_map, new_mtime_map)
+
+    if not os.path.isfile(_hash_index().path):
+        # hash all of the files for the MWorkers
+        _hash_index().update(new_mtime_map)
+    elif data['changed']:
+        # hash only the new and changed files
+        _hash_index().update_paths(changed, removed)
+
+    if data['changed'] or not os.path.isfile(mtime_map_path):
+        # write out the new map
+        mtime_map_path_dir = os.path.dirname(mtime_map_path)
+        if not os.path.exists(mtime_map_path_dir):
+            os.makedirs(mtime_map_path_dir)
+        with salt.utils.fopen(mtime_map_path, 'w') as fp_:
+            for file_path, mtime in new_mtime_map.iteritems():
+                fp_.write('{0}:{1!r}\n'.format(file_path, mtime))
+
+        # the file lists are built again on the next request
+        list_cachedir = os.path.join(__opts__['cachedir'], 'file_lists/roots')
+        for saltenv in __opts__['file_roots']:
+            try:
+                os.remove(os.path.join(list_cachedir, '{0}.p'.format(saltenv)))
+            except OSError:
+                pass
 
     if __opts__.get('fileserver_events', False):
         # if there is a change, fire an event
@@ -168,51 +326,7 @@ def file_hash(load, fnd):
 
     # set the hash_type as it is determined by config-- so mechanism won't change that
     ret['hash_type'] = __opts__['hash_type']
-
-    # check if the hash is cached
-    # cache file's contents should be "hash:mtime"
-    cache_path = os.path.join(__opts__['cachedir'],
-                              'roots/hash',
-                              load['saltenv'],
-                              '{0}.hash.{1}'.format(fnd['rel'],
-                              __opts__['hash_type']))
-    # if we have a cache, serve that if the mtime hasn't changed
-    if os.path.exists(cache_path):
-        try:
-            with salt.utils.fopen(cache_path, 'rb') as fp_:
-                try:
-                    hsum, mtime = fp_.read().split(':')
-                except ValueError:
-                    log.debug('Fileserver attempted to read incomplete cache file. Retrying.')
-                    # Delete the file since its incomplete (either corrupted or incomplete)
-                    try:
-                        os.unlink(cache_path)
-                    except OSError:
-                        pass
-                    return file_hash(load, fnd)
-                if os.path.getmtime(path) == mtime:
-                    # check if mtime changed
-                    ret['hsum'] = hsum
-                    return ret
-        except os.error:  # Can't use Python select() because we need Windows support
-            log.debug("Fileserver encountered lock when reading cache file. Retrying.")
-            # Delete the file since its incomplete (either corrupted or incomplete)
-            try:
-                os.unlink(cache_path)
-            except OSError:
-                pass
-            return file_hash(load, fnd)
-
-    # if we don't have a cache entry-- lets make one
-    ret['hsum'] = salt.utils.get_hash(path, __opts__['hash_type'])
-    cache_dir = os.path.dirname(cache_path)
-    # make cache directory if it doesn't exist
-    if not os.path.exists(cache_dir):
-        os.makedirs(cache_dir)
-    # save the cache object "hash:mtime"
-    cache_object = '{0}:{1}'.format(ret['hsum'], os.path.getmtime(path))
-    with salt.utils.flopen(cache_path, 'w') as fp_:
-        fp_.write(cache_object)
+    ret['hsum'] = _hash_index().get(path)
     return ret
 
 
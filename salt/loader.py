@@ -6,13 +6,19 @@ Routines to set up a minion
 # Import python libs
 import os
 import imp
+import re
 import sys
 import salt
 import logging
 import tempfile
 import time
+import collections
+import hashlib
+import json
 
 # Import salt libs
+import salt.version
+import salt.utils.atomicfile
 from salt.exceptions import LoaderError
 from salt.template import check_render_pipe_str
 from salt.utils.decorators import Depends
@@ -29,6 +35,22 @@ log = logging.getLogger(__name__)
 SALT_BASE_PATH = os.path.dirname(salt.__file__)
 LOADED_BASE_NAME = 'salt.loaded'
 
+# The names a module can be loaded as, as found in its source, see
+# Loader.module_index()
+VIRTUALNAME_RE = re.compile(
+    r'''^__virtualname__\s*=\s*['"](\w+)['"]''', re.MULTILINE)
+VIRTUAL_FUNC_RE = re.compile(
+    r'^def __virtual__\(.*?(?=^\S|\Z)', re.MULTILINE | re.DOTALL)
+VIRTUAL_RETURN_RE = re.compile(r'''return\s+['"](\w+)['"]''')
+
+# The opts which differ from one run of salt-call to the next and are left
+# out of the key of the VirtualCache
+VIRTUAL_CACHE_VOLATILE_OPTS = ('pillar', 'fun', 'arg', 'grains')
+
+# The mtime of the file each loaded module was last imported from, keyed by
+# the module's name in sys.modules
+LOADED_MTIMES = {}
+
 # Because on the cloud drivers we do `from salt.cloud.libcloudfuncs import *`
 # which simplifies code readability, it adds some unsupported functions into
 # the driver's module scope.
@@ -117,6 +139,13 @@ def minion_mods(opts, context=None, whitelist=None):
             'value': context}
     if not whitelist:
         whitelist = opts.get('whitelist_modules', None)
+    if opts.get('lazy_loader', False):
+        return LazyLoader(
+            load,
+            pack,
+            whitelist=whitelist,
+            provider_overrides=True
+        )
     functions = load.gen_functions(
         pack,
         whitelist=whitelist,
@@ -152,6 +181,8 @@ def returners(opts, functions, whitelist=None):
     load = _create_loader(opts, 'returners', 'returner')
     pack = {'name': '__salt__',
             'value': functions}
+    if opts.get('lazy_loader', False):
+        return LazyLoader(load, pack, whitelist=whitelist)
     return load.gen_functions(pack, whitelist=whitelist)
 
 
@@ -229,6 +260,8 @@ def states(opts, functions, whitelist=None):
     load = _create_loader(opts, 'states', 'states')
     pack = {'name': '__salt__',
             'value': functions}
+    if opts.get('lazy_loader', False):
+        return LazyLoader(load, pack, whitelist=whitelist)
     return load.gen_functions(pack, whitelist=whitelist)
 
 
@@ -382,6 +415,27 @@ def clouds(opts):
     return functions
 
 
+def _virtual_names(path):
+    '''
+    Return the names other than its own a module can be loaded as, as found
+    in its source
+    '''
+    if os.path.isdir(path):
+        path = os.path.join(path, '__init__.py')
+    elif not path.endswith(('.py', '.pyx')):
+        path = '{0}.py'.format(os.path.splitext(path)[0])
+    try:
+        with salt.utils.fopen(path, 'r') as fp_:
+            source = fp_.read()
+    except (IOError, OSError):
+        return set()
+    names = set(VIRTUALNAME_RE.findall(source))
+    virtual = VIRTUAL_FUNC_RE.search(source)
+    if virtual:
+        names.update(VIRTUAL_RETURN_RE.findall(virtual.group(0)))
+    return names
+
+
 def _generate_module(name):
     if name in sys.modules:
         return
@@ -612,35 +666,39 @@ class Loader(object):
                 self._apply_outputter(func, mod)
         if not hasattr(mod, '__salt__'):
             mod.__salt__ = functions
-        try:
-            context = sys.modules[
-                functions[functions.keys()[0]].__module__
-            ].__context__
-        except AttributeError:
-            context = {}
+        if isinstance(functions, LazyLoader):
+            context = functions.context
+        else:
+            try:
+                context = sys.modules[
+                    functions[functions.keys()[0]].__module__
+                ].__context__
+            except AttributeError:
+                context = {}
         mod.__context__ = context
         return funcs
 
-    def gen_functions(self, pack=None, virtual_enable=True, whitelist=None,
-                      provider_overrides=False):
+    def _cython_enabled(self):
         '''
-        Return a dict of functions found in the defined module_dirs
+        Return True if cython modules can be loaded
         '''
-        log.trace('loading {0} in {1}'.format(self.tag, self.module_dirs))
-        names = {}
-        modules = []
-        funcs = {}
-        disable = set(self.opts.get('disable_{0}s'.format(self.tag), []))
-
-        cython_enabled = False
         if self.opts.get('cython_enable', True) is True:
             try:
                 import pyximport
                 pyximport.install()
-                cython_enabled = True
+                return True
             except ImportError:
                 log.info('Cython is enabled in the options but not present '
                          'in the system path. Skipping Cython modules.')
+        return False
+
+    def _module_files(self, cython_enabled=False):
+        '''
+        Return a dict of the names of the modules found in the module_dirs
+        mapped to their files
+        '''
+        names = {}
+        disable = set(self.opts.get('disable_{0}s'.format(self.tag), []))
         for mod_dir in self.module_dirs:
             if not os.path.isabs(mod_dir):
                 log.trace(
@@ -685,285 +743,410 @@ class Loader(object):
                             fn_
                         )
                     )
-        for name in names:
-            try:
-                if names[name].endswith('.pyx'):
-                    # If there's a name which ends in .pyx it means the above
-                    # cython_enabled is True. Continue...
-                    mod = pyximport.load_module(
-                        '{0}.{1}.{2}.{3}'.format(
-                            self.loaded_base_name,
-                            self.mod_type_check(names[name]),
-                            self.tag,
-                            name
-                        ), names[name], tempfile.gettempdir()
-                    )
-                else:
-                    fn_, path, desc = imp.find_module(name, self.module_dirs)
-                    mod = imp.load_module(
-                        '{0}.{1}.{2}.{3}'.format(
+        return names
+
+    def _import_module(self, name, path):
+        '''
+        Import the module name found at path, return None if it fails
+        '''
+        try:
+            if path.endswith('.pyx'):
+                # If there's a name which ends in .pyx it means cython is
+                # enabled. Continue...
+                import pyximport
+                mod = pyximport.load_module(
+                    '{0}.{1}.{2}.{3}'.format(
+                        self.loaded_base_name,
+                        self.mod_type_check(path),
+                        self.tag,
+                        name
+                    ), path, tempfile.gettempdir()
+                )
+            else:
+                fn_, path, desc = imp.find_module(name, self.module_dirs)
+                mod_name = '{0}.{1}.{2}.{3}'.format(
+                    self.loaded_base_name,
+                    self.mod_type_check(path),
+                    self.tag,
+                    name
+                )
+                try:
+                    mtime = os.path.getmtime(path)
+                except OSError:
+                    mtime = None
+                if LOADED_MTIMES.get(mod_name) != mtime:
+                    # imp.load_module re-executes the file into the module
+                    # already in sys.modules, which would keep the names the
+                    # changed file no longer defines (a dropped __virtual__
+                    # for instance), so import a changed file afresh
+                    sys.modules.pop(mod_name, None)
+                mod = imp.load_module(mod_name, fn_, path, desc)
+                LOADED_MTIMES[mod_name] = mtime
+                # reload all submodules if necessary
+                submodules = [
+                    getattr(mod, sname) for sname in dir(mod) if
+                    isinstance(getattr(mod, sname), mod.__class__)
+                ]
+                # reload only custom "sub"modules i.e is a submodule in
+                # parent module that are still available on disk (i.e. not
+                # removed during sync_modules)
+                for submodule in submodules:
+                    try:
+                        smname = '{0}.{1}.{2}'.format(
                             self.loaded_base_name,
-                            self.mod_type_check(path),
                             self.tag,
                             name
-                        ), fn_, path, desc
-                    )
-                    # reload all submodules if necessary
-                    submodules = [
-                        getattr(mod, sname) for sname in dir(mod) if
-                        isinstance(getattr(mod, sname), mod.__class__)
-                    ]
-                    # reload only custom "sub"modules i.e is a submodule in
-                    # parent module that are still available on disk (i.e. not
-                    # removed during sync_modules)
-                    for submodule in submodules:
-                        try:
-                            smname = '{0}.{1}.{2}'.format(
-                                self.loaded_base_name,
-                                self.tag,
-                                name
-                            )
-                            smfile = '{0}.py'.format(
-                                os.path.splitext(submodule.__file__)[0]
-                            )
-                            if submodule.__name__.startswith(smname) and \
-                                    os.path.isfile(smfile):
-                                reload(submodule)
-                        except AttributeError:
-                            continue
-            except ImportError:
-                log.debug(
-                    'Failed to import {0} {1}, this is most likely NOT a '
-                    'problem:\n'.format(
-                        self.tag, name
-                    ),
-                    exc_info=True
-                )
-                continue
-            except Exception:
-                log.warning(
-                    'Failed to import {0} {1}, this is due most likely to a '
-                    'syntax error. Traceback raised:\n'.format(
-                        self.tag, name
-                    ),
-                    exc_info=True
-                )
-                continue
-            modules.append(mod)
-        for mod in modules:
-            virtual = ''
-
-            # If this is a proxy minion then MOST modules cannot work.  Therefore, require that
-            # any module that does work with salt-proxy-minion define __proxyenabled__ as a list
-            # containing the names of the proxy types that the module supports.
-            if not hasattr(mod, 'render') and 'proxy' in self.opts:
-                if not hasattr(mod, '__proxyenabled__'):
-                    # This is a proxy minion but this module doesn't support proxy
-                    # minions at all
-                    continue
-                if not (self.opts['proxy']['proxytype'] in mod.__proxyenabled__ or '*' in mod.__proxyenabled__):
-                    # This is a proxy minion, this module supports proxy
-                    # minions, but not this particular minion
-                    log.debug(mod)
-                    continue
+                        )
+                        smfile = '{0}.py'.format(
+                            os.path.splitext(submodule.__file__)[0]
+                        )
+                        if submodule.__name__.startswith(smname) and \
+                                os.path.isfile(smfile):
+                            reload(submodule)
+                    except AttributeError:
+                        continue
+        except ImportError:
+            log.debug(
+                'Failed to import {0} {1}, this is most likely NOT a '
+                'problem:\n'.format(
+                    self.tag, name
+                ),
+                exc_info=True
+            )
+            return None
+        except Exception:
+            log.warning(
+                'Failed to import {0} {1}, this is due most likely to a '
+                'syntax error. Traceback raised:\n'.format(
+                    self.tag, name
+                ),
+                exc_info=True
+            )
+            return None
+        return mod
 
-            if hasattr(mod, '__opts__'):
-                mod.__opts__.update(self.opts)
-            else:
-                mod.__opts__ = self.opts
-
-            mod.__grains__ = self.grains
-            mod.__pillar__ = self.pillar
-
-            if pack:
-                if isinstance(pack, list):
-                    for chunk in pack:
-                        if not isinstance(chunk, dict):
-                            continue
-                        try:
-                            setattr(mod, chunk['name'], chunk['value'])
-                        except KeyError:
-                            pass
-                else:
-                    setattr(mod, pack['name'], pack['value'])
+    def _module_funcs(self, mod, pack=None, virtual_enable=True):
+        '''
+        Pack an imported module, run its __virtual__ function and return the
+        name the module is loaded as and the dict of the functions it
+        provides, keyed by <module name>.<function>. The name is None and the
+        dict is empty if the module is not loaded.
+        '''
+        funcs = {}
+        virtual = ''
+
+        # If this is a proxy minion then MOST modules cannot work.  Therefore, require that
+        # any module that does work with salt-proxy-minion define __proxyenabled__ as a list
+        # containing the names of the proxy types that the module supports.
+        if not hasattr(mod, 'render') and 'proxy' in self.opts:
+            if not hasattr(mod, '__proxyenabled__'):
+                # This is a proxy minion but this module doesn't support proxy
+                # minions at all
+                return None, funcs
+            if not (self.opts['proxy']['proxytype'] in mod.__proxyenabled__ or '*' in mod.__proxyenabled__):
+                # This is a proxy minion, this module supports proxy
+                # minions, but not this particular minion
+                log.debug(mod)
+                return None, funcs
+
+        if hasattr(mod, '__opts__'):
+            mod.__opts__.update(self.opts)
+        else:
+            mod.__opts__ = self.opts
+
+        mod.__grains__ = self.grains
+        mod.__pillar__ = self.pillar
 
-            # Call a module's initialization method if it exists
-            if hasattr(mod, '__init__'):
-                if callable(mod.__init__):
+        if pack:
+            if isinstance(pack, list):
+                for chunk in pack:
+                    if not isinstance(chunk, dict):
+                        continue
                     try:
-                        mod.__init__(self.opts)
-                    except TypeError:
+                        setattr(mod, chunk['name'], chunk['value'])
+                    except KeyError:
                         pass
+            else:
+                setattr(mod, pack['name'], pack['value'])
 
-            # Trim the full pathname to just the module
-            # this will be the short name that other salt modules and state
-            # will refer to it as.
-            module_name = mod.__name__.rsplit('.', 1)[-1]
-
-            if virtual_enable:
-                # if virtual modules are enabled, we need to look for the
-                # __virtual__() function inside that module and run it.
-                # This function will return either a new name for the module,
-                # an empty string(won't be loaded but you just need to check
-                # against the same python type, a string) or False.
-                # This allows us to have things like the pkg module working on
-                # all platforms under the name 'pkg'. It also allows for
-                # modules like augeas_cfg to be referred to as 'augeas', which
-                # would otherwise have namespace collisions. And finally it
-                # allows modules to return False if they are not intended to
-                # run on the given platform or are missing dependencies.
+        # Call a module's initialization method if it exists
+        if hasattr(mod, '__init__'):
+            if callable(mod.__init__):
                 try:
-                    if hasattr(mod, '__virtual__'):
-                        if callable(mod.__virtual__):
-                            virtual = mod.__virtual__()
-                            if not virtual:
-                                # if __virtual__() evaluates to false then the
-                                # module wasn't meant for this platform or it's
-                                # not supposed to load for some other reason.
-                                # Some modules might accidentally return None
-                                # and are improperly loaded
-                                if virtual is None:
-                                    log.warning(
-                                        '{0}.__virtual__() is wrongly '
-                                        'returning `None`. It should either '
-                                        'return `True`, `False` or a new '
-                                        'name. If you\'re the developer '
-                                        'of the module {1!r}, please fix '
-                                        'this.'.format(
-                                            mod.__name__,
-                                            module_name
-                                        )
-                                    )
-                                continue
-
-                            if virtual is not True and module_name != virtual:
-                                # If __virtual__ returned True the module will
-                                # be loaded with the same name, if it returned
-                                # other value than `True`, it should be a new
-                                # name for the module.
-                                # Update the module name with the new name
-                                log.debug(
-                                    'Loaded {0} as virtual {1}'.format(
-                                        module_name, virtual
+                    mod.__init__(self.opts)
+                except TypeError:
+                    pass
+
+        # Trim the full pathname to just the module
+        # this will be the short name that other salt modules and state
+        # will refer to it as.
+        module_name = mod.__name__.rsplit('.', 1)[-1]
+
+        if virtual_enable:
+            # if virtual modules are enabled, we need to look for the
+            # __virtual__() function inside that module and run it.
+            # This function will return either a new name for the module,
+            # an empty string(won't be loaded but you just need to check
+            # against the same python type, a string) or False.
+            # This allows us to have things like the pkg module working on
+            # all platforms under the name 'pkg'. It also allows for
+            # modules like augeas_cfg to be referred to as 'augeas', which
+            # would otherwise have namespace collisions. And finally it
+            # allows modules to return False if they are not intended to
+            # run on the given platform or are missing dependencies.
+            try:
+                if hasattr(mod, '__virtual__'):
+                    if callable(mod.__virtual__):
+                        virtual = mod.__virtual__()
+                        if not virtual:
+                            # if __virtual__() evaluates to false then the
+                            # module wasn't meant for this platform or it's
+                            # not supposed to load for some other reason.
+                            # Some modules might accidentally return None
+                            # and are improperly loaded
+                            if virtual is None:
+                                log.warning(
+                                    '{0}.__virtual__() is wrongly '
+                                    'returning `None`. It should either '
+                                    'return `True`, `False` or a new '
+                                    'name. If you\'re the developer '
+                                    'of the module {1!r}, please fix '
+                                    'this.'.format(
+                                        mod.__name__,
+                                        module_name
                                     )
                                 )
+                            return None, funcs
+
+                        if virtual is not True and module_name != virtual:
+                            # If __virtual__ returned True the module will
+                            # be loaded with the same name, if it returned
+                            # other value than `True`, it should be a new
+                            # name for the module.
+                            # Update the module name with the new name
+                            log.debug(
+                                'Loaded {0} as virtual {1}'.format(
+                                    module_name, virtual
+                                )
+                            )
 
-                                if not hasattr(mod, '__virtualname__'):
-                                    salt.utils.warn_until(
-                                        'Hydrogen',
-                                        'The {0!r} module is renaming itself '
-                                        'in it\'s __virtual__() function ({1} '
-                                        '=> {2}). Please set it\'s virtual '
-                                        'name as the \'__virtualname__\' '
-                                        'module attribute. Example: '
-                                        '"__virtualname__ = {2!r}"'.format(
-                                            mod.__name__,
-                                            module_name,
-                                            virtual
-                                        )
+                            if not hasattr(mod, '__virtualname__'):
+                                salt.utils.warn_until(
+                                    'Hydrogen',
+                                    'The {0!r} module is renaming itself '
+                                    'in it\'s __virtual__() function ({1} '
+                                    '=> {2}). Please set it\'s virtual '
+                                    'name as the \'__virtualname__\' '
+                                    'module attribute. Example: '
+                                    '"__virtualname__ = {2!r}"'.format(
+                                        mod.__name__,
+                                        module_name,
+                                        virtual
                                     )
-                                module_name = virtual
-
-                            elif virtual and hasattr(mod, '__virtualname__'):
-                                module_name = mod.__virtualname__
-
-                except KeyError:
-                    # Key errors come out of the virtual function when passing
-                    # in incomplete grains sets, these can be safely ignored
-                    # and logged to debug, still, it includes the traceback to
-                    # help debugging.
-                    log.debug(
-                        'KeyError when loading {0}'.format(module_name),
-                        exc_info=True
-                    )
+                                )
+                            module_name = virtual
 
-                except Exception:
-                    # If the module throws an exception during __virtual__()
-                    # then log the information and continue to the next.
-                    log.error(
-                        'Failed to read the virtual function for '
-                        '{0}: {1}'.format(
-                            self.tag, module_name
-                        ),
-                        exc_info=True
-                    )
-                    continue
+                        elif virtual and hasattr(mod, '__virtualname__'):
+                            module_name = mod.__virtualname__
 
-            if whitelist:
-                # If a whitelist is defined then only load the module if it is
-                # in the whitelist
-                if module_name not in whitelist:
-                    continue
+            except KeyError:
+                # Key errors come out of the virtual function when passing
+                # in incomplete grains sets, these can be safely ignored
+                # and logged to debug, still, it includes the traceback to
+                # help debugging.
+                log.debug(
+                    'KeyError when loading {0}'.format(module_name),
+                    exc_info=True
+                )
 
-            if getattr(mod, '__load__', False) is not False:
-                log.info(
-                    'The functions from module {0!r} are being loaded from '
-                    'the provided __load__ attribute'.format(
-                        module_name
-                    )
+            except Exception:
+                # If the module throws an exception during __virtual__()
+                # then log the information and continue to the next.
+                log.error(
+                    'Failed to read the virtual function for '
+                    '{0}: {1}'.format(
+                        self.tag, module_name
+                    ),
+                    exc_info=True
                 )
-            for attr in getattr(mod, '__load__', dir(mod)):
+                return None, funcs
 
-                if attr.startswith('_'):
-                    # skip private attributes
-                    # log messages omitted for obviousness
-                    continue
+        if getattr(mod, '__load__', False) is not False:
+            log.info(
+                'The functions from module {0!r} are being loaded from '
+                'the provided __load__ attribute'.format(
+                    module_name
+                )
+            )
+        for attr in getattr(mod, '__load__', dir(mod)):
 
-                if callable(getattr(mod, attr)):
-                    # check to make sure this is callable
-                    func = getattr(mod, attr)
-                    if isinstance(func, type):
-                        # skip callables that might be exceptions
-                        if any(['Error' in func.__name__,
-                                'Exception' in func.__name__]):
-                            continue
-                    # now that callable passes all the checks, add it to the
-                    # library of available functions of this type
-
-                    # Let's get the function name.
-                    # If the module has the __func_alias__ attribute, it must
-                    # be a dictionary mapping in the form of(key -> value):
-                    #   <real-func-name> -> <desired-func-name>
-                    #
-                    # It default's of course to the found callable attribute
-                    # name if no alias is defined.
-                    funcname = getattr(mod, '__func_alias__', {}).get(
-                        attr, attr
-                    )
+            if attr.startswith('_'):
+                # skip private attributes
+                # log messages omitted for obviousness
+                continue
 
-                    # functions are namespaced with their module name
-                    module_func_name = '{0}.{1}'.format(module_name, funcname)
-                    funcs[module_func_name] = func
-                    log.trace(
-                        'Added {0} to {1}'.format(module_func_name, self.tag)
+            if callable(getattr(mod, attr)):
+                # check to make sure this is callable
+                func = getattr(mod, attr)
+                if isinstance(func, type):
+                    # skip callables that might be exceptions
+                    if any(['Error' in func.__name__,
+                            'Exception' in func.__name__]):
+                        continue
+                # now that callable passes all the checks, add it to the
+                # library of available functions of this type
+
+                # Let's get the function name.
+                # If the module has the __func_alias__ attribute, it must
+                # be a dictionary mapping in the form of(key -> value):
+                #   <real-func-name> -> <desired-func-name>
+                #
+                # It default's of course to the found callable attribute
+                # name if no alias is defined.
+                funcname = getattr(mod, '__func_alias__', {}).get(
+                    attr, attr
+                )
+
+                # functions are namespaced with their module name
+                module_func_name = '{0}.{1}'.format(module_name, funcname)
+                funcs[module_func_name] = func
+                log.trace(
+                    'Added {0} to {1}'.format(module_func_name, self.tag)
+                )
+                self._apply_outputter(func, mod)
+        return module_name, funcs
+
+    def _provider_overrides(self, funcs, modules=None):
+        '''
+        Replace the functions of the modules configured in the providers
+        option with the functions of the providing modules
+        '''
+        if not isinstance(self.opts.get('providers', False), dict):
+            return
+        for mod, provider in self.opts['providers'].items():
+            if modules is not None and mod not in modules:
+                continue
+            newfuncs = raw_mod(self.opts, provider, funcs)
+            if newfuncs:
+                for newfunc in newfuncs:
+                    f_key = '{0}{1}'.format(
+                        mod, newfunc[newfunc.rindex('.'):]
                     )
-                    self._apply_outputter(func, mod)
+                    funcs[f_key] = newfuncs[newfunc]
+
+    def _inject_salt(self, mod, pack, funcs):
+        '''
+        Inject the special __salt__ namespace that contains the functions
+        into a module
+        '''
+        if not hasattr(mod, '__salt__') or (
+            not in_pack(pack, '__salt__') and
+            not str(mod.__name__).startswith('salt.loaded.int.grain')
+        ):
+            mod.__salt__ = funcs
+        elif not in_pack(pack, '__salt__') and str(mod.__name__).startswith('salt.loaded.int.grain'):
+            mod.__salt__.update(funcs)
+
+    def module_index(self):
+        '''
+        Return a dict of the names the modules in the module_dirs can be
+        loaded as, mapped to the [name, path] pairs of the modules which can
+        provide them. A module is indexed under its own name and under the
+        names found in its source, the __virtualname__ and the names its
+        __virtual__ function returns. The index is saved in the cachedir and
+        only built again when one of the module_dirs changed.
+        '''
+        cython_enabled = self._cython_enabled()
+        key = {'dirs': [[mod_dir, os.path.getmtime(mod_dir)]
+                        for mod_dir in self.module_dirs
+                        if os.path.isabs(mod_dir) and os.path.isdir(mod_dir)],
+               'disable': sorted(
+                   self.opts.get('disable_{0}s'.format(self.tag), [])),
+               'cython': cython_enabled}
+        cache = None
+        if 'cachedir' in self.opts:
+            cache = os.path.join(
+                self.opts['cachedir'], 'loader', '{0}.p'.format(self.tag))
+            serial = salt.payload.Serial(self.opts)
+        if cache and os.path.isfile(cache):
+            try:
+                with salt.utils.fopen(cache, 'rb') as fp_:
+                    data = serial.load(fp_)
+                if data.get('key') == key:
+                    return data['index']
+            except Exception:
+                log.debug('Unable to read the loader index {0}'.format(cache))
+        index = {}
+        for name, path in self._module_files(cython_enabled).items():
+            for vname in set([name]) | _virtual_names(path):
+                index.setdefault(vname, []).append([name, path])
+        if cache:
+            try:
+                if not os.path.isdir(os.path.dirname(cache)):
+                    os.makedirs(os.path.dirname(cache))
+                with salt.utils.fopen(cache, 'w+b') as fp_:
+                    serial.dump({'key': key, 'index': index}, fp_)
+            except (IOError, OSError):
+                log.debug('Unable to write the loader index {0}'.format(cache))
+        return index
+
+    def gen_functions(self, pack=None, virtual_enable=True, whitelist=None,
+                      provider_overrides=False):
+        '''
+        Return a dict of functions found in the defined module_dirs
+        '''
+        log.trace('loading {0} in {1}'.format(self.tag, self.module_dirs))
+        modules = []
+        funcs = {}
+
+        cache = self.virtual_cache(virtual_enable)
+
+        names = self._module_files(self._cython_enabled())
+        for name in names:
+            if cache is not None and cache.skip(name, whitelist):
+                continue
+            mod = self._import_module(name, names[name])
+            if mod is not None:
+                modules.append(mod)
+            elif cache is not None:
+                cache.set(name, names[name], None)
+        for mod in modules:
+            module_name, mod_funcs = self._module_funcs(
+                mod, pack, virtual_enable)
+            if cache is not None:
+                name = mod.__name__.rsplit('.', 1)[-1]
+                cache.set(
+                    name, getattr(mod, '__file__', names[name]), module_name)
+            if whitelist and module_name not in whitelist:
+                # If a whitelist is defined then only load the module if it
+                # is in the whitelist
+                continue
+            funcs.update(mod_funcs)
+        if cache is not None:
+            cache.save()
 
         # Handle provider overrides
-        if provider_overrides and self.opts.get('providers', False):
-            if isinstance(self.opts['providers'], dict):
-                for mod, provider in self.opts['providers'].items():
-                    newfuncs = raw_mod(self.opts, provider, funcs)
-                    if newfuncs:
-                        for newfunc in newfuncs:
-                            f_key = '{0}{1}'.format(
-                                mod, newfunc[newfunc.rindex('.'):]
-                            )
-                            funcs[f_key] = newfuncs[newfunc]
+        if provider_overrides:
+            self._provider_overrides(funcs)
 
         # now that all the functions have been collected, iterate back over
         # the available modules and inject the special __salt__ namespace that
         # contains these functions.
         for mod in modules:
-            if not hasattr(mod, '__salt__') or (
-                not in_pack(pack, '__salt__') and
-                not str(mod.__name__).startswith('salt.loaded.int.grain')
-            ):
-                mod.__salt__ = funcs
-            elif not in_pack(pack, '__salt__') and str(mod.__name__).startswith('salt.loaded.int.grain'):
-                mod.__salt__.update(funcs)
+            self._inject_salt(mod, pack, funcs)
         return funcs
 
+    def virtual_cache(self, virtual_enable=True):
+        '''
+        Return the VirtualCache of this loader, None if the virtual_cache
+        option is off
+        '''
+        if not self.opts.get('virtual_cache', False):
+            return None
+        if 'cachedir' not in self.opts:
+            return None
+        return VirtualCache(self, virtual_enable)
+
     def _apply_outputter(self, func, mod):
         '''
         Apply the __outputter__ variable to the functions
@@ -1070,3 +1253,288 @@ class Loader(object):
                 log.error(msg.format(cfn))
             os.umask(cumask)
         return grains_data
+
+
+def _hash(data):
+    '''
+    Return a hash of the json serializable data
+    '''
+    return hashlib.md5(
+        json.dumps(data, sort_keys=True, default=repr)).hexdigest()
+
+
+class VirtualCache(object):
+    '''
+    The names the modules of a Loader were loaded as, or False for the
+    modules which were not loaded, saved in the cachedir so that the next
+    start of the minion or salt-call does not import the modules their
+    __virtual__ function turned down. The modules which are loaded are still
+    imported and their __virtual__ function still runs.
+
+    The cache is used while the salt version, the grains, the opts, the
+    module_dirs and the directories of the PATH and of the python path are
+    unchanged, so that syncing modules, changing grains or installing a
+    program or a library a __virtual__ function looks for brings the modules
+    back. An entry is used while the file of its module is unchanged.
+    '''
+    def __init__(self, loader, virtual_enable=True):
+        self.loader = loader
+        self.path = os.path.join(
+            loader.opts['cachedir'],
+            'loader',
+            '{0}.virtual.p'.format(loader.tag)
+        )
+        self.serial = salt.payload.Serial(loader.opts)
+        self.key = self._key(virtual_enable)
+        self.modules = {}
+        self.changed = False
+        self._load()
+
+    def _key(self, virtual_enable):
+        '''
+        Return the key the cache is valid for, None if the opts or grains
+        can not be hashed
+        '''
+        opts = dict((key, val) for key, val in self.loader.opts.items()
+                    if key not in VIRTUAL_CACHE_VOLATILE_OPTS)
+        dirs = list(self.loader.module_dirs)
+        dirs.extend(os.environ.get('PATH', '').split(os.pathsep))
+        dirs.extend(sys.path)
+        mtimes = []
+        for dir_ in dirs:
+            try:
+                mtimes.append([dir_, os.path.getmtime(dir_)])
+            except OSError:
+                continue
+        try:
+            return {'version': salt.version.__version__,
+                    'grains': _hash(self.loader.grains),
+                    'opts': _hash(opts),
+                    'dirs': mtimes,
+                    'virtual': virtual_enable}
+        except (TypeError, ValueError):
+            log.debug('Unable to hash the opts and grains of the {0} '
+                      'loader, the virtual cache is off'.format(
+                          self.loader.tag))
+            return None
+
+    def _load(self):
+        '''
+        Load the saved cache if its key matches
+        '''
+        if self.key is None or not os.path.isfile(self.path):
+            return
+        try:
+            with salt.utils.fopen(self.path, 'rb') as fp_:
+                data = self.serial.load(fp_)
+        except Exception:
+            log.debug('Unable to read the virtual cache {0}'.format(self.path))
+            return
+        if data.get('key') == self.key:
+            self.modules = data['modules']
+
+    def get(self, name):
+        '''
+        Return the entry of the module name, None if there is none or its
+        file changed
+        '''
+        entry = self.modules.get(name)
+        if entry is None:
+            return None
+        try:
+            if os.path.getmtime(entry['path']) == entry['mtime']:
+                return entry
+        except OSError:
+            pass
+        return None
+
+    def skip(self, name, whitelist=None):
+        '''
+        Return True if the module name does not need to be imported, because
+        it was not loaded last time or its name is not in the whitelist
+        '''
+        entry = self.get(name)
+        if entry is None:
+            return False
+        if entry['virtual'] is False:
+            return True
+        return bool(whitelist) and entry['virtual'] not in whitelist
+
+    def set(self, name, path, module_name):
+        '''
+        Record the name the module name found at path was loaded as, None if
+        it was not loaded
+        '''
+        if self.key is None:
+            return
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return
+        self.modules[name] = {'path': path,
+                              'mtime': mtime,
+                              'virtual': module_name or False}
+        self.changed = True
+
+    def save(self):
+        '''
+        Save the cache if it changed
+        '''
+        if self.key is None or not self.changed:
+            return
+        try:
+            if not os.path.isdir(os.path.dirname(self.path)):
+                os.makedirs(os.path.dirname(self.path))
+            with salt.utils.atomicfile.atomic_open(self.path, 'w+b') as fp_:
+                fp_.write(self.serial.dumps({'key': self.key,
+                                             'modules': self.modules}))
+        except (IOError, OSError):
+            log.debug('Unable to write the virtual cache {0}'.format(
+                self.path))
+            return
+        self.changed = False
+
+
+class LazyLoader(collections.MutableMapping):
+    '''
+    The functions of a Loader as a dict which imports and virtualizes a module
+    only when one of its functions is first accessed. The modules which can
+    provide a name are looked up in Loader.module_index(). A function which
+    is not found that way loads all of the modules, like gen_functions(), so
+    iterating over the dict or looking up a missing function costs as much
+    as a full load, once. With the virtual_cache option the modules which
+    were not loaded as a name last time are not imported for it, and a
+    missing function does not load all of the modules once every module is
+    in the cache.
+    '''
+    def __init__(self,
+                 loader,
+                 pack=None,
+                 virtual_enable=True,
+                 whitelist=None,
+                 provider_overrides=False):
+        self.loader = loader
+        self.pack = pack
+        self.virtual_enable = virtual_enable
+        self.whitelist = whitelist
+        self.provider_overrides = provider_overrides
+        self.index = loader.module_index()
+        self.cache = loader.virtual_cache(virtual_enable)
+        self._cache_complete = None
+        self.context = {}
+        for chunk in pack if isinstance(pack, list) else [pack]:
+            if isinstance(chunk, dict) and chunk.get('name') == '__context__':
+                self.context = chunk['value']
+        self.loaded_names = set()
+        self.loaded_modules = set()
+        self.loaded_all = False
+        self._dict = {}
+
+    def _load_module(self, name, path):
+        '''
+        Import a module and add its functions
+        '''
+        if name in self.loaded_modules:
+            return
+        self.loaded_modules.add(name)
+        if self.cache is not None and self.cache.skip(name, self.whitelist):
+            return
+        mod = self.loader._import_module(name, path)
+        if mod is None:
+            if self.cache is not None:
+                self.cache.set(name, path, None)
+            return
+        module_name, funcs = self.loader._module_funcs(
+            mod, self.pack, self.virtual_enable)
+        if self.cache is not None:
+            self.cache.set(
+                name, getattr(mod, '__file__', path), module_name)
+        if self.whitelist and module_name not in self.whitelist:
+            return
+        # Enforce dependencies of module functions from "funcs"
+        Depends.enforce_dependencies(funcs)
+        self._dict.update(funcs)
+        self.loader._inject_salt(mod, self.pack, self)
+
+    def _load_name(self, name):
+        '''
+        Load the modules which can provide the functions of name
+        '''
+        if name in self.loaded_names:
+            return
+        self.loaded_names.add(name)
+        candidates = list(self.index.get(name, []))
+        if self.cache is not None:
+            # Skip the modules which were loaded as another name, and add the
+            # ones loaded as name which the index could not tell
+            for mod_name, path in candidates[:]:
+                entry = self.cache.get(mod_name)
+                if entry is not None and entry['virtual'] != name:
+                    candidates.remove([mod_name, path])
+            for mod_name, entry in self.cache.modules.items():
+                if entry['virtual'] == name and self.cache.get(mod_name):
+                    candidates.append([mod_name, entry['path']])
+        for mod_name, path in candidates:
+            self._load_module(mod_name, path)
+        if self.provider_overrides:
+            self.loader._provider_overrides(self, modules=[name])
+
+    def _load_all(self):
+        '''
+        Load all of the modules
+        '''
+        if self.loaded_all:
+            return
+        self.loaded_all = True
+        log.trace('Loading all {0} modules'.format(self.loader.tag))
+        for name in sorted(self.index):
+            self._load_name(name)
+
+    def _cached_all(self):
+        '''
+        Return True if the virtual cache knows the name every module was
+        loaded as, then a function the modules of its name did not provide
+        does not exist
+        '''
+        if self.cache is None:
+            return False
+        if self._cache_complete is None:
+            self._cache_complete = all(
+                self.cache.get(mod_name) is not None
+                for mods in self.index.values()
+                for mod_name, path in mods)
+        return self._cache_complete
+
+    def __getitem__(self, key):
+        if key not in self._dict:
+            self._load_name(key.split('.', 1)[0])
+        if key not in self._dict and not self._cached_all():
+            self._load_all()
+        if self.cache is not None:
+            self.cache.save()
+        return self._dict[key]
+
+    def __setitem__(self, key, value):
+        self._dict[key] = value
+
+    def __delitem__(self, key):
+        del self._dict[key]
+
+    def __iter__(self):
+        self._load_all()
+        if self.cache is not None:
+            self.cache.save()
+        return iter(self._dict)
+
+    def __len__(self):
+        self._load_all()
+        if self.cache is not None:
+            self.cache.save()
+        return len(self._dict)
+
+    def __repr__(self):
+        return '<{0} {1} of {2} modules loaded>'.format(
+            self.__class__.__name__,
+            len(self.loaded_modules),
+            self.loader.tag
+        )
@@ -14,6 +14,7 @@ import shutil
 import stat
 import logging
 import hashlib
+import collections
 try:
     import pwd
 except ImportError:  # This is in case windows minion is importing
@@ -21,6 +22,7 @@ except ImportError:  # This is in case windows minion is importing
 import getpass
 import resource
 import subprocess
+import threading
 import multiprocessing
 import sys
 
@@ -44,7 +46,6 @@ import salt.search
 import salt.key
 import salt.fileserver
 import salt.daemons.masterapi
-import salt.utils.atomicfile
 import salt.utils.event
 import salt.utils.verify
 import salt.utils.minions
@@ -143,6 +144,63 @@ class Master(SMaster):
                         'minions. Please upgrade your ZMQ!')
         SMaster.__init__(self, opts)
 
+    def _current_aes(self):
+        '''
+        Return the AES key the workers use
+        '''
+        dfn = os.path.join(self.opts['cachedir'], '.dfn')
+        if os.path.isfile(dfn):
+            with salt.utils.fopen(dfn) as fp_:
+                aes = fp_.read()
+            if len(aes) == 76:
+                return aes
+        return self.opts['aes']
+
+    def _announce_aes(self):
+        '''
+        Start a key rollover: hand the next AES key to the workers, which
+        accept it from now on, and publish it to the minions encrypted with
+        the current key. The minions encrypt with the next key as soon as they
+        get it, see publish_session_rollover.
+        '''
+        aes = salt.crypt.dropfile(
+            self.opts['cachedir'], self.opts['user'], name='.dfn_next')
+        crypticle = salt.crypt.Crypticle(self.opts, self._current_aes())
+        serial = salt.payload.Serial(self.opts)
+        payload = {'enc': 'aes',
+                   'load': crypticle.dumps({'aes_next': aes})}
+        if self.opts['sign_pub_messages']:
+            master_pem_path = os.path.join(self.opts['pki_dir'], 'master.pem')
+            payload['sig'] = salt.crypt.sign_message(
+                master_pem_path, payload['load'])
+        package = serial.dumps(payload)
+        if self.opts['zmq_filtering']:
+            package = serial.dumps({'payload': package})
+        context = zmq.Context(1)
+        pub_sock = context.socket(zmq.PUSH)
+        try:
+            pub_sock.connect('ipc://{0}'.format(
+                os.path.join(self.opts['sock_dir'], 'publish_pull.ipc')))
+            pub_sock.send(package)
+        finally:
+            pub_sock.setsockopt(zmq.LINGER, 5000)
+            pub_sock.close()
+            context.term()
+        log.info('Announced the next AES key to the minions')
+        return aes
+
+    def _finish_rollover(self, aes):
+        '''
+        Have the workers encrypt with the announced key, unless the key was
+        rotated in the meantime, e.g. by deleting a minion key
+        '''
+        if not os.path.isfile(
+                os.path.join(self.opts['cachedir'], '.dfn_next')):
+            log.info('The AES key was rotated during the key rollover')
+            return
+        salt.crypt.dropfile(self.opts['cachedir'], self.opts['user'], aes=aes)
+        log.info('Rolled over to the announced AES key')
+
     def _clear_old_jobs(self):
         '''
         The clean old jobs function is the general passive maintenance process
@@ -152,8 +210,12 @@ class Master(SMaster):
         search = salt.search.Search(self.opts)
         last = int(time.time())
         rotate = int(time.time())
+        # The time and the key of the key rollover in progress
+        rollover = None
         fileserver = salt.fileserver.Fileserver(self.opts)
         runners = salt.loader.runner(self.opts)
+        returners = salt.loader.returners(
+            self.opts, {}, whitelist=[self.opts['master_job_cache']])
         schedule = salt.utils.schedule.Schedule(self.opts, runners)
         ckminions = salt.utils.minions.CkMinions(self.opts)
         event = salt.utils.event.MasterEvent(self.opts['sock_dir'])
@@ -188,11 +250,20 @@ class Master(SMaster):
             now = int(time.time())
             loop_interval = int(self.opts['loop_interval'])
             if (now - last) >= loop_interval:
-                salt.daemons.masterapi.clean_old_jobs(self.opts)
+                salt.daemons.masterapi.clean_old_jobs(self.opts, returners)
 
             if self.opts.get('publish_session'):
-                if now - rotate >= self.opts['publish_session']:
-                    salt.crypt.dropfile(self.opts['cachedir'])
+                if rollover is not None:
+                    if now - rollover[0] >= \
+                            self.opts['publish_session_rollover']:
+                        self._finish_rollover(rollover[1])
+                        rollover = None
+                elif now - rotate >= self.opts['publish_session']:
+                    if self.opts['publish_session_rollover']:
+                        rollover = (now, self._announce_aes())
+                    else:
+                        salt.crypt.dropfile(
+                            self.opts['cachedir'], self.opts['user'])
                     rotate = now
             if self.opts.get('search'):
                 if now - last >= self.opts['search_index_interval']:
@@ -391,6 +462,7 @@ class Publisher(multiprocessing.Process):
         '''
         # Set up the context
         context = zmq.Context(1)
+        serial = salt.payload.Serial(self.opts)
         # Prepare minion publish socket
         pub_sock = context.socket(zmq.PUB)
         # if 2.1 >= zmq < 3.0, we only have one HWM setting
@@ -429,7 +501,18 @@ class Publisher(multiprocessing.Process):
                 # SIGUSR1 gracefully so we don't choke and die horribly
                 try:
                     package = pull_sock.recv()
-                    pub_sock.send(package)
+                    if not self.opts['zmq_filtering']:
+                        pub_sock.send(package)
+                        continue
+                    unpacked = serial.loads(package)
+                    if 'topic_lst' in unpacked:
+                        topics = [salt.payload.pub_topic(minion_id)
+                                  for minion_id in unpacked['topic_lst']]
+                    else:
+                        topics = [salt.payload.BROADCAST_TOPIC]
+                    for topic in topics:
+                        pub_sock.send(topic, flags=zmq.SNDMORE)
+                        pub_sock.send(unpacked['payload'])
                 except zmq.ZMQError as exc:
                     if exc.errno == errno.EINTR:
                         continue
@@ -473,12 +556,13 @@ class ReqServer(object):
         '''
         Binds the reply server
         '''
-        dfn = os.path.join(self.opts['cachedir'], '.dfn')
-        if os.path.isfile(dfn):
-            try:
-                os.remove(dfn)
-            except os.error:
-                pass
+        for name in ('.dfn', '.dfn_next'):
+            dfn = os.path.join(self.opts['cachedir'], name)
+            if os.path.isfile(dfn):
+                try:
+                    os.remove(dfn)
+                except os.error:
+                    pass
         log.info('Setting up the master communication server')
         self.clients.bind(self.uri)
         self.work_procs = []
@@ -488,6 +572,12 @@ class ReqServer(object):
                     self.master_key,
                     self.key,
                     self.crypticle))
+        for ind in range(int(self.opts['slow_worker_threads'])):
+            self.work_procs.append(MWorker(self.opts,
+                    self.master_key,
+                    self.key,
+                    self.crypticle,
+                    lane='slow'))
 
         for ind, proc in enumerate(self.work_procs):
             log.info('Starting Salt worker process {0}'.format(ind))
@@ -495,6 +585,11 @@ class ReqServer(object):
 
         self.workers.bind(self.w_uri)
 
+        if self.opts['slow_worker_threads'] > 0:
+            slow_device = threading.Thread(target=self.__slow_device)
+            slow_device.daemon = True
+            slow_device.start()
+
         try:
             if HAS_PYTHON_SYSTEMD and systemd.daemon.booted():
                 systemd.daemon.notify('READY=1')
@@ -510,6 +605,25 @@ class ReqServer(object):
                     continue
                 raise exc
 
+    def __slow_device(self):
+        '''
+        Pass the requests the workers hand off to the slow workers, and their
+        answers back
+        '''
+        front = self.context.socket(zmq.ROUTER)
+        back = self.context.socket(zmq.DEALER)
+        front.bind('ipc://{0}'.format(
+            os.path.join(self.opts['sock_dir'], 'workers_slow.ipc')))
+        back.bind('ipc://{0}'.format(
+            os.path.join(self.opts['sock_dir'], 'workers_slow_back.ipc')))
+        while True:
+            try:
+                zmq.device(zmq.QUEUE, front, back)
+            except zmq.ZMQError as exc:
+                if exc.errno == errno.EINTR:
+                    continue
+                raise exc
+
     def start_publisher(self):
         '''
         Start the salt publisher interface
@@ -575,12 +689,17 @@ class MWorker(multiprocessing.Process):
     '''
     The worker multiprocess instance to manage the backend operations for the
     salt master.
+
+    With slow_worker_threads set the workers hand the requests running one of
+    the slow_worker_cmds off to the workers of the slow lane and keep serving
+    the other requests in the meantime.
     '''
     def __init__(self,
             opts,
             mkey,
             key,
-            crypticle):
+            crypticle,
+            lane='fast'):
         multiprocessing.Process.__init__(self)
         self.opts = opts
         self.serial = salt.payload.Serial(opts)
@@ -588,12 +707,22 @@ class MWorker(multiprocessing.Process):
         self.mkey = mkey
         self.key = key
         self.k_mtime = 0
+        self.n_mtime = 0
+        self.lane = lane
+        # The run count, total and longest time of every command, fired on
+        # the event bus every master_stats_event_iter seconds
+        self.stats = {}
+        self.stats_start = time.time()
 
     def __bind(self):
         '''
         Bind to the local port
         '''
         context = zmq.Context(1)
+        if self.lane == 'slow':
+            return self.__bind_slow(context)
+        if self.opts['slow_worker_threads'] > 0:
+            return self.__bind_lanes(context)
         socket = context.socket(zmq.REP)
         w_uri = 'ipc://{0}'.format(
             os.path.join(self.opts['sock_dir'], 'workers.ipc')
@@ -618,6 +747,153 @@ class MWorker(multiprocessing.Process):
         except KeyboardInterrupt:
             socket.close()
 
+    def __bind_slow(self, context):
+        '''
+        Serve the requests the other workers hand off to the slow lane, they
+        come with the token the answer goes back with
+        '''
+        socket = context.socket(zmq.REP)
+        w_uri = 'ipc://{0}'.format(
+            os.path.join(self.opts['sock_dir'], 'workers_slow_back.ipc')
+            )
+        log.info('Slow worker binding to socket {0}'.format(w_uri))
+        try:
+            socket.connect(w_uri)
+            while True:
+                try:
+                    token, kind, package = socket.recv_multipart()
+                    self._update_aes()
+                    ret = self._handle_slow(kind, self.serial.loads(package))
+                    socket.send_multipart([token, self.serial.dumps(ret)])
+                except zmq.ZMQError as exc:
+                    if exc.errno == errno.EINTR:
+                        continue
+                    raise exc
+        except KeyboardInterrupt:
+            socket.close()
+
+    def __bind_lanes(self, context):
+        '''
+        Serve the requests without waiting for the answers of the requests
+        handed off to the slow lane
+        '''
+        socket = context.socket(zmq.DEALER)
+        slow = context.socket(zmq.DEALER)
+        w_uri = 'ipc://{0}'.format(
+            os.path.join(self.opts['sock_dir'], 'workers.ipc')
+            )
+        log.info('Worker binding to socket {0}'.format(w_uri))
+        # The routing envelopes of the requests in the slow lane and the time
+        # they were handed off by token, oldest first
+        pending = collections.OrderedDict()
+        count = 0
+        try:
+            socket.connect(w_uri)
+            slow.connect('ipc://{0}'.format(
+                os.path.join(self.opts['sock_dir'], 'workers_slow.ipc')))
+            poller = zmq.Poller()
+            poller.register(socket, zmq.POLLIN)
+            poller.register(slow, zmq.POLLIN)
+            while True:
+                try:
+                    socks = dict(poller.poll())
+                    if socks.get(socket) == zmq.POLLIN:
+                        frames = socket.recv_multipart()
+                        envelope, package = frames[:-1], frames[-1]
+                        self._update_aes()
+                        payload = self.serial.loads(package)
+                        data = None
+                        cmd = None
+                        if isinstance(payload, dict) and \
+                                isinstance(payload.get('load'), dict):
+                            cmd = payload['load'].get('cmd')
+                        elif isinstance(payload, dict) and \
+                                payload.get('enc') == 'aes':
+                            data = self._decrypt(payload.get('load'))
+                            if isinstance(data, dict):
+                                cmd = data.get('cmd')
+                        if cmd in self.opts['slow_worker_cmds']:
+                            count += 1
+                            pending[str(count)] = (envelope, time.time())
+                            # The slow lane gets the decrypted load, the
+                            # clear loads as they came
+                            if isinstance(data, dict):
+                                slow.send_multipart(
+                                    ['', str(count), 'aes',
+                                     self.serial.dumps(data)])
+                            else:
+                                slow.send_multipart(
+                                    ['', str(count), 'raw', package])
+                            continue
+                        if isinstance(data, dict):
+                            ret = self._run_aes(data)
+                        else:
+                            ret = self._handle_payload(payload)
+                        socket.send_multipart(
+                            envelope + [self.serial.dumps(ret)])
+                    if socks.get(slow) == zmq.POLLIN:
+                        frames = slow.recv_multipart()
+                        request = pending.pop(frames[-2], None)
+                        if request is not None:
+                            socket.send_multipart(request[0] + [frames[-1]])
+                    self._expire_slow(pending)
+                except zmq.ZMQError as exc:
+                    if exc.errno == errno.EINTR:
+                        continue
+                    raise exc
+        except KeyboardInterrupt:
+            socket.close()
+            slow.close()
+
+    def _handle_slow(self, kind, payload):
+        '''
+        Handle a request handed off to the slow lane, the AES loads come
+        decrypted already
+        '''
+        if kind == 'aes':
+            return self._run_aes(payload)
+        return self._handle_payload(payload)
+
+    def _expire_slow(self, pending):
+        '''
+        Forget the requests handed off to the slow lane more than
+        slow_worker_timeout seconds ago, their minions gave up on the answer
+        '''
+        limit = time.time() - self.opts['slow_worker_timeout']
+        for token in list(pending):
+            if pending[token][1] > limit:
+                break
+            log.warning('Dropping the slow request {0}, it was handed off '
+                        'more than {1} seconds ago'.format(
+                            token, self.opts['slow_worker_timeout']))
+            del pending[token]
+
+    def _stat(self, cmd, start):
+        '''
+        Account for a command which started at start, fire the stats of the
+        worker once master_stats_event_iter seconds passed
+        '''
+        if not self.opts['master_stats']:
+            return
+        now = time.time()
+        stat = self.stats.setdefault(cmd, {'runs': 0, 'total': 0, 'max': 0})
+        stat['runs'] += 1
+        stat['total'] += now - start
+        stat['max'] = max(stat['max'], now - start)
+        if now - self.stats_start < self.opts['master_stats_event_iter']:
+            return
+        data = {'lane': self.lane,
+                'start': self.stats_start,
+                'end': now,
+                'stats': {}}
+        for name, stat in self.stats.items():
+            data['stats'][name] = {'runs': stat['runs'],
+                                   'mean': stat['total'] / stat['runs'],
+                                   'max': stat['max']}
+        self.aes_funcs.event.fire_event(data, tagify(self.name, 'stats'))
+        self.stats = {}
+        self.stats_start = now
+
     def _handle_payload(self, payload):
         '''
         The _handle_payload method is the key method used to figure out what
@@ -639,7 +915,10 @@ class MWorker(multiprocessing.Process):
         log.info('Clear payload received with command {cmd}'.format(**load))
         if load['cmd'].startswith('__'):
             return False
-        return getattr(self.clear_funcs, load['cmd'])(load)
+        start = time.time()
+        ret = getattr(self.clear_funcs, load['cmd'])(load)
+        self._stat(load['cmd'], start)
+        return ret
 
     def _handle_pub(self, load):
         '''
@@ -649,47 +928,78 @@ class MWorker(multiprocessing.Process):
             return False
         log.info('Pubkey payload received with command {cmd}'.format(**load))
 
-    def _handle_aes(self, load):
+    def _decrypt(self, load):
         '''
-        Handle a command sent via an AES key
+        Return the decrypted AES load, None if it can not be decrypted
         '''
         try:
-            data = self.crypticle.loads(load)
+            return self.crypticle.loads(load)
         except Exception:
+            return None
+
+    def _handle_aes(self, load):
+        '''
+        Handle a command sent via an AES key
+        '''
+        data = self._decrypt(load)
+        if data is None:
             return ''
+        return self._run_aes(data)
+
+    def _run_aes(self, data):
+        '''
+        Run the command of a decrypted AES load
+        '''
         if 'cmd' not in data:
             log.error('Received malformed command {0}'.format(data))
             return {}
         log.info('AES payload received with command {0}'.format(data['cmd']))
         if data['cmd'].startswith('__'):
             return False
-        return self.aes_funcs.run_func(data['cmd'], data)
+        start = time.time()
+        ret = self.aes_funcs.run_func(data['cmd'], data)
+        self._stat(data['cmd'], start)
+        return ret
 
-    def _update_aes(self):
+    def _read_dropfile(self, name, mtime):
         '''
-        Check to see if a fresh AES key is available and update the components
-        of the worker
+        Return the key in the dropfile and its mtime if it changed since
+        mtime, (None, mtime) otherwise
         '''
-        dfn = os.path.join(self.opts['cachedir'], '.dfn')
+        dfn = os.path.join(self.opts['cachedir'], name)
         try:
             stats = os.stat(dfn)
         except os.error:
-            return
+            return None, mtime
         if stats.st_mode != 0100400:
             # Invalid dfn, return
-            return
-        if stats.st_mtime > self.k_mtime:
+            return None, mtime
+        if stats.st_mtime <= mtime:
+            return None, mtime
+        with salt.utils.fopen(dfn) as fp_:
+            aes = fp_.read()
+        if len(aes) != 76:
+            return None, mtime
+        return aes, stats.st_mtime
+
+    def _update_aes(self):
+        '''
+        Check to see if a fresh AES key is available and update the components
+        of the worker
+        '''
+        aes, self.k_mtime = self._read_dropfile('.dfn', self.k_mtime)
+        if aes is not None:
             # new key, refresh crypticle
-            with salt.utils.fopen(dfn) as fp_:
-                aes = fp_.read()
-            if len(aes) != 76:
-                return
             self.crypticle = salt.crypt.Crypticle(self.opts, aes)
             self.clear_funcs.crypticle = self.crypticle
             self.clear_funcs.opts['aes'] = aes
             self.aes_funcs.crypticle = self.crypticle
             self.aes_funcs.opts['aes'] = aes
-            self.k_mtime = stats.st_mtime
+        aes, self.n_mtime = self._read_dropfile('.dfn_next', self.n_mtime)
+        if aes is not None:
+            # The next key was announced to the minions, accept the requests
+            # of the minions which rolled over to it
+            self.crypticle.accept(aes)
 
     def run(self):
         '''
@@ -725,6 +1035,10 @@ class AESFuncs(object):
                 self.opts,
                 states=False,
                 rend=False)
+        # Keep the compiled pillar data in memory
+        self.pillar_cache = None
+        if self.opts['pillar_cache']:
+            self.pillar_cache = salt.pillar.PillarCache(self.opts)
         self.__setup_fileserver()
 
     def __setup_fileserver(self):
@@ -733,7 +1047,10 @@ class AESFuncs(object):
         '''
         fs_ = salt.fileserver.Fileserver(self.opts)
         self._serve_file = fs_.serve_file
+        self._serve_files = fs_.serve_files
         self._file_hash = fs_.file_hash
+        self._file_hashes = fs_.file_hashes
+        self._file_delta = fs_.file_delta
         self._file_list = fs_.file_list
         self._file_list_emptydirs = fs_.file_list_emptydirs
         self._dir_list = fs_.dir_list
@@ -1180,25 +1497,26 @@ class AESFuncs(object):
             return False
         if not salt.utils.verify.valid_id(self.opts, load['id']):
             return False
-        pillar = salt.pillar.Pillar(
-                self.opts,
-                load['grains'],
-                load['id'],
-                load.get('saltenv', load.get('env')),
-                load.get('ext'),
-                self.mminion.functions)
-        data = pillar.compile_pillar()
+        saltenv = load.get('saltenv', load.get('env'))
+        data = None
+        if self.pillar_cache is not None:
+            key = self.pillar_cache.key(
+                    load['id'], load['grains'], saltenv, load.get('ext'))
+            data = self.pillar_cache.get(key)
+        if data is None:
+            pillar = salt.pillar.Pillar(
+                    self.opts,
+                    load['grains'],
+                    load['id'],
+                    saltenv,
+                    load.get('ext'),
+                    self.mminion.functions,
+                    cache=self.pillar_cache)
+            data = pillar.compile_pillar()
+            if self.pillar_cache is not None:
+                self.pillar_cache.set(key, data)
         if self.opts.get('minion_data_cache', False):
-            cdir = os.path.join(self.opts['cachedir'], 'minions', load['id'])
-            if not os.path.isdir(cdir):
-                os.makedirs(cdir)
-            datap = os.path.join(cdir, 'data.p')
-            with salt.utils.fopen(datap, 'w+b') as fp_:
-                fp_.write(
-                        self.serial.dumps(
-                            {'grains': load['grains'],
-                             'pillar': data})
-                            )
+            self.ckminions.registry.store(load['id'], load['grains'], data)
         return data
 
     def _minion_event(self, load):
@@ -1250,78 +1568,40 @@ class AESFuncs(object):
             return False
         if not salt.utils.verify.valid_id(self.opts, load['id']):
             return False
-        new_loadp = False
         if load['jid'] == 'req':
             # The minion is returning a standalone job, request a jobid
             load['arg'] = load.get('arg', load.get('fun_args', []))
             load['tgt_type'] = 'glob'
             load['tgt'] = load['id']
-            load['jid'] = salt.utils.prep_jid(
-                self.opts['cachedir'],
-                self.opts['hash_type'],
-                load.get('nocache', False))
-            new_loadp = load.get('nocache', True) and True
-        log.info('Got return from {id} for job {jid}'.format(**load))
-        self.event.fire_event(load, load['jid'])  # old dup event
-        self.event.fire_event(
-            load, tagify([load['jid'], 'ret', load['id']], 'job'))
-        self.event.fire_ret_load(load)
+            load['jid'] = self.__job_cache('prep_jid')(
+                nocache=load.get('nocache', False))
+            if not load.get('nocache', False):
+                self.__job_cache('save_load')(load['jid'], load)
+        self.__fire_return(load)
         if self.opts['master_ext_job_cache']:
             fstr = '{0}.returner'.format(self.opts['master_ext_job_cache'])
             self.mminion.returners[fstr](load)
             return
         if not self.opts['job_cache'] or self.opts.get('ext_job_cache'):
             return
-        jid_dir = salt.utils.jid_dir(
-            load['jid'],
-            self.opts['cachedir'],
-            self.opts['hash_type']
-        )
-        if os.path.exists(os.path.join(jid_dir, 'nocache')):
-            return
-        if new_loadp:
-            with salt.utils.fopen(
-                os.path.join(jid_dir, '.load.p'), 'w+b'
-            ) as fp_:
-                self.serial.dump(load, fp_)
-        hn_dir = os.path.join(jid_dir, load['id'])
-        try:
-            os.mkdir(hn_dir)
-        except OSError as e:
-            if e.errno == errno.EEXIST:
-                # Minion has already returned this jid and it should be dropped
-                log.error(
-                    'An extra return was detected from minion {0}, please verify '
-                    'the minion, this could be a replay attack'.format(
-                        load['id']
-                    )
-                )
-                return False
-            elif e.errno == errno.ENOENT:
-                log.error(
-                    'An inconsistency occurred, a job was received with a job id '
-                    'that is not present on the master: {jid}'.format(**load)
-                )
-                return False
-            raise
-
-        self.serial.dump(
-            load['return'],
-            # Use atomic open here to avoid the file being read before it's
-            # completely written to. Refs #1935
-            salt.utils.atomicfile.atomic_open(
-                os.path.join(hn_dir, 'return.p'), 'w+b'
-            )
-        )
-        if 'out' in load:
-            self.serial.dump(
-                load['out'],
-                # Use atomic open here to avoid the file being read before
-                # it's completely written to. Refs #1935
-                salt.utils.atomicfile.atomic_open(
-                    os.path.join(hn_dir, 'out.p'), 'w+b'
-                )
-            )
+        return self.__job_cache('returner')(load)
+
+    def __fire_return(self, load):
+        '''
+        Announce a minion return on the event bus
+        '''
+        log.info('Got return from {id} for job {jid}'.format(**load))
+        self.event.fire_event(load, load['jid'])  # old dup event
+        self.event.fire_event(
+            load, tagify([load['jid'], 'ret', load['id']], 'job'))
+        self.event.fire_ret_load(load)
+
+    def __job_cache(self, fun):
+        '''
+        Return the named function of the master job cache
+        '''
+        return self.mminion.returners[
+            '{0}.{1}'.format(self.opts['master_job_cache'], fun)]
 
     def _syndic_return(self, load):
         '''
@@ -1333,40 +1613,60 @@ class AESFuncs(object):
             return None
         if not salt.utils.verify.valid_id(self.opts, load['id']):
             return False
-        # set the write flag
-        jid_dir = salt.utils.jid_dir(
-                load['jid'],
-                self.opts['cachedir'],
-                self.opts['hash_type']
-                )
-        if not os.path.isdir(jid_dir):
-            os.makedirs(jid_dir)
-            if 'load' in load:
-                with salt.utils.fopen(os.path.join(jid_dir, '.load.p'), 'w+b') as fp_:
-                    self.serial.dump(load['load'], fp_)
-        wtag = os.path.join(jid_dir, 'wtag_{0}'.format(load['id']))
-        try:
-            with salt.utils.fopen(wtag, 'w+b') as fp_:
-                fp_.write('')
-        except (IOError, OSError):
-            log.error(
-                'Failed to commit the write tag for the syndic return, are '
-                'permissions correct in the cache dir: {0}?'.format(
-                    self.opts['cachedir']
-                )
-            )
-            return False
+        if 'load' in load and not self.__job_cache('get_load')(load['jid']):
+            self.__job_cache('save_load')(load['jid'], load['load'])
 
         # Format individual return loads
+        rets = []
         for key, item in load['return'].items():
             ret = {'jid': load['jid'],
                    'id': key,
                    'return': item}
             if 'out' in load:
                 ret['out'] = load['out']
-            self._return(ret)
-        if os.path.isfile(wtag):
-            os.remove(wtag)
+            rets.append(ret)
+        if self.opts['master_ext_job_cache'] \
+                or not self.opts['job_cache'] \
+                or self.opts.get('ext_job_cache'):
+            for ret in rets:
+                self._return(ret)
+            return
+        rets = [ret for ret in rets
+                if salt.utils.verify.valid_id(self.opts, ret['id'])]
+        for ret in rets:
+            self.__fire_return(ret)
+        # Store all of the returns at once, clients never see a partial
+        # syndic return
+        self.__job_cache('returner_batch')(rets)
+
+    def _return_batch(self, load):
+        '''
+        Handle the returns of many jobs a minion sends at once, see the
+        return_batch_delay minion option
+        '''
+        if 'id' not in load or not isinstance(load.get('returns'), list):
+            return False
+        if not salt.utils.verify.valid_id(self.opts, load['id']):
+            return False
+        rets = []
+        for ret in load['returns']:
+            if not isinstance(ret, dict) or \
+                    any(key not in ret for key in ('return', 'jid')):
+                continue
+            # A minion only returns its own jobs
+            ret['id'] = load['id']
+            if ret['jid'] == 'req' or self.opts['master_ext_job_cache'] \
+                    or not self.opts['job_cache'] \
+                    or self.opts.get('ext_job_cache'):
+                self._return(ret)
+                continue
+            rets.append(ret)
+        if rets:
+            for ret in rets:
+                self.__fire_return(ret)
+            # Store all of the returns in one go
+            self.__job_cache('returner_batch')(rets)
+        return True
 
     def minion_runner(self, clear_load):
         '''
@@ -1619,9 +1919,9 @@ class AESFuncs(object):
                 )
             )
             return self.crypticle.dumps(False)
-        # Don't encrypt the return value for the _return func
+        # Don't encrypt the return value for the _return funcs
         # (we don't care about the return value, so why encrypt it?)
-        if func == '_return':
+        if func in ('_return', '_return_batch'):
             return ret
         if func == '_pillar' and 'id' in load:
             if load.get('ver') != '2' and self.opts['pillar_version'] == 1:
@@ -1680,6 +1980,13 @@ class ClearFuncs(object):
                 rend=False)
         # Make a wheel object
         self.wheel_ = salt.wheel.Wheel(opts)
+        # The parsed public keys of the accepted minions by id, with the stat
+        # of the key file they were read from
+        self.pub_cache = {}
+        # The signature of the digest of the AES key sent to the minions
+        self.aes_sig = (None, None)
+        # The second and the number of minions authenticated in it
+        self.auth_admitted = (0, 0)
 
     def __check_permissions(self, filename):
         '''
@@ -1774,6 +2081,60 @@ class ClearFuncs(object):
             self.opts.get('autosign_file', None)
         )
 
+    def __pub_stat(self, pubfn):
+        '''
+        Return what tells if the key file changed, None if it is missing
+        '''
+        try:
+            stat = os.stat(pubfn)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime)
+
+    def __cached_pub(self, id_, pubfn):
+        '''
+        Return the cached public key string and RSA object of an accepted
+        minion, None if the key file changed since it was read. Accepting,
+        rejecting and deleting a key with salt-key moves the key file, which
+        drops the cached key.
+        '''
+        entry = self.pub_cache.get(id_)
+        if entry is None:
+            return None
+        if entry[0] != self.__pub_stat(pubfn):
+            self.pub_cache.pop(id_)
+            return None
+        return entry[1:]
+
+    def __admit_auth(self):
+        '''
+        Return whether another minion can be authenticated in this second,
+        see auth_rate_limit
+        '''
+        if not self.opts['auth_rate_limit']:
+            return True
+        now = int(time.time())
+        second, count = self.auth_admitted
+        if second != now:
+            second, count = now, 0
+        if count >= self.opts['auth_rate_limit']:
+            return False
+        self.auth_admitted = (second, count + 1)
+        return True
+
+    def __sign_aes(self, aes):
+        '''
+        Sign the digest of the AES key, the signature of the shared AES key is
+        made once
+        '''
+        if self.aes_sig[0] == aes:
+            return self.aes_sig[1]
+        digest = hashlib.sha256(aes).hexdigest()
+        sig = self.master_key.key.private_encrypt(digest, 5)
+        if aes == self.opts['aes']:
+            self.aes_sig = (aes, sig)
+        return sig
+
     def _auth(self, load):
         '''
         Authenticate the client, use the sent public key to encrypt the AES key
@@ -1798,9 +2159,16 @@ class ClearFuncs(object):
                     'load': {'ret': False}}
         log.info('Authentication request from {id}'.format(**load))
 
-        # Check if key is configured to be auto-rejected/signed
-        auto_reject = self.__check_autoreject(load['id'])
-        auto_sign = self.__check_autosign(load['id'])
+        if not self.__admit_auth():
+            # Too many minions are authenticating, have this one try again
+            # after acceptance_wait_time. The minions which do not know about
+            # defer take the reply for a key waiting in pending
+            log.debug(
+                'Authentication request from {id} deferred, over the '
+                'auth_rate_limit'.format(**load)
+            )
+            return {'enc': 'clear',
+                    'load': {'ret': True, 'defer': True}}
 
         pubfn = os.path.join(self.opts['pki_dir'],
                 'minions',
@@ -1814,6 +2182,18 @@ class ClearFuncs(object):
         pubfn_denied = os.path.join(self.opts['pki_dir'],
                 'minions_denied',
                 load['id'])
+
+        if not self.opts['open_mode'] and not os.path.isfile(pubfn_rejected):
+            # The key of an accepted minion which authenticated before is
+            # not read from the disk again as long as the key file is the same
+            cached = self.__cached_pub(load['id'], pubfn)
+            if cached is not None and cached[0] == load['pub']:
+                return self.__auth_accepted(load, cached[1])
+
+        # Check if key is configured to be auto-rejected/signed
+        auto_reject = self.__check_autoreject(load['id'])
+        auto_sign = self.__check_autosign(load['id'])
+
         if self.opts['open_mode']:
             # open mode is turned on, nuts to checks and overwrite whatever
             # is there
@@ -1979,11 +2359,13 @@ class ClearFuncs(object):
             return {'enc': 'clear',
                     'load': {'ret': False}}
 
-        log.info('Authentication accepted from {id}'.format(**load))
         # only write to disk if you are adding the file, and in open mode,
         # which implies we accept any key from a minion (key needs to be
-        # written every time because what's on disk is used for encrypting)
-        if not os.path.isfile(pubfn) or self.opts['open_mode']:
+        # written every time it changes because what's on disk is used for
+        # encrypting)
+        if not os.path.isfile(pubfn) or (
+                self.opts['open_mode'] and
+                salt.utils.fopen(pubfn, 'r').read() != load['pub']):
             with salt.utils.fopen(pubfn, 'w+') as fp_:
                 fp_.write(load['pub'])
         pub = None
@@ -1996,7 +2378,15 @@ class ClearFuncs(object):
             log.error('Corrupt public key "{0}": {1}'.format(pubfn, err))
             return {'enc': 'clear',
                     'load': {'ret': False}}
+        self.pub_cache[load['id']] = (
+            self.__pub_stat(pubfn), load['pub'], pub)
+        return self.__auth_accepted(load, pub)
 
+    def __auth_accepted(self, load, pub):
+        '''
+        Send the AES key to an accepted minion, encrypted with its public key
+        '''
+        log.info('Authentication accepted from {id}'.format(**load))
         ret = {'enc': 'pub',
                'pub_key': self.master_key.get_pub_str(),
                'publish_port': self.opts['publish_port'],
@@ -2029,8 +2419,7 @@ class ClearFuncs(object):
             aes = self.opts['aes']
             ret['aes'] = pub.public_encrypt(self.opts['aes'], 4)
         # Be aggressive about the signature
-        digest = hashlib.sha256(aes).hexdigest()
-        ret['sig'] = self.master_key.key.private_encrypt(digest, 5)
+        ret['sig'] = self.__sign_aes(aes)
         eload = {'result': True,
                  'act': 'accept',
                  'id': load['id'],
@@ -2536,17 +2925,13 @@ class ClearFuncs(object):
                 }
         # Retrieve the jid
         if not clear_load['jid']:
-            clear_load['jid'] = salt.utils.prep_jid(
-                    self.opts['cachedir'],
-                    self.opts['hash_type'],
-                    extra.get('nocache', False)
+            fstr = '{0}.prep_jid'.format(self.opts['master_job_cache'])
+            clear_load['jid'] = self.mminion.returners[fstr](
+                    nocache=extra.get('nocache', False)
                     )
-        self.event.fire_event({'minions': minions}, clear_load['jid'])
-        jid_dir = salt.utils.jid_dir(
-                clear_load['jid'],
-                self.opts['cachedir'],
-                self.opts['hash_type']
-                )
+        self.event.fire_event({'minions': minions}, clear_load['jid'])  # old dup event
+        self.event.fire_event({'minions': minions},
+                              tagify([clear_load['jid'], 'minions'], 'job'))
 
         new_job_load = {
                 'jid': clear_load['jid'],
@@ -2562,19 +2947,12 @@ class ClearFuncs(object):
         self.event.fire_event(new_job_load, 'new_job')  # old dup event
         self.event.fire_event(new_job_load, tagify([clear_load['jid'], 'new'], 'job'))
 
-        # Verify the jid dir
-        if not os.path.isdir(jid_dir):
-            os.makedirs(jid_dir)
         # Save the invocation information
-        self.serial.dump(
-                clear_load,
-                salt.utils.fopen(os.path.join(jid_dir, '.load.p'), 'w+b')
-                )
+        fstr = '{0}.save_load'.format(self.opts['master_job_cache'])
+        self.mminion.returners[fstr](clear_load['jid'], clear_load)
         # save the minions to a cache so we can see in the UI
-        self.serial.dump(
-                minions,
-                salt.utils.fopen(os.path.join(jid_dir, '.minions.p'), 'w+b')
-                )
+        fstr = '{0}.save_minions'.format(self.opts['master_job_cache'])
+        self.mminion.returners[fstr](clear_load['jid'], minions)
         if self.opts['ext_job_cache']:
             try:
                 fstr = '{0}.save_load'.format(self.opts['ext_job_cache'])
@@ -2632,6 +3010,13 @@ class ClearFuncs(object):
         log.debug('Published command details {0}'.format(load))
 
         payload['load'] = self.crypticle.dumps(load)
+        # The minions decrypt the small header to tell whether they are
+        # targeted before they check and decrypt the whole load, the older
+        # minions ignore it
+        header = {'tgt': load['tgt'], 'jid': load['jid'], 'fun': load['fun']}
+        if 'tgt_type' in load:
+            header['tgt_type'] = load['tgt_type']
+        payload['header'] = self.crypticle.dumps(header)
         if self.opts['sign_pub_messages']:
             master_pem_path = os.path.join(self.opts['pki_dir'], 'master.pem')
             log.debug("Signing data packet")
@@ -2643,7 +3028,17 @@ class ClearFuncs(object):
             os.path.join(self.opts['sock_dir'], 'publish_pull.ipc')
             )
         pub_sock.connect(pull_uri)
-        pub_sock.send(self.serial.dumps(payload))
+        package = self.serial.dumps(payload)
+        if self.opts['zmq_filtering']:
+            int_payload = {'payload': package}
+            # The syndics publish to minions this master does not know about
+            if not self.opts.get('order_masters') and \
+                    salt.utils.minions.exact_target(
+                        clear_load['tgt'], clear_load.get('tgt_type', 'glob')):
+                # Only send the publication to the targeted minions
+                int_payload['topic_lst'] = minions
+            package = self.serial.dumps(int_payload)
+        pub_sock.send(package)
         return {
             'enc': 'clear',
             'load': {
@@ -10,6 +10,7 @@ import getpass
 import multiprocessing
 import fnmatch
 import copy
+import collections
 import os
 import hashlib
 import re
@@ -565,11 +566,242 @@ class MultiMinion(MinionBase):
                 minion['generator'].next()
 
 
+class WorkerPool(object):
+    '''
+    A pool of processes, forked from the minion with its modules loaded, which
+    run the published jobs one after the other. The jobs wait in a queue of at
+    most queue_size jobs for a free worker. A worker is replaced when it dies,
+    for instance because its job was killed with saltutil.kill_job, when its
+    job runs for more than timeout seconds, after it ran recycle jobs, and
+    when the minion reloads its modules.
+    '''
+    # True in the worker processes
+    in_worker = False
+
+    def __init__(self, minion, size, queue_size=100, timeout=0, recycle=0,
+                 poller=None):
+        self.minion = minion
+        self.size = size
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.recycle = recycle
+        # The pipes of the workers are registered with the poller of the
+        # minion to wake it up as soon as a job is done
+        self.poller = poller
+        self.workers = []
+        self.pending = collections.deque()
+
+    def start(self):
+        '''
+        Start the workers
+        '''
+        while len(self.workers) < self.size:
+            self._spawn()
+
+    def _spawn(self):
+        parent, child = multiprocessing.Pipe()
+        proc = multiprocessing.Process(target=self._work, args=(child,))
+        proc.start()
+        child.close()
+        worker = {'proc': proc,
+                  'conn': parent,
+                  'data': None,
+                  'started': None,
+                  'jobs': 0,
+                  'retire': False}
+        self.workers.append(worker)
+        if self.poller is not None:
+            self.poller.register(parent.fileno(), zmq.POLLIN)
+        log.debug('Started minion worker {0}'.format(proc.pid))
+        return worker
+
+    def _work(self, conn):
+        '''
+        The loop of a worker process, run the jobs sent by the minion
+        '''
+        WorkerPool.in_worker = True
+        while True:
+            try:
+                data = conn.recv()
+            except (EOFError, IOError):
+                break
+            if data is None:
+                break
+            if isinstance(data['fun'], (list, tuple)):
+                target = Minion._thread_multi_return
+            else:
+                target = Minion._thread_return
+            try:
+                target(self.minion, self.minion.opts, data)
+            except Exception:
+                log.error(
+                    'The minion worker failed to run job {0}'.format(
+                        data['jid']),
+                    exc_info=True
+                )
+            conn.send(data['jid'])
+
+    def _remove(self, worker):
+        self.workers.remove(worker)
+        if self.poller is not None:
+            self.poller.unregister(worker['conn'].fileno())
+        worker['conn'].close()
+
+    def _stop(self, worker):
+        '''
+        Stop an idle worker
+        '''
+        try:
+            worker['conn'].send(None)
+        except (IOError, OSError):
+            pass
+        self._remove(worker)
+        worker['proc'].join(1)
+        if worker['proc'].is_alive():
+            worker['proc'].terminate()
+            worker['proc'].join()
+
+    def _lost(self, worker, reason):
+        '''
+        Clean up after a worker which died or was killed in the middle of a
+        job
+        '''
+        self._remove(worker)
+        worker['proc'].join()
+        data = worker['data']
+        if data is None:
+            return
+        log.warning(
+            'The minion worker {0} running job {1} {2}'.format(
+                worker['proc'].pid, data['jid'], reason))
+        fn_ = os.path.join(self.minion.proc_dir, data['jid'])
+        if os.path.isfile(fn_):
+            try:
+                os.remove(fn_)
+            except (OSError, IOError):
+                pass
+
+    def _timed_out(self, worker):
+        '''
+        Kill the worker of a job which ran too long and return an error for
+        the job
+        '''
+        try:
+            os.kill(worker['proc'].pid, signal.SIGKILL)
+        except OSError:
+            pass
+        data = worker['data']
+        self._lost(worker, 'timed out')
+        ret = {'jid': data['jid'],
+               'fun': data['fun'],
+               'fun_args': data['arg'],
+               'success': False,
+               'retcode': 1,
+               'return': 'The job ran for more than the minion_worker_timeout '
+                         'of {0} seconds and was killed'.format(self.timeout)}
+        try:
+            self.minion._return_pub(ret)
+        except Exception:
+            log.error('Failed to return the timeout of job {0}'.format(
+                data['jid']), exc_info=True)
+
+    def _done(self, worker):
+        worker['data'] = None
+        worker['started'] = None
+        if self.recycle and worker['jobs'] >= self.recycle:
+            worker['retire'] = True
+
+    def _fill(self):
+        '''
+        Replace the retired workers, start the missing ones and hand the
+        pending jobs to the idle workers
+        '''
+        for worker in list(self.workers):
+            if worker['retire'] and worker['data'] is None:
+                self._stop(worker)
+        while len([worker for worker in self.workers
+                   if not worker['retire']]) < self.size:
+            self._spawn()
+        for worker in list(self.workers):
+            if not self.pending:
+                break
+            if worker['retire'] or worker['data'] is not None:
+                continue
+            data = self.pending.popleft()
+            try:
+                worker['conn'].send(data)
+            except (IOError, OSError):
+                self.pending.appendleft(data)
+                self._lost(worker, 'died')
+                continue
+            worker['data'] = data
+            worker['started'] = time.time()
+            worker['jobs'] += 1
+
+    def submit(self, data):
+        '''
+        Queue a job for the workers, return False if the queue is full
+        '''
+        if len(self.pending) >= self.queue_size:
+            return False
+        self.pending.append(data)
+        self._fill()
+        return True
+
+    def process(self):
+        '''
+        Collect the finished jobs, kill the jobs running for too long, replace
+        the dead workers and start the pending jobs
+        '''
+        now = time.time()
+        for worker in list(self.workers):
+            try:
+                while worker['conn'].poll():
+                    worker['conn'].recv()
+                    self._done(worker)
+            except (EOFError, IOError):
+                pass
+            if not worker['proc'].is_alive():
+                self._lost(worker, 'died')
+            elif self.timeout and worker['data'] is not None \
+                    and now - worker['started'] > self.timeout:
+                self._timed_out(worker)
+        self._fill()
+
+    def recycle_all(self):
+        '''
+        Replace every worker, once its job is done, with a worker forked from
+        the current state of the minion
+        '''
+        for worker in self.workers:
+            worker['retire'] = True
+        self._fill()
+
+    def stop(self):
+        '''
+        Stop the workers, the jobs they are running are killed
+        '''
+        self.pending.clear()
+        for worker in list(self.workers):
+            self._remove(worker)
+            worker['proc'].terminate()
+            worker['proc'].join()
+
+
 class Minion(MinionBase):
     '''
     This class instantiates a minion, runs connections for a minion,
     and loads all of the functions into the minion
     '''
+    # The WorkerPool running the jobs, started by tune_in when minion_workers
+    # is set
+    pool = None
+    # The returns handed over by the jobs, a list once tune_in batches the
+    # returns, see return_batch_delay
+    _return_queue = None
+    _return_due = None
+    _return_batch_unsupported = False
+
     def __init__(self, opts, timeout=60, safe=True):
         '''
         Pass in the options dict
@@ -693,11 +925,46 @@ class Minion(MinionBase):
         Takes a payload from the master publisher and does whatever the
         master wants done.
         '''
+        if payload['enc'] == 'aes' and 'header' in payload and \
+                not self._pub_targeted(payload['header']):
+            return
         {'aes': self._handle_aes,
          'pub': self._handle_pub,
          'clear': self._handle_clear}[payload['enc']](payload['load'],
                                                       payload['sig'] if 'sig' in payload else None)
 
+    def _pub_targeted(self, header):
+        '''
+        Return whether the publication with the AES encrypted header targets
+        this minion, without decrypting its load
+        '''
+        try:
+            data = self.crypticle.loads(header)
+        except AuthenticationError:
+            # Let the load go through the reauth of _handle_aes
+            return True
+        if not isinstance(data, dict) or 'tgt' not in data:
+            return True
+        if not self._target_match(data):
+            log.trace('Publication {0} does not target this minion'.format(
+                data.get('jid')))
+            return False
+        return True
+
+    def _target_match(self, data):
+        '''
+        Return whether the target of the publication matches this minion
+        '''
+        if 'tgt_type' in data:
+            match_func = getattr(self.matcher,
+                                 '{0}_match'.format(data['tgt_type']), None)
+            if match_func is None or not match_func(data['tgt']):
+                return False
+        else:
+            if not self.matcher.glob_match(data['tgt']):
+                return False
+        return True
+
     def _handle_aes(self, load, sig=None):
         '''
         Takes the AES encrypted load, checks the signature if pub signatures
@@ -723,6 +990,13 @@ class Minion(MinionBase):
             self.authenticate()
             data = self.crypticle.loads(load)
 
+        if 'aes_next' in data:
+            # The master announced its next AES key, roll over to it
+            log.debug('Rolling over to the next AES key of the master')
+            self.crypticle.rollover(data['aes_next'])
+            self.aes = data['aes_next']
+            return
+
         # Verify that the publication is valid
         if 'tgt' not in data or 'jid' not in data or 'fun' not in data \
            or 'arg' not in data:
@@ -735,14 +1009,8 @@ class Minion(MinionBase):
         # pre-processing on the master and this minion should not see the
         # publication if the master does not determine that it should.
 
-        if 'tgt_type' in data:
-            match_func = getattr(self.matcher,
-                                 '{0}_match'.format(data['tgt_type']), None)
-            if match_func is None or not match_func(data['tgt']):
-                return
-        else:
-            if not self.matcher.glob_match(data['tgt']):
-                return
+        if not self._target_match(data):
+            return
         # If the minion does not have the function, don't execute,
         # this prevents minions that could not load a minion module
         # from returning a predictable exception
@@ -782,6 +1050,15 @@ class Minion(MinionBase):
                 self.functions, self.returners = self._load_modules()
                 self.schedule.functions = self.functions
                 self.schedule.returners = self.returners
+                if self.pool is not None:
+                    self.pool.recycle_all()
+        if self.pool is not None:
+            if self.pool.submit(data):
+                return
+            log.warning(
+                'The queue of the minion workers is full, running job {0} '
+                'in a new process'.format(data['jid'])
+            )
         if isinstance(data['fun'], tuple) or isinstance(data['fun'], list):
             target = Minion._thread_multi_return
         else:
@@ -817,7 +1094,7 @@ class Minion(MinionBase):
         if not minion_instance:
             minion_instance = cls(opts)
         fn_ = os.path.join(minion_instance.proc_dir, data['jid'])
-        if opts['multiprocessing']:
+        if opts['multiprocessing'] and not WorkerPool.in_worker:
             salt.utils.daemonize_if(opts)
         sdata = {'pid': os.getpid()}
         sdata.update(data)
@@ -980,7 +1257,6 @@ class Minion(MinionBase):
                     # The file is gone already
                     pass
         log.info('Returning information for job: {0}'.format(jid))
-        sreq = salt.payload.SREQ(self.opts['master_uri'])
         if ret_cmd == '_syndic_return':
             load = {'cmd': ret_cmd,
                     'id': self.opts['id'],
@@ -1004,19 +1280,19 @@ class Minion(MinionBase):
         else:
             if isinstance(oput, string_types):
                 load['out'] = oput
-        try:
-            ret_val = sreq.send('aes', self.crypticle.dumps(load))
-        except SaltReqTimeoutError:
-            msg = ('The minion failed to return the job information for job '
-                   '{0}. This is often due to the master being shut down or '
-                   'overloaded. If the master is running consider incresing '
-                   'the worker_threads value.').format(jid)
-            log.warn(msg)
-            return ''
-        if isinstance(ret_val, string_types) and not ret_val:
-            # The master AES key has changed, reauth
-            self.authenticate()
-            ret_val = sreq.send('aes', self.crypticle.dumps(load))
+        if ret_cmd == '_return' and self._return_queue is not None \
+                and self._batch_return(load):
+            ret_val = True
+        else:
+            try:
+                ret_val = self._send_master(load)
+            except SaltReqTimeoutError:
+                msg = ('The minion failed to return the job information for '
+                       'job {0}. This is often due to the master being shut '
+                       'down or overloaded. If the master is running consider '
+                       'incresing the worker_threads value.').format(jid)
+                log.warn(msg)
+                return ''
         if self.opts['cache_jobs']:
             # Local job cache has been enabled
             fn_ = os.path.join(
@@ -1030,6 +1306,100 @@ class Minion(MinionBase):
             salt.utils.fopen(fn_, 'w+b').write(self.serial.dumps(ret))
         return ret_val
 
+    def _send_master(self, load):
+        '''
+        Send an AES encrypted load to the master and return its answer,
+        authenticate again if the master AES key changed
+        '''
+        sreq = salt.payload.SREQ(self.opts['master_uri'])
+        ret_val = sreq.send('aes', self.crypticle.dumps(load))
+        if isinstance(ret_val, string_types) and not ret_val:
+            # The master AES key has changed, reauth
+            self.authenticate()
+            ret_val = sreq.send('aes', self.crypticle.dumps(load))
+        return ret_val
+
+    def _batch_return(self, load):
+        '''
+        Hand the return load of a job to the minion process, which sends the
+        returns of the jobs finished within return_batch_delay together
+        '''
+        try:
+            return salt.utils.event.MinionEvent(**self.opts).fire_event(
+                load, 'minion_return')
+        except Exception:
+            log.debug('Unable to hand the return of job {0} to the minion '
+                      'process'.format(load.get('jid')), exc_info=True)
+            return False
+
+    def _queue_return(self, load):
+        '''
+        Queue a return handed over by a job until the batch is due
+        '''
+        load.pop('_stamp', None)
+        if not self._return_queue:
+            self._return_due = time.time() + self.opts['return_batch_delay']
+        self._return_queue.append(load)
+
+    def _return_wait(self, loop_interval):
+        '''
+        Return how long the main loop can wait before the queued returns are
+        due
+        '''
+        if not self._return_queue:
+            return loop_interval
+        return max(0, min(loop_interval, self._return_due - time.time()))
+
+    def _flush_returns(self):
+        '''
+        Send the returns which are due to the master in one request
+        '''
+        if not self._return_queue or time.time() < self._return_due:
+            return
+        loads = self._return_queue
+        self._return_queue = []
+        if len(loads) > 1 and not self._return_batch_unsupported:
+            try:
+                ret_val = self._send_master({'cmd': '_return_batch',
+                                             'id': self.opts['id'],
+                                             'returns': loads})
+            except SaltReqTimeoutError:
+                log.warn('The minion failed to return the job information '
+                         'for jobs {0}'.format(
+                             ', '.join(load['jid'] for load in loads)))
+                return
+            if not isinstance(ret_val, string_types):
+                return
+            # A master without _return_batch answers with an encrypted False
+            log.info('The master does not take batches of returns, sending '
+                     'them one by one')
+            self._return_batch_unsupported = True
+        for load in loads:
+            try:
+                self._send_master(load)
+            except SaltReqTimeoutError:
+                log.warn('The minion failed to return the job information '
+                         'for job {0}'.format(load['jid']))
+
+    def _start_workers(self):
+        '''
+        Set up the batching of the returns and start the worker pool, the
+        workers are forked after the return queue is set up so that their
+        jobs hand the returns over to the minion process as well
+        '''
+        if self.opts['return_batch_delay'] > 0:
+            self._return_queue = []
+        if self.opts['minion_workers'] > 0 and self.opts['multiprocessing'] \
+                and not salt.utils.is_windows():
+            self.pool = WorkerPool(
+                self,
+                self.opts['minion_workers'],
+                self.opts['minion_worker_queue'],
+                self.opts['minion_worker_timeout'],
+                self.opts['minion_worker_recycle'],
+                self.poller)
+            self.pool.start()
+
     def _state_run(self):
         '''
         Execute a state run based on information set in the minion config file
@@ -1130,8 +1500,31 @@ class Minion(MinionBase):
             tagify([self.opts['id'], 'start'], 'minion'),
         )
 
+    def _subscribe(self):
+        '''
+        Subscribe to the publications of the master, with zmq_filtering only
+        to the ones sent to every minion and the ones targeted at this minion
+        '''
+        if self.opts.get('zmq_filtering'):
+            self.socket.setsockopt(
+                zmq.SUBSCRIBE, salt.payload.BROADCAST_TOPIC)
+            self.socket.setsockopt(
+                zmq.SUBSCRIBE, salt.payload.pub_topic(self.opts['id']))
+        else:
+            self.socket.setsockopt(zmq.SUBSCRIBE, '')
+
+    def _recv_payload(self):
+        '''
+        Receive a publication, with zmq_filtering the payload follows its
+        topic
+        '''
+        if self.opts.get('zmq_filtering'):
+            return self.serial.loads(
+                self.socket.recv_multipart(zmq.NOBLOCK)[-1])
+        return self.serial.loads(self.socket.recv(zmq.NOBLOCK))
+
     def _setsockopts(self):
-        self.socket.setsockopt(zmq.SUBSCRIBE, '')
+        self._subscribe()
         self.socket.setsockopt(zmq.IDENTITY, self.opts['id'])
         self._set_ipv4only()
         self._set_reconnect_ivl_max()
@@ -1165,10 +1558,12 @@ class Minion(MinionBase):
             acceptance_wait_time_max = acceptance_wait_time
         while True:
             creds = auth.sign_in(timeout, safe)
-            if creds != 'retry':
+            if creds not in ('retry', 'defer'):
                 log.info('Authentication with master successful!')
                 break
-            log.info('Waiting for minion key to be accepted by the master.')
+            if creds == 'retry':
+                log.info(
+                    'Waiting for minion key to be accepted by the master.')
             time.sleep(acceptance_wait_time)
             if acceptance_wait_time < acceptance_wait_time_max:
                 acceptance_wait_time += acceptance_wait_time
@@ -1184,6 +1579,9 @@ class Minion(MinionBase):
         self.functions, self.returners = self._load_modules()
         self.schedule.functions = self.functions
         self.schedule.returners = self.returners
+        if self.pool is not None:
+            # The workers were forked with the old modules
+            self.pool.recycle_all()
 
     def pillar_refresh(self):
         '''
@@ -1283,6 +1681,8 @@ class Minion(MinionBase):
 
         self._fire_master_minion_start()
 
+        self._start_workers()
+
         # Make sure to gracefully handle SIGUSR1
         enable_sigusr1_handler()
 
@@ -1320,7 +1720,9 @@ class Minion(MinionBase):
         while self._running is True:
             loop_interval = self.process_schedule(self, loop_interval)
             try:
-                socks = self._do_poll(loop_interval)
+                socks = self._do_poll(self._return_wait(loop_interval))
+                if self.pool is not None:
+                    self.pool.process()
                 self._do_socket_recv(socks)
 
                 # Check the event system
@@ -1342,12 +1744,19 @@ class Minion(MinionBase):
                             tag, data = salt.utils.event.MinionEvent.unpack(package)
                             log.debug('Forwarding master event tag={tag}'.format(tag=data['tag']))
                             self._fire_master(data['data'], data['tag'], data['events'], data['pretag'])
+                        elif package.startswith('minion_return'):
+                            tag, data = salt.utils.event.MinionEvent.unpack(package)
+                            self._queue_return(data)
 
-                        self.epub_sock.send(package)
+                        # The returns are only for the master
+                        if not package.startswith('minion_return'):
+                            self.epub_sock.send(package)
                     except Exception:
                         log.debug('Exception while handling events', exc_info=True)
                     # Add an extra fallback in case a forked process leeks through
                     multiprocessing.active_children()
+                if self._return_queue:
+                    self._flush_returns()
 
             except zmq.ZMQError as exc:
                 # The interrupt caused by python handling the
@@ -1408,7 +1817,7 @@ class Minion(MinionBase):
 
     def _do_socket_recv(self, socks):
         if socks.get(self.socket) == zmq.POLLIN:
-            payload = self.serial.loads(self.socket.recv(zmq.NOBLOCK))
+            payload = self._recv_payload()
             log.trace('Handling payload')
             self._handle_payload(payload)
 
@@ -1417,6 +1826,9 @@ class Minion(MinionBase):
         Tear down the minion
         '''
         self._running = False
+        if self.pool is not None:
+            self.pool.stop()
+            self.pool = None
         if hasattr(self, 'poller'):
             if isinstance(self.poller.sockets, dict):
                 for socket in self.poller.sockets.keys():
@@ -1453,6 +1865,12 @@ class Syndic(Minion):
         opts['loop_interval'] = 1
         super(Syndic, self).__init__(opts)
 
+    def _pub_targeted(self, header):
+        '''
+        The syndic passes every publication on to its minions
+        '''
+        return True
+
     def _handle_aes(self, load, sig=None):
         '''
         Takes the AES encrypted load, decrypts it, and runs the encapsulated
@@ -1527,7 +1945,7 @@ class Syndic(Minion):
         # Share the poller with the event object
         self.poller = self.local.event.poller
         self.socket = self.context.socket(zmq.SUB)
-        self.socket.setsockopt(zmq.SUBSCRIBE, '')
+        self._subscribe()
         self.socket.setsockopt(zmq.IDENTITY, self.opts['id'])
         if hasattr(zmq, 'RECONNECT_IVL_MAX'):
             self.socket.setsockopt(
@@ -1604,7 +2022,7 @@ class Syndic(Minion):
 
     def _process_cmd_socket(self):
         try:
-            payload = self.serial.loads(self.socket.recv(zmq.NOBLOCK))
+            payload = self._recv_payload()
         except zmq.ZMQError as e:
             # Swallow errors for bad wakeups or signals needing processing
             if e.errno != errno.EAGAIN and e.errno != errno.EINTR:
@@ -1642,10 +2060,8 @@ class Syndic(Minion):
                 if not jdict:
                     jdict['__fun__'] = event['data'].get('fun')
                     jdict['__jid__'] = event['data']['jid']
-                    jdict['__load__'] = salt.utils.jid_load(
-                        event['data']['jid'],
-                        self.local.opts['cachedir'],
-                        self.opts['hash_type'])
+                    jdict['__load__'] = self.local.get_cache_load(
+                        event['data']['jid'])
                 jdict[event['data']['id']] = event['data']['return']
             else:
                 # Add generic event aggregation here
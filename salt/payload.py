@@ -8,6 +8,7 @@ in here
 # Import python libs
 #import sys  # Use of sys is commented out below
 import logging
+import hashlib
 
 # Import salt libs
 import salt.log
@@ -24,6 +25,10 @@ except ImportError:
 
 log = logging.getLogger(__name__)
 
+# The zeromq topic of the publications sent to every minion, see
+# zmq_filtering
+BROADCAST_TOPIC = 'broadcast'
+
 try:
     # Attempt to import msgpack
     import msgpack
@@ -46,6 +51,14 @@ except ImportError:
         #sys.exit(1)
 
 
+def pub_topic(minion_id):
+    '''
+    Return the zeromq topic of the publications targeted at the minion, see
+    zmq_filtering
+    '''
+    return hashlib.sha1(minion_id).hexdigest()
+
+
 def package(payload):
     '''
     This method for now just wraps msgpack.dumps, but it is here so that
@@ -152,11 +165,16 @@ class Serial(object):
 class SREQ(object):
     '''
     Create a generic interface to wrap salt zeromq req calls.
+
+    The socket is made in the passed zeromq context, which is left to its
+    owner, or in a context of its own.
     '''
-    def __init__(self, master, id_='', serial='msgpack', linger=0):
+    def __init__(self, master, id_='', serial='msgpack', linger=0,
+                 context=None):
         self.master = master
         self.serial = Serial(serial)
-        self.context = zmq.Context()
+        self.term_context = context is None
+        self.context = context or zmq.Context()
         self.socket = self.context.socket(zmq.REQ)
         if hasattr(zmq, 'RECONNECT_IVL_MAX'):
             self.socket.setsockopt(
@@ -176,11 +194,24 @@ class SREQ(object):
         '''
         Takes two arguments, the encryption type and the base payload
         '''
+        self.send_nowait(enc, load)
+        return self.recv(tries, timeout)
+
+    def send_nowait(self, enc, load):
+        '''
+        Send the payload without waiting for the reply, which has to be
+        picked up with recv before the next send
+        '''
         payload = {'enc': enc}
         payload['load'] = load
         pkg = self.serial.dumps(payload)
         self.socket.send(pkg)
         self.poller.register(self.socket, zmq.POLLIN)
+
+    def recv(self, tries=1, timeout=60):
+        '''
+        Wait for the reply to the last payload sent
+        '''
         tried = 0
         while True:
             polled = self.poller.poll(timeout * 1000)
@@ -219,7 +250,7 @@ class SREQ(object):
         if self.socket.closed is False:
             self.socket.setsockopt(zmq.LINGER, 1)
             self.socket.close()
-        if self.context.closed is False:
+        if self.term_context and self.context.closed is False:
             self.context.term()
 
     def __del__(self):
@@ -5,17 +5,30 @@ Render the pillar data
 
 # Import python libs
 import os
+import copy
+import json
+import time
+import hashlib
 import collections
 import logging
 
+# Import third party libs
+try:
+    import zmq
+    HAS_ZMQ = True
+except ImportError:
+    HAS_ZMQ = False
+
 # Import salt libs
+import salt.utils
 import salt.loader
 import salt.fileclient
 import salt.minion
 import salt.crypt
 import salt.transport
+import salt.utils.event
 from salt._compat import string_types
-from salt.template import compile_template
+from salt.template import compile_template, render_pipe
 from salt.utils.dictupdate import update
 from salt.utils.odict import OrderedDict
 from salt.version import __version__
@@ -23,6 +36,9 @@ from salt.version import __version__
 
 log = logging.getLogger(__name__)
 
+# The renderers whose output only depends on the SLS file
+CONTEXT_FREE_RENDERERS = frozenset(['yaml', 'json', 'msgpack'])
+
 
 def get_pillar(opts, grains, id_, saltenv=None, ext=None, env=None):
     '''
@@ -85,11 +101,183 @@ class RemotePillar(object):
         return ret_pillar
 
 
+class PillarCache(object):
+    '''
+    Keep the pillar data compiled on the master in memory, by minion and by
+    rendered SLS file.
+
+    The pillar of a minion is kept under the key of its id, grains, saltenv,
+    the ext_pillar config and the mtimes of the files in the pillar_roots. A
+    rendered SLS file is kept under the key of the file, its mtime and the
+    include defaults. Unless the file renders to the same data for every
+    minion, the key also holds the id and grains of the minion and the mtimes
+    of the files in the pillar_roots, which the templates may import. Entries expire after
+    pillar_cache_ttl seconds and the events tagged with one of the
+    pillar_cache_events prefixes drop the whole cache.
+    '''
+    def __init__(self, opts):
+        self.opts = opts
+        self.ttl = opts['pillar_cache_ttl']
+        self.minions = {}
+        self.sls = {}
+        # Whether the SLS files render the same for every minion by (path,
+        # mtime)
+        self.context_free = {}
+        self.roots = (0, None)
+        self.pruned = time.time()
+        self.event = None
+        if opts['pillar_cache_events'] and HAS_ZMQ:
+            self.event = salt.utils.event.MasterEvent(
+                opts['sock_dir'], shards=opts.get('master_event_shards'))
+            for tag in opts['pillar_cache_events']:
+                self.event.subscribe(tag)
+            self.event.unsubscribe('')
+
+    def _hash(self, data):
+        return hashlib.md5(
+            json.dumps(data, sort_keys=True, default=repr)).hexdigest()
+
+    def _roots_hash(self):
+        '''
+        Return the hash of the mtimes of the files in the pillar_roots,
+        walked at most once a second
+        '''
+        now = time.time()
+        if now - self.roots[0] < 1:
+            return self.roots[1]
+        mtimes = []
+        for saltenv in sorted(self.opts['pillar_roots']):
+            for path in self.opts['pillar_roots'][saltenv]:
+                for root, dirs, files in os.walk(path):
+                    for name in [root] + [os.path.join(root, fn_)
+                                          for fn_ in files]:
+                        try:
+                            mtimes.append((name, os.path.getmtime(name)))
+                        except OSError:
+                            pass
+        self.roots = (now, self._hash(mtimes))
+        return self.roots[1]
+
+    def _fresh(self, entry):
+        return self.ttl <= 0 or time.time() - entry[0] < self.ttl
+
+    def _events(self):
+        '''
+        Drop the cache if an invalidation event was fired since the last
+        call
+        '''
+        if self.event is None:
+            return
+        fired = False
+        while True:
+            try:
+                self.event.sub.recv(zmq.NOBLOCK)
+                fired = True
+            except zmq.ZMQError:
+                break
+        if fired:
+            log.debug('Pillar cache invalidated by an event')
+            self.clear()
+
+    def _prune(self):
+        '''
+        Drop the expired entries, once every pillar_cache_ttl seconds
+        '''
+        if self.ttl <= 0 or time.time() - self.pruned < self.ttl:
+            return
+        for cache in (self.minions, self.sls):
+            for key in [key for key, entry in cache.items()
+                        if not self._fresh(entry)]:
+                cache.pop(key)
+        self.pruned = time.time()
+
+    def clear(self):
+        '''
+        Drop all the cached pillar data
+        '''
+        self.minions = {}
+        self.sls = {}
+        self.context_free = {}
+
+    def key(self, id_, grains, saltenv=None, ext=None):
+        '''
+        Return the key of the pillar of a minion
+        '''
+        return self._hash([id_, grains, saltenv, ext,
+                           self.opts.get('ext_pillar'), self._roots_hash()])
+
+    def get(self, key):
+        '''
+        Return a copy of the cached pillar, None if it has to be compiled
+        '''
+        self._events()
+        entry = self.minions.get(key)
+        if entry is None or not self._fresh(entry):
+            return None
+        return copy.deepcopy(entry[1])
+
+    def set(self, key, pillar):
+        '''
+        Cache the pillar compiled for a minion
+        '''
+        self._prune()
+        self.minions[key] = (time.time(), copy.deepcopy(pillar))
+
+    def _context_free(self, fn_, mtime):
+        if (fn_, mtime) not in self.context_free:
+            pipe = set(render_pipe(fn_, self.opts['renderer']))
+            free = pipe <= CONTEXT_FREE_RENDERERS
+            if not free and pipe - CONTEXT_FREE_RENDERERS == set(['jinja']):
+                # A file without any jinja markup is not templated
+                with salt.utils.fopen(fn_, 'r') as ifile:
+                    data = ifile.read()
+                free = not any(mark in data for mark in ('{{', '{%', '{#'))
+            self.context_free[(fn_, mtime)] = free
+        return self.context_free[(fn_, mtime)]
+
+    def sls_key(self, opts, fn_, saltenv, sls, defaults):
+        '''
+        Return the key of a SLS file rendered with the opts of a minion, None
+        if the file can not be cached
+        '''
+        try:
+            mtime = os.path.getmtime(fn_)
+            data = [fn_, mtime, saltenv, sls, defaults]
+            if not self._context_free(fn_, mtime):
+                # A template can import or include the other files of the
+                # pillar_roots
+                data.extend([opts['id'], opts['grains'], self._roots_hash()])
+        except (IOError, OSError):
+            return None
+        return self._hash(data)
+
+    def get_sls(self, key):
+        '''
+        Return a copy of the cached render of a SLS file, None if it has to
+        be rendered
+        '''
+        entry = self.sls.get(key)
+        if entry is None or not self._fresh(entry):
+            return None
+        return copy.deepcopy(entry[1])
+
+    def set_sls(self, key, state):
+        '''
+        Cache the render of a SLS file
+        '''
+        if key is None or state is None:
+            return
+        self._prune()
+        self.sls[key] = (time.time(), copy.deepcopy(state))
+
+
 class Pillar(object):
     '''
     Read over the pillar top files and render the pillar data
     '''
-    def __init__(self, opts, grains, id_, saltenv, ext=None, functions=None):
+    def __init__(self, opts, grains, id_, saltenv, ext=None, functions=None,
+                 cache=None):
+        self.cache = cache
         # Store the file_roots path so we can restore later. Issue 5449
         self.actual_file_roots = opts['file_roots']
         # use the local file client
@@ -354,15 +542,23 @@ class Pillar(object):
                 # return state, mods, errors
                 return None, mods, errors
         state = None
-        try:
-            state = compile_template(
-                fn_, self.rend, self.opts['renderer'], saltenv, sls, **defaults)
-        except Exception as exc:
-            msg = 'Rendering SLS {0!r} failed, render error:\n{1}'.format(
-                sls, exc
-            )
-            log.critical(msg)
-            errors.append(msg)
+        if self.cache is not None:
+            key = self.cache.sls_key(self.opts, fn_, saltenv, sls, defaults)
+            state = self.cache.get_sls(key)
+        if state is None:
+            try:
+                state = compile_template(
+                    fn_, self.rend, self.opts['renderer'], saltenv, sls,
+                    **defaults)
+            except Exception as exc:
+                msg = 'Rendering SLS {0!r} failed, render error:\n{1}'.format(
+                    sls, exc
+                )
+                log.critical(msg)
+                errors.append(msg)
+            else:
+                if self.cache is not None:
+                    self.cache.set_sls(key, state)
         mods.add(sls)
         nstate = None
         if state:
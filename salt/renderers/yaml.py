@@ -2,6 +2,7 @@
 from __future__ import absolute_import
 
 # Import python libs
+import collections
 import logging
 import warnings
 from yaml.scanner import ScannerError
@@ -57,7 +58,7 @@ def render(yaml_data, saltenv='base', sls='', argline='', **kws):
         if not data:
             data = {}
         else:
-            if isinstance(__salt__, dict):
+            if isinstance(__salt__, collections.Mapping):
                 if 'config.get' in __salt__:
                     if __salt__['config.get']('yaml_utf8', False):
                         data = _yaml_result_unicode_to_utf8(data)
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+'''
+Store the master job cache in a single indexed sqlite3 database
+
+:maturity:      New
+:depends:       None
+:platform:      All
+
+This is the default job cache of the master, it is used when the
+``master_job_cache`` option is left at ``local_cache``. Jobs and returns are
+kept in ``<cachedir>/jobs/jobs.db``, a database running in WAL mode so that
+the master workers can append returns while clients read them. Every job is
+a row keyed by its jid and every return a row keyed by jid and minion id, so
+a job with thousands of returns costs no inodes and expiring old jobs is a
+range delete on the jid index.
+
+Any returner which implements the same functions can be used as the master
+job cache::
+
+    master_job_cache: local_cache
+'''
+
+# Import python libs
+import os
+import shutil
+import logging
+import datetime
+import threading
+
+# Better safe than sorry here. Even though sqlite3 is included in python
+try:
+    import sqlite3
+    HAS_SQLITE3 = True
+except ImportError:
+    HAS_SQLITE3 = False
+
+# Import salt libs
+import salt.utils
+import salt.payload
+
+log = logging.getLogger(__name__)
+
+# Define the module's virtual name
+__virtualname__ = 'local_cache'
+
+# Seconds to wait on a lock held by another master process
+TIMEOUT = 30
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jids (
+    jid TEXT PRIMARY KEY,
+    nocache INTEGER NOT NULL DEFAULT 0,
+    load BLOB,
+    minions BLOB
+    );
+CREATE TABLE IF NOT EXISTS returns (
+    jid TEXT NOT NULL,
+    id TEXT NOT NULL,
+    ret BLOB,
+    out BLOB,
+    PRIMARY KEY (jid, id)
+    );
+'''
+
+# Connections can neither cross a fork nor a thread
+_LOCAL = threading.local()
+
+
+def __virtual__():
+    if not HAS_SQLITE3:
+        return False
+    return __virtualname__
+
+
+def _db_path():
+    '''
+    Return the path to the job cache database
+    '''
+    return os.path.join(__opts__['cachedir'], 'jobs', 'jobs.db')
+
+
+def _get_conn():
+    '''
+    Return the sqlite3 connection of this process and thread, creating the
+    database when needed
+    '''
+    path = _db_path()
+    key = (os.getpid(), path)
+    conns = _LOCAL.__dict__.setdefault('conns', {})
+    if key not in conns:
+        jobs_dir = os.path.dirname(path)
+        if not os.path.isdir(jobs_dir):
+            os.makedirs(jobs_dir)
+        conn = sqlite3.connect(path, timeout=TIMEOUT)
+        conn.text_factory = str
+        conn.execute('PRAGMA journal_mode=WAL')
+        # Commits go to the write ahead log without an fsync, the log is
+        # synced in batches when it is checkpointed
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(SCHEMA)
+        conns[key] = conn
+    return conns[key]
+
+
+def _dumps(data):
+    '''
+    Serialize data for a blob column
+    '''
+    return sqlite3.Binary(salt.payload.Serial(__opts__).dumps(data))
+
+
+def _loads(blob):
+    '''
+    Deserialize a blob column
+    '''
+    if blob is None:
+        return None
+    return salt.payload.Serial(__opts__).loads(bytes(blob))
+
+
+def _store_returns(conn, loads):
+    '''
+    Insert the returns in loads within the current transaction, return a
+    list of the results of the single inserts
+    '''
+    ret = []
+    for load in loads:
+        out = _dumps(load['out']) if 'out' in load else None
+        cur = conn.execute(
+            'INSERT OR IGNORE INTO returns (jid, id, ret, out) '
+            'SELECT ?, ?, ?, ? WHERE EXISTS '
+            '(SELECT 1 FROM jids WHERE jid = ? AND nocache = 0)',
+            (load['jid'], load['id'], _dumps(load['return']), out,
+             load['jid']))
+        if cur.rowcount == 1:
+            ret.append(True)
+            continue
+        row = conn.execute(
+            'SELECT nocache FROM jids WHERE jid = ?',
+            (load['jid'],)).fetchone()
+        if row is None:
+            log.error(
+                'An inconsistency occurred, a job was received with a job id '
+                'that is not present on the master: {jid}'.format(**load)
+            )
+            ret.append(False)
+        elif row[0]:
+            ret.append(None)
+        else:
+            # Minion has already returned this jid and it should be dropped
+            log.error(
+                'An extra return was detected from minion {0}, please verify '
+                'the minion, this could be a replay attack'.format(
+                    load['id']
+                )
+            )
+            ret.append(False)
+    return ret
+
+
+def prep_jid(nocache=False):
+    '''
+    Return a new job id and register it in the job cache
+    '''
+    conn = _get_conn()
+    while True:
+        jid = salt.utils.gen_jid()
+        try:
+            with conn:
+                conn.execute(
+                    'INSERT INTO jids (jid, nocache) VALUES (?, ?)',
+                    (jid, int(bool(nocache))))
+        except sqlite3.IntegrityError:
+            continue
+        return jid
+
+
+def returner(load):
+    '''
+    Save the return of a single minion
+    '''
+    conn = _get_conn()
+    with conn:
+        ret = _store_returns(conn, [load])[0]
+    if ret is False:
+        return False
+
+
+def returner_batch(loads):
+    '''
+    Save the returns of many minions in a single transaction, readers see
+    either none or all of them
+    '''
+    conn = _get_conn()
+    with conn:
+        _store_returns(conn, loads)
+
+
+def save_load(jid, load):
+    '''
+    Save the load of a job
+    '''
+    conn = _get_conn()
+    with conn:
+        conn.execute('INSERT OR IGNORE INTO jids (jid) VALUES (?)', (jid,))
+        conn.execute(
+            'UPDATE jids SET load = ? WHERE jid = ?', (_dumps(load), jid))
+
+
+def save_minions(jid, minions):
+    '''
+    Save the list of minions a job was published to
+    '''
+    conn = _get_conn()
+    with conn:
+        conn.execute('INSERT OR IGNORE INTO jids (jid) VALUES (?)', (jid,))
+        conn.execute(
+            'UPDATE jids SET minions = ? WHERE jid = ?',
+            (_dumps(list(minions)), jid))
+
+
+def get_load(jid):
+    '''
+    Return the load of a job, the targeted minions are added as ``Minions``
+    '''
+    row = _get_conn().execute(
+        'SELECT load, minions FROM jids WHERE jid = ?', (jid,)).fetchone()
+    if row is None or row[0] is None:
+        return {}
+    ret = _loads(row[0])
+    if row[1] is not None:
+        ret['Minions'] = _loads(row[1])
+    return ret
+
+
+def get_jid(jid):
+    '''
+    Return the returns of a job, keyed by minion id
+    '''
+    ret = {}
+    for id_, data, out in _get_conn().execute(
+            'SELECT id, ret, out FROM returns WHERE jid = ?', (jid,)):
+        ret[id_] = {'return': _loads(data)}
+        if out is not None:
+            ret[id_]['out'] = _loads(out)
+    return ret
+
+
+def get_jids():
+    '''
+    Return the loads of all cached jobs, keyed by jid
+    '''
+    ret = {}
+    for jid, load in _get_conn().execute(
+            'SELECT jid, load FROM jids WHERE load IS NOT NULL'):
+        ret[jid] = _loads(load)
+    return ret
+
+
+def clean_old_jobs():
+    '''
+    Remove the jobs which are older than ``keep_jobs`` hours
+    '''
+    if __opts__['keep_jobs'] == 0:
+        return
+    cutoff = '{0:%Y%m%d%H%M%S%f}'.format(
+        datetime.datetime.now() -
+        datetime.timedelta(hours=__opts__['keep_jobs']))
+    conn = _get_conn()
+    with conn:
+        # jids sort by time, anything shorter is not a valid jid
+        for table in ('returns', 'jids'):
+            conn.execute(
+                'DELETE FROM {0} WHERE jid < ? OR length(jid) < 18'.format(
+                    table),
+                (cutoff,))
+    # Drop what is left of the job directories of older releases
+    jobs_dir = os.path.dirname(_db_path())
+    for fn_ in os.listdir(jobs_dir):
+        path = os.path.join(jobs_dir, fn_)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
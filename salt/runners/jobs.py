@@ -3,12 +3,9 @@
 A convenience system to manage jobs, both active and already run
 '''
 
-# Import python libs
-import os
-
 # Import salt libs
 import salt.client
-import salt.payload
+import salt.loader
 import salt.utils
 import salt.output
 import salt.minion
@@ -37,18 +34,9 @@ def active():
                 ret[job['jid']].update({'Running': [], 'Returned': []})
             else:
                 ret[job['jid']]['Running'].append({minion: job['pid']})
+    get_jid = _job_cache('get_jid')
     for jid in ret:
-        jid_dir = salt.utils.jid_dir(
-                jid,
-                __opts__['cachedir'],
-                __opts__['hash_type'])
-        if not os.path.isdir(jid_dir):
-            continue
-        for minion in os.listdir(jid_dir):
-            if minion.startswith('.'):
-                continue
-            if os.path.exists(os.path.join(jid_dir, minion)):
-                ret[jid]['Returned'].append(minion)
+        ret[jid]['Returned'].extend(get_jid(jid))
     salt.output.display_output(ret, 'yaml', __opts__)
     return ret
 
@@ -80,10 +68,8 @@ def lookup_jid(jid, ext_source=None, output=True):
         return ret
 
     # Fall back to the local job cache
-    client = salt.client.LocalClient(__opts__['conf_file'])
-
-    for mid, data in client.get_full_returns(jid, [], 0).items():
-        ret[mid] = data.get('ret')
+    for mid, data in _job_cache('get_jid')(jid).items():
+        ret[mid] = data.get('return')
         if output:
             salt.output.display_output(
                 {mid: ret[mid]},
@@ -103,19 +89,14 @@ def list_job(jid):
 
         salt-run jobs.list_job 20130916125524463507
     '''
-    serial = salt.payload.Serial(__opts__)
     ret = {}
-    jid_dir = salt.utils.jid_dir(jid, __opts__['cachedir'], __opts__['hash_type'])
-    load_path = os.path.join(jid_dir, '.load.p')
-    minions_path = os.path.join(jid_dir, '.minions.p')
-    if os.path.isfile(load_path):
-        load = serial.load(salt.utils.fopen(load_path, 'rb'))
+    load = _job_cache('get_load')(jid)
+    if load:
         jid = load['jid']
         ret = _format_jid_instance(jid, load)
         ret.update({'jid': jid})
-        if os.path.isfile(minions_path):
-            minions = serial.load(salt.utils.fopen(minions_path, 'rb'))
-            ret['Minions'] = minions
+        if 'Minions' in load:
+            ret['Minions'] = load['Minions']
 
     salt.output.display_output(ret, 'yaml', __opts__)
     return ret
@@ -140,8 +121,7 @@ def list_jobs(ext_source=None):
         return ret
 
     ret = {}
-    job_dir = os.path.join(__opts__['cachedir'], 'jobs')
-    for jid, job, t_path, final in _walk_through(job_dir):
+    for jid, job in _job_cache('get_jids')().items():
         ret[jid] = _format_jid_instance(jid, job)
     salt.output.display_output(ret, 'yaml', __opts__)
     return ret
@@ -157,25 +137,14 @@ def print_job(job_id):
 
         salt-run jobs.print_job
     '''
-    serial = salt.payload.Serial(__opts__)
     ret = {}
-    job_dir = os.path.join(__opts__['cachedir'], 'jobs')
-    for jid, job, t_path, final in _walk_through(job_dir):
-        if job_id == jid:
-            hosts_path = os.path.join(t_path, final)
-            hosts_return = {}
-            for host in os.listdir(hosts_path):
-                host_path = os.path.join(hosts_path, host)
-                if os.path.isdir(host_path):
-                    return_file = os.path.join(host_path, 'return.p')
-                    if not os.path.isfile(return_file):
-                        continue
-                    return_data = serial.load(
-                        salt.utils.fopen(return_file, 'rb')
-                    )
-                    hosts_return[host] = return_data
-                    ret[jid] = _format_jid_instance(jid, job)
-                    ret[jid].update({'Result': hosts_return})
+    job = _job_cache('get_load')(job_id)
+    hosts_return = {}
+    for host, data in _job_cache('get_jid')(job_id).items():
+        hosts_return[host] = data['return']
+    if job and hosts_return:
+        ret[job_id] = _format_jid_instance(job_id, job)
+        ret[job_id].update({'Result': hosts_return})
 
     salt.output.display_output(ret, 'yaml', __opts__)
     return ret
@@ -196,18 +165,10 @@ def _format_jid_instance(jid, job):
     return ret
 
 
-def _walk_through(job_dir):
-    serial = salt.payload.Serial(__opts__)
-
-    for top in os.listdir(job_dir):
-        t_path = os.path.join(job_dir, top)
-
-        for final in os.listdir(t_path):
-            load_path = os.path.join(t_path, final, '.load.p')
-
-            if not os.path.isfile(load_path):
-                continue
-
-            job = serial.load(salt.utils.fopen(load_path, 'rb'))
-            jid = job['jid']
-            yield jid, job, t_path, final
+def _job_cache(fun):
+    '''
+    Return the named function of the master job cache
+    '''
+    returners = salt.loader.returners(
+            __opts__, {}, whitelist=[__opts__['master_job_cache']])
+    return returners['{0}.{1}'.format(__opts__['master_job_cache'], fun)]
@@ -14,26 +14,35 @@ The data sent to the state calls is as follows:
 
 # Import python libs
 import os
+import re
 import sys
 import copy
+import json
 import site
+import select
 import fnmatch
 import logging
 import traceback
+import hashlib
 import datetime
+import collections
+import multiprocessing
 
 # Import salt libs
 import salt.utils
 import salt.loader
 import salt.minion
 import salt.pillar
+import salt.payload
 import salt.fileclient
 import salt.utils.event
+import salt.utils.jinja
+import salt.utils.atomicfile
 import salt.syspaths as syspaths
 from salt.utils import context
 from salt._compat import string_types
 from salt.utils.immutabletypes import ImmutableLazyProxy
-from salt.template import compile_template, compile_template_str
+from salt.template import compile_template, compile_template_str, render_pipe
 from salt.exceptions import SaltRenderError, SaltReqTimeoutError, SaltException
 from salt.utils.odict import OrderedDict, DefaultOrderedDict
 
@@ -67,6 +76,26 @@ STATE_INTERNAL_KEYWORDS = frozenset([
     '__pub_tgt_type',
 ])
 
+# The characters which make a requisite value a glob, see RequisiteIndex
+GLOB_CHARS = frozenset('*?[')
+
+# The renderers whose output only depends on the SLS file, the templates it
+# loads through the jinja loader and the opts, see RenderCache
+RENDER_CACHE_RENDERERS = frozenset(['jinja', 'yaml', 'json', 'msgpack'])
+
+# The calls of execution modules in a template, the render cache can not see
+# what they return so the templates making them are not cached
+RENDER_CACHE_CALL_RE = re.compile(r'(?<![\w.])(?:__salt__|salt)\s*[\[.]')
+
+# The opts which change from one state run to the next without changing what
+# the SLS files render to
+RENDER_CACHE_VOLATILE_OPTS = ('fun', 'arg', 'jid')
+
+# The order state_auto_order gives the first state, and the orders from
+# AUTO_ORDER_END on are the last and negative orders, see order_group
+AUTO_ORDER_START = 10000
+AUTO_ORDER_END = 1000000
+
 
 def split_low_tag(tag):
     '''
@@ -115,13 +144,41 @@ def state_args(id_, state, high):
     return args
 
 
-def find_name(name, state, high):
+def name_index(high):
     '''
-    Scan high data for the id referencing the given name
+    Map the (state, value) pairs of the arguments in the high data to the id
+    find_name finds for them
+    '''
+    index = {}
+    for nid in high:
+        if not isinstance(high[nid], dict):
+            continue
+        for state, args in high[nid].items():
+            if not isinstance(args, list):
+                continue
+            for arg in args:
+                if not isinstance(arg, dict):
+                    continue
+                if len(arg) != 1:
+                    continue
+                try:
+                    index[(state, arg[next(iter(arg))])] = nid
+                except TypeError:
+                    # Unhashable, it can not be a name
+                    continue
+    return index
+
+
+def find_name(name, state, high, index=None):
+    '''
+    Scan high data for the id referencing the given name, the index made by
+    name_index saves the scan
     '''
     ext_id = ''
     if name in high:
         ext_id = name
+    elif index is not None and ishashable(name):
+        ext_id = index.get((state, name), '')
     else:
         # We need to scan for the name
         for nid in high:
@@ -187,6 +244,19 @@ def master_compile(master_opts, minion_opts, grains, id_, saltenv):
     return st_.compile_highstate()
 
 
+def order_group(low):
+    '''
+    Return the order group of a chunk for call_chunks_parallel. The chunks
+    ordered by state_auto_order and the chunks without an order share one
+    group, every other order is a group of its own.
+    '''
+    order = low.get('order')
+    if not isinstance(order, int) or \
+            AUTO_ORDER_START <= order < AUTO_ORDER_END:
+        return AUTO_ORDER_START
+    return order
+
+
 def ishashable(obj):
     try:
         hash(obj)
@@ -195,6 +265,316 @@ def ishashable(obj):
     return True
 
 
+class RequisiteIndex(object):
+    '''
+    Find the chunks a requisite matches without scanning every chunk. A
+    requisite matches the chunks of its state whose name or id match its
+    value, and a sls requisite the chunks whose sls matches and whose name
+    or id do not. Values without glob characters are looked up in maps of
+    the chunks by (state, id), (state, name) and sls, the others are matched
+    against every chunk with fnmatch.
+    '''
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.by_id = {}
+        self.by_name = {}
+        self.by_sls = {}
+        for num, chunk in enumerate(chunks):
+            for index, key in ((self.by_id, (chunk['state'], chunk['__id__'])),
+                               (self.by_name, (chunk['state'], chunk['name']))):
+                if ishashable(key):
+                    index.setdefault(key, []).append(num)
+            # The high data passed to state.high or rendered from a template
+            # string has no sls
+            sls = chunk.get('__sls__')
+            if sls is not None and ishashable(sls):
+                self.by_sls.setdefault(sls, []).append(num)
+
+    def _scan(self, req_key, req_val):
+        '''
+        Match the requisite against every chunk
+        '''
+        ret = []
+        for chunk in self.chunks:
+            if (fnmatch.fnmatch(chunk['name'], req_val) or
+                fnmatch.fnmatch(chunk['__id__'], req_val)):
+                if chunk['state'] == req_key:
+                    ret.append(chunk)
+            elif req_key == 'sls':
+                # Allow requisite tracking of entire sls files
+                if fnmatch.fnmatch(chunk['__sls__'], req_val):
+                    ret.append(chunk)
+        return ret
+
+    def match(self, req_key, req_val):
+        '''
+        Return the chunks the requisite req_key: req_val matches, in the
+        order of the chunks
+        '''
+        if req_val is None:
+            return []
+        if not isinstance(req_val, string_types) or \
+                GLOB_CHARS.intersection(req_val):
+            return self._scan(req_key, req_val)
+        nums = set(self.by_id.get((req_key, req_val), []))
+        nums.update(self.by_name.get((req_key, req_val), []))
+        if req_key == 'sls':
+            for num in self.by_sls.get(req_val, []):
+                chunk = self.chunks[num]
+                if chunk['name'] != req_val and chunk['__id__'] != req_val:
+                    nums.add(num)
+        return [self.chunks[num] for num in sorted(nums)]
+
+
+class OrderBarriers(object):
+    '''
+    Hold the chunks run by call_chunks_parallel back until every chunk of a
+    lower order group before them in the run order has run. The run order
+    puts the requisites of a chunk before it, so the chunks a barrier waits
+    for never wait for the chunk behind it. Every group keeps the positions
+    of the chunks of the lower groups and up to where they all ran, so a
+    chunk which ran is checked once per group.
+    '''
+    def __init__(self, order, groups):
+        self.order = order
+        self.groups = groups
+        self.done = set()
+        self.values = sorted(set(groups.values()))[1:]
+        self.lower = {}
+        self.waiting = {}
+        self.ran = {}
+        for value in self.values:
+            self.lower[value] = [
+                num for num, tag in enumerate(order) if groups[tag] < value]
+            self.waiting[value] = collections.deque(
+                num for num, tag in enumerate(order) if groups[tag] == value)
+            self.ran[value] = 0
+
+    def held(self):
+        '''
+        Return the chunks which wait for a barrier
+        '''
+        return [self.order[num]
+                for value in self.values for num in self.waiting[value]]
+
+    def release(self, tag=None):
+        '''
+        Record that the chunk tag ran, return the chunks no longer held back
+        '''
+        if tag is not None:
+            self.done.add(tag)
+        ret = []
+        for value in self.values:
+            if tag is not None and self.groups[tag] >= value:
+                continue
+            lower = self.lower[value]
+            ran = self.ran[value]
+            while ran < len(lower) and self.order[lower[ran]] in self.done:
+                ran += 1
+            self.ran[value] = ran
+            limit = lower[ran] if ran < len(lower) else len(self.order)
+            waiting = self.waiting[value]
+            while waiting and waiting[0] < limit:
+                ret.append(self.order[waiting.popleft()])
+        return ret
+
+
+class RenderCache(object):
+    '''
+    Keep the rendered SLS files and the compiled chunks of the last highstate
+    in the cachedir. Every entry records the salt:// files it was built from
+    with their hashes, and the key of the pillar, grains and opts it was
+    built with; an entry is used as long as its key is the same and none of
+    its files changed. The files are refreshed from the master in one
+    request per environment and hashed once per run.
+    '''
+    def __init__(self, opts, client):
+        self.opts = opts
+        self.client = client
+        self.path = os.path.join(opts['cachedir'], 'state_render.p')
+        # Pickle keeps the OrderedDicts of the rendered data
+        self.serial = salt.payload.Serial('pickle')
+        self.hashes = {}
+        self.changed = False
+        # The files rendered for the current highstate, None once a SLS file
+        # was rendered without the cache
+        self.run_files = []
+        # The key of the SLS files rendered in this run
+        self.sls_key = None
+        self.data = {'sls': {}, 'highstate': {}}
+        if os.path.isfile(self.path):
+            try:
+                with salt.utils.fopen(self.path, 'rb') as fp_:
+                    self.data = self.serial.load(fp_)
+            except Exception:
+                log.debug(
+                    'Unable to read the state render cache {0}'.format(
+                        self.path))
+
+    def key(self, opts, **kwargs):
+        '''
+        Return the key of the data rendered with opts, its pillar and grains
+        included, and the kwargs
+        '''
+        data = dict((key, val) for key, val in opts.items()
+                    if key not in RENDER_CACHE_VOLATILE_OPTS)
+        data['__key__'] = kwargs
+        return hashlib.md5(
+            json.dumps(data, sort_keys=True, default=repr)).hexdigest()
+
+    def file_calls_modules(self, dest):
+        '''
+        Return whether the template dest calls execution modules
+        '''
+        try:
+            with salt.utils.fopen(dest, 'r') as fp_:
+                return RENDER_CACHE_CALL_RE.search(fp_.read()) is not None
+        except (IOError, OSError):
+            return False
+
+    def calls_modules(self, files):
+        '''
+        Return whether one of the [saltenv, path] templates cached on the
+        minion calls execution modules
+        '''
+        for saltenv, path in files:
+            dest = self.client.is_cached(path, saltenv)
+            if dest and self.file_calls_modules(dest):
+                return True
+        return False
+
+    def fetched(self, saltenv, path, dest):
+        '''
+        Record the hash of a file the state run fetched itself
+        '''
+        if (saltenv, path) not in self.hashes:
+            self.hashes[(saltenv, path)] = self._hash_file(dest)
+
+    def _hash_file(self, dest):
+        if not dest or not os.path.isfile(dest):
+            return ''
+        return salt.utils.get_hash(dest, 'md5')
+
+    def file_hashes(self, files):
+        '''
+        Refresh the [saltenv, path] files not seen yet in this run and return
+        the hashes of the files by (saltenv, path), '' for the missing files
+        '''
+        fetch = {}
+        for saltenv, path in files:
+            if (saltenv, path) not in self.hashes:
+                fetch.setdefault(saltenv, set()).add(path)
+        for saltenv, paths in fetch.items():
+            paths = sorted(paths)
+            dests = self.client.get_files(paths, saltenv)
+            for path, dest in zip(paths, dests):
+                self.hashes[(saltenv, path)] = self._hash_file(dest)
+        return dict(((saltenv, path), self.hashes[(saltenv, path)])
+                    for saltenv, path in files)
+
+    def record(self, files):
+        '''
+        Return the [saltenv, path] files with their hashes
+        '''
+        ret = []
+        for saltenv, path in files:
+            if [saltenv, path] not in [entry[:2] for entry in ret]:
+                ret.append([saltenv, path])
+        hashes = self.file_hashes(ret)
+        return [[saltenv, path, hashes[(saltenv, path)]]
+                for saltenv, path in ret]
+
+    def current(self, files):
+        '''
+        Return whether none of the recorded files changed
+        '''
+        hashes = self.file_hashes([entry[:2] for entry in files])
+        for saltenv, path, hsum in files:
+            if hashes[(saltenv, path)] != hsum:
+                return False
+        return True
+
+    def _get(self, entry, key):
+        if not entry or entry['key'] != key or \
+                not self.current(entry['files']):
+            return None
+        return entry
+
+    def _set(self, key, files, name, data):
+        try:
+            # Only keep the data the cache file can hold
+            self.serial.dumps(data)
+        except Exception:
+            return None
+        self.changed = True
+        return {'key': key,
+                'files': self.record(files),
+                name: copy.deepcopy(data)}
+
+    def get_sls(self, saltenv, sls, key):
+        '''
+        Return a copy of the cached render of the SLS file, None if it has to
+        be rendered again
+        '''
+        entry = self._get(
+            self.data['sls'].get('{0}:{1}'.format(saltenv, sls)), key)
+        if entry is None:
+            return None
+        if self.run_files is not None:
+            self.run_files.extend(entry['files'])
+        return copy.deepcopy(entry['state'])
+
+    def set_sls(self, saltenv, sls, key, files, state):
+        '''
+        Cache the render of the SLS file made from the [saltenv, path] files
+        '''
+        entry = self._set(key, files, 'state', state)
+        if entry is None:
+            self.run_files = None
+            return
+        self.data['sls']['{0}:{1}'.format(saltenv, sls)] = entry
+        if self.run_files is not None:
+            self.run_files.extend(entry['files'])
+
+    def get_chunks(self, key):
+        '''
+        Return the cached chunks of the highstate, None if it has to be
+        compiled again
+        '''
+        entry = self._get(self.data['highstate'], key)
+        if entry is None:
+            return None
+        return copy.deepcopy(entry['chunks'])
+
+    def set_chunks(self, key, chunks):
+        '''
+        Cache the chunks compiled from the SLS files rendered in this run
+        '''
+        if self.run_files is None:
+            return
+        entry = self._set(
+            key, [entry[:2] for entry in self.run_files], 'chunks', chunks)
+        if entry is not None:
+            self.data['highstate'] = entry
+
+    def save(self):
+        '''
+        Write the cache file if anything changed
+        '''
+        if not self.changed:
+            return
+        cumask = os.umask(077)
+        try:
+            with salt.utils.atomicfile.atomic_open(self.path, 'w+b') as fp_:
+                fp_.write(self.serial.dumps(self.data))
+            self.changed = False
+        except (IOError, OSError):
+            log.error(
+                'Unable to write the state render cache {0}'.format(self.path))
+        finally:
+            os.umask(cumask)
+
+
 class StateError(Exception):
     '''
     Custom exception class.
@@ -540,6 +920,7 @@ class State(object):
         self.pre = {}
         self.__run_num = 0
         self.jid = jid
+        self._requisite_index = None
 
     def _gather_pillar(self):
         '''
@@ -1104,6 +1485,7 @@ class State(object):
         req_in_all = req_in.union(set(['require', 'watch']))
         extend = {}
         errors = []
+        index = name_index(high)
         for id_, body in high.items():
             if not isinstance(body, dict):
                 continue
@@ -1200,7 +1582,7 @@ class State(object):
                                             )
                                 if key == 'prereq':
                                     # Add prerequired to prereqs
-                                    ext_id = find_name(name, _state, high)
+                                    ext_id = find_name(name, _state, high, index)
                                     if not ext_id:
                                         continue
                                     if ext_id not in extend:
@@ -1214,7 +1596,7 @@ class State(object):
                                 if key == 'use_in':
                                     # Add the running states args to the
                                     # use_in states
-                                    ext_id = find_name(name, _state, high)
+                                    ext_id = find_name(name, _state, high, index)
                                     if not ext_id:
                                         continue
                                     ext_args = state_args(ext_id, _state, high)
@@ -1240,7 +1622,7 @@ class State(object):
                                 if key == 'use':
                                     # Add the use state's args to the
                                     # running state
-                                    ext_id = find_name(name, _state, high)
+                                    ext_id = find_name(name, _state, high, index)
                                     if not ext_id:
                                         continue
                                     loc_args = state_args(id_, state, high)
@@ -1418,6 +1800,11 @@ class State(object):
         '''
         Iterate over a list of chunks and call them, checking for requires.
         '''
+        if self.opts.get('state_workers', 1) > 1 \
+                and not salt.utils.is_windows() \
+                and not any('prereq' in low or 'prerequired' in low
+                            for low in chunks):
+            return self.call_chunks_parallel(chunks)
         running = {}
         for low in chunks:
             if '__FAILHARD__' in running:
@@ -1431,6 +1818,271 @@ class State(object):
             self.active = set()
         return running
 
+    def requisite_chunks(self, low, chunks):
+        '''
+        Return the chunks the requisites of the low chunk match
+        '''
+        ret = []
+        for r_state in ('require', 'watch', 'prereq', 'prerequired',
+                        'postmortem'):
+            for req in low.get(r_state) or []:
+                req = trim_req(req)
+                req_key = next(iter(req))
+                ret.extend(self.requisite_index(chunks).match(
+                    req_key, req[req_key]))
+        return ret
+
+    def requisite_index(self, chunks):
+        '''
+        Return the RequisiteIndex of the chunks, which is only built again
+        for another list of chunks
+        '''
+        if self._requisite_index is None \
+                or self._requisite_index.chunks is not chunks:
+            self._requisite_index = RequisiteIndex(chunks)
+        return self._requisite_index
+
+    def parallel_safe(self, low):
+        '''
+        Return True if the state function of the chunk can run in a process
+        of its own at the same time as other states. A state module declares
+        this with __parallel__, True for all of its functions or a list of
+        function names.
+        '''
+        fun = '{0[state]}.{0[fun]}'.format(low)
+        if fun not in self.states:
+            return False
+        parallel = getattr(
+            sys.modules.get(self.states[fun].__module__), '__parallel__', False)
+        if parallel is True:
+            return True
+        return isinstance(parallel, (list, tuple)) and low['fun'] in parallel
+
+    def call_chunks_parallel(self, chunks):
+        '''
+        Call the chunks like call_chunks, starting each chunk as soon as the
+        chunks its requisites match have run, and the chunks of the lower
+        order groups before it in the run order, see order_group. The
+        parallel safe chunks run in up to state_workers processes of their
+        own, the other chunks run one at a time in this process. The chunks
+        are numbered in the order call_chunks would have run them.
+        '''
+        lows = OrderedDict()
+        for low in chunks:
+            lows.setdefault(_gen_tag(low), low)
+        deps = {}
+        for tag, low in lows.items():
+            deps[tag] = set(
+                _gen_tag(chunk) for chunk in self.requisite_chunks(low, chunks)
+            ) & set(lows)
+            deps[tag].discard(tag)
+
+        # Number the chunks depth first like call_chunk runs them
+        order = []
+        position = dict((tag, num) for num, tag in enumerate(lows))
+
+        def visit(tag, seen):
+            if tag in seen:
+                return
+            seen.add(tag)
+            for dep in sorted(deps[tag], key=position.get):
+                visit(dep, seen)
+            order.append(tag)
+        seen = set()
+        for tag in lows:
+            visit(tag, seen)
+        run_nums = dict((tag, self.__run_num + num)
+                        for num, tag in enumerate(order))
+        self.__run_num += len(order)
+
+        # Count what every chunk waits for, its requisites and its barrier
+        dependents = dict((tag, []) for tag in order)
+        left = {}
+        for tag in order:
+            left[tag] = len(deps[tag])
+            for dep in deps[tag]:
+                dependents[dep].append(tag)
+        barriers = OrderBarriers(
+            order, dict((tag, order_group(lows[tag])) for tag in order))
+        for tag in barriers.held():
+            left[tag] += 1
+        ready_procs = collections.deque()
+        ready_inline = collections.deque()
+        finished = set()
+
+        def queue(tag):
+            if self.parallel_safe(lows[tag]):
+                ready_procs.append(tag)
+            else:
+                ready_inline.append(tag)
+
+        def release(tags):
+            for tag in tags:
+                left[tag] -= 1
+                if not left[tag]:
+                    queue(tag)
+
+        def finish(tag):
+            if tag not in finished:
+                finished.add(tag)
+                release(dependents[tag] + barriers.release(tag))
+        for tag in order:
+            if not left[tag]:
+                queue(tag)
+        release(barriers.release())
+
+        workers = self.opts['state_workers']
+        running = {}
+        procs = {}
+        failhard = False
+        while True:
+            if failhard:
+                ready_procs.clear()
+                ready_inline.clear()
+            # Start the ready parallel safe chunks while there are workers,
+            # a chunk whose requisites failed or are not found runs here
+            inline = None
+            while ready_procs and len(procs) < workers:
+                tag = ready_procs.popleft()
+                if tag in running:
+                    finish(tag)
+                    continue
+                low = lows[tag]
+                self._mod_init(low)
+                status = self.check_requisite(low, running, chunks)
+                if status in ('met', 'change'):
+                    procs[tag] = self._start_chunk(
+                        low, status, running, chunks)
+                else:
+                    inline = tag, status
+                    break
+            while inline is None and ready_inline:
+                tag = ready_inline.popleft()
+                if tag in running:
+                    finish(tag)
+                    continue
+                low = lows[tag]
+                self._mod_init(low)
+                inline = tag, self.check_requisite(low, running, chunks)
+            if inline is not None:
+                tag, status = inline
+                low = lows[tag]
+                if status == 'unmet':
+                    # A requisite is not found, call_chunk reports it
+                    running = self.call_chunk(low, running, chunks)
+                    running[tag]['__run_num__'] = run_nums[tag]
+                else:
+                    self._finish_chunk(
+                        low,
+                        self._call_ready(low, status, running, chunks),
+                        running,
+                        run_nums[tag],
+                        chunks)
+                failhard = failhard or self.check_failhard(low, running)
+                finish(tag)
+            if procs:
+                # Only wait for a process when there is nothing to run here
+                conns = dict((conn, tag) for tag, (proc, conn) in procs.items())
+                timeout = None
+                if inline is not None or ready_inline \
+                        or ready_procs and len(procs) < workers:
+                    timeout = 0
+                for conn in select.select(list(conns), [], [], timeout)[0]:
+                    tag = conns[conn]
+                    proc = procs.pop(tag)[0]
+                    try:
+                        ret = conn.recv()
+                    except EOFError:
+                        ret = {'name': lows[tag]['name'],
+                               'result': False,
+                               'changes': {},
+                               'comment': 'The process running the state '
+                                          'exited without a return'}
+                    conn.close()
+                    proc.join()
+                    self.check_refresh(lows[tag], ret)
+                    self._finish_chunk(
+                        lows[tag], ret, running, run_nums[tag], chunks)
+                    failhard = failhard or \
+                        self.check_failhard(lows[tag], running)
+                    finish(tag)
+            elif inline is None and not ready_procs and not ready_inline:
+                pending = [tag for tag in order if tag not in finished]
+                if pending and not failhard:
+                    # The chunks left require each other, let call_chunk
+                    # report the recursive requisites
+                    for tag in pending:
+                        if tag not in running:
+                            running = self.call_chunk(
+                                lows[tag], running, chunks)
+                            self.active = set()
+                    for tag in pending:
+                        if tag in running:
+                            running[tag]['__run_num__'] = run_nums[tag]
+                    running.pop('__FAILHARD__', None)
+                break
+        return running
+
+    def _call_ready(self, low, status, running, chunks):
+        '''
+        Return the return of a chunk whose requisites have all run, given the
+        status check_requisite found for them
+        '''
+        if status == 'fail':
+            return {'name': low['name'],
+                    'changes': {},
+                    'result': False,
+                    'comment': 'One or more requisite failed',
+                    '__sls__': low['__sls__']}
+        ret = self.call(low, chunks, running)
+        if status == 'change' and not ret['changes']:
+            low = low.copy()
+            low['sfun'] = low['fun']
+            low['fun'] = 'mod_watch'
+            ret = self.call(low, chunks, running)
+        return ret
+
+    def _start_chunk(self, low, status, running, chunks):
+        '''
+        Call a chunk in a process of its own, return the process and the end
+        of the pipe its return comes back through
+        '''
+        conn, child_conn = multiprocessing.Pipe(False)
+        proc = multiprocessing.Process(
+            target=self._call_forked,
+            args=(low, status, running, chunks, child_conn))
+        proc.start()
+        child_conn.close()
+        return proc, conn
+
+    def _call_forked(self, low, status, running, chunks, conn):
+        '''
+        Call a chunk in the process started by _start_chunk and send its
+        return back
+        '''
+        # The module context holds the connections of the parent process,
+        # and the parent refreshes the modules once the return is back
+        self.state_con.clear()
+        self.check_refresh = lambda data, ret: None
+        try:
+            ret = self._call_ready(low, status, running, chunks)
+        except Exception:
+            ret = {'name': low['name'],
+                   'result': False,
+                   'changes': {},
+                   'comment': 'An exception occurred in this state: {0}'.format(
+                       traceback.format_exc())}
+        conn.send(ret)
+        conn.close()
+
+    def _finish_chunk(self, low, ret, running, run_num, chunks):
+        '''
+        Add the return of a chunk run by call_chunks_parallel to running
+        '''
+        ret['__run_num__'] = run_num
+        running[_gen_tag(low)] = ret
+        self.event(ret, len(chunks))
+
     def check_failhard(self, low, running):
         '''
         Check if the low data chunk should send a failhard signal
@@ -1473,24 +2125,12 @@ class State(object):
             if r_state in low and low[r_state] is not None:
                 for req in low[r_state]:
                     req = trim_req(req)
-                    found = False
-                    for chunk in chunks:
-                        req_key = next(iter(req))
-                        req_val = req[req_key]
-                        if req_val is None:
-                            continue
-                        if (fnmatch.fnmatch(chunk['name'], req_val) or
-                            fnmatch.fnmatch(chunk['__id__'], req_val)):
-                            if chunk['state'] == req_key:
-                                found = True
-                                reqs[r_state].append(chunk)
-                        elif req_key == 'sls':
-                            # Allow requisite tracking of entire sls files
-                            if fnmatch.fnmatch(chunk['__sls__'], req_val):
-                                found = True
-                                reqs[r_state].append(chunk)
+                    req_key = next(iter(req))
+                    found = self.requisite_index(chunks).match(
+                        req_key, req[req_key])
                     if not found:
                         return 'unmet'
+                    reqs[r_state].extend(found)
         fun_stats = set()
         for r_state, chunks in reqs.items():
             if r_state == 'prereq':
@@ -1569,28 +2209,16 @@ class State(object):
                     continue
                 for req in low[requisite]:
                     req = trim_req(req)
-                    found = False
-                    for chunk in chunks:
-                        req_key = next(iter(req))
-                        req_val = req[req_key]
-                        if req_val is None:
-                            continue
-                        if (fnmatch.fnmatch(chunk['name'], req_val) or
-                            fnmatch.fnmatch(chunk['__id__'], req_val)):
-                            if chunk['state'] == req_key:
-                                if requisite == 'prereq':
-                                    chunk['__prereq__'] = True
-                                elif requisite == 'prerequired':
-                                    chunk['__prerequired__'] = True
-                                reqs.append(chunk)
-                                found = True
-                        elif req_key == 'sls':
-                            # Allow requisite tracking of entire sls files
-                            if fnmatch.fnmatch(chunk['__sls__'], req_val):
-                                if requisite == 'prereq':
-                                    chunk['__prereq__'] = True
-                                reqs.append(chunk)
-                                found = True
+                    req_key = next(iter(req))
+                    found = self.requisite_index(chunks).match(
+                        req_key, req[req_key])
+                    for chunk in found:
+                        if requisite == 'prereq':
+                            chunk['__prereq__'] = True
+                        elif requisite == 'prerequired' \
+                                and chunk['state'] == req_key:
+                            chunk['__prerequired__'] = True
+                        reqs.append(chunk)
                     if not found:
                         lost[requisite].append(req)
             if lost['require'] or lost['watch'] or lost['prereq'] or lost['postmortem'] or lost.get('prerequired'):
@@ -1687,9 +2315,10 @@ class State(object):
             self.event(running[tag], len(chunks))
         return running
 
-    def call_high(self, high):
+    def compile_high(self, high):
         '''
-        Process a high data call and ensure the defined states.
+        Reconcile, verify and compile the high data, return the low chunks
+        and the errors
         '''
         errors = []
         # If there is extension data reconcile it
@@ -1697,19 +2326,25 @@ class State(object):
         errors += ext_errors
         errors += self.verify_high(high)
         if errors:
-            return errors
+            return [], errors
         high, req_in_errors = self.requisite_in(high)
         errors += req_in_errors
         high = self.apply_exclude(high)
         # Verify that the high data is structurally sound
         if errors:
-            return errors
+            return [], errors
         # Compile and verify the raw chunks
-        chunks = self.compile_high_data(high)
-        # If there are extensions in the highstate, process them and update
-        # the low data chunks
+        return self.compile_high_data(high), errors
+
+    def call_high(self, high):
+        '''
+        Process a high data call and ensure the defined states.
+        '''
+        chunks, errors = self.compile_high(high)
         if errors:
             return errors
+        # Index the chunks once for all of the requisite lookups of the run
+        self.requisite_index(chunks)
         ret = self.call_chunks(chunks)
         return ret
 
@@ -1822,10 +2457,12 @@ class BaseHighState(object):
     '''
     def __init__(self, opts):
         self.opts = self.__gen_opts(opts)
-        self.iorder = 10000
+        self.iorder = AUTO_ORDER_START
         self.avail = self.__gather_avail()
         self.serial = salt.payload.Serial(self.opts)
         self.building_highstate = {}
+        # The RenderCache of the running highstate, see call_highstate
+        self.render_cache = None
 
     def __gather_avail(self):
         '''
@@ -2091,6 +2728,48 @@ class BaseHighState(object):
             self.state.opts['pillar'] = self.state._gather_pillar()
         self.state.module_refresh()
 
+    def _render_sls(self, fn_, sls, saltenv, mods, source):
+        '''
+        Render the SLS file fn_, through the render cache when it is on
+        '''
+        cache = self.render_cache
+        if cache is not None and fn_ and set(render_pipe(
+                fn_, self.state.opts['renderer'])) <= RENDER_CACHE_RENDERERS \
+                and not cache.file_calls_modules(fn_):
+            key = cache.sls_key
+            cache.fetched(saltenv, source, fn_)
+            state = cache.get_sls(saltenv, sls, key)
+            if state is not None:
+                log.debug(
+                    'Using the cached render of SLS {0}:{1}'.format(
+                        saltenv, sls))
+                return state
+            files = [[saltenv, source]]
+            if source.endswith('/init.sls'):
+                # The SLS file is rendered from another file once it exists
+                files.append([saltenv, source[:-len('/init.sls')] + '.sls'])
+            salt.utils.jinja.SaltCacheLoader.recorded = files
+            try:
+                state = compile_template(
+                    fn_, self.state.rend, self.state.opts['renderer'],
+                    saltenv, sls, rendered_sls=mods
+                )
+            finally:
+                salt.utils.jinja.SaltCacheLoader.recorded = None
+            if cache.calls_modules(files[1:]):
+                # An imported template calls execution modules
+                cache.run_files = None
+            elif isinstance(state, dict):
+                cache.set_sls(saltenv, sls, key, files, state)
+            return state
+        if cache is not None:
+            # The highstate can not be cached without this render
+            cache.run_files = None
+        return compile_template(
+            fn_, self.state.rend, self.state.opts['renderer'], saltenv, sls,
+            rendered_sls=mods
+        )
+
     def render_state(self, sls, saltenv, mods, matches):
         '''
         Render a state file and retrieve all of the include states
@@ -2106,10 +2785,8 @@ class BaseHighState(object):
             )
         state = None
         try:
-            state = compile_template(
-                fn_, self.state.rend, self.state.opts['renderer'], saltenv,
-                sls, rendered_sls=mods
-            )
+            state = self._render_sls(
+                fn_, sls, saltenv, mods, state_data.get('source'))
         except SaltRenderError as exc:
             msg = 'Rendering SLS "{0}:{1}" failed: {2}'.format(
                 saltenv, sls, exc
@@ -2488,7 +3165,23 @@ class BaseHighState(object):
             err += ['Pillar failed to render with the following messages:']
             err += self.state.opts['pillar']['_errors']
         else:
+            if self.opts.get('state_render_cache'):
+                self.render_cache = RenderCache(self.opts, self.client)
+                self.render_cache.sls_key = self.render_cache.key(
+                    self.state.opts)
+                # The top file is rendered every time, external nodes and
+                # master tops can match other SLS files with the same files
+                run_key = self.render_cache.key(
+                    self.state.opts, matches=matches, exclude=exclude,
+                    avail=self.avail)
+                chunks = self.render_cache.get_chunks(run_key)
+                if chunks is not None:
+                    log.info('Nothing changed since the last highstate, '
+                             'running its compiled chunks')
+                    return self.state.call_chunks(chunks)
             high, errors = self.render_highstate(matches)
+            if self.render_cache is not None:
+                self.render_cache.save()
             if exclude:
                 if isinstance(exclude, str):
                     exclude = exclude.split(',')
@@ -2517,7 +3210,15 @@ class BaseHighState(object):
             log.error(msg.format(cfn))
 
         os.umask(cumask)
-        return self.state.call_high(high)
+        if self.render_cache is None:
+            return self.state.call_high(high)
+        chunks, errors = self.state.compile_high(high)
+        if errors:
+            return errors
+        self.render_cache.set_chunks(run_key, chunks)
+        self.render_cache.save()
+        self.state.requisite_index(chunks)
+        return self.state.call_chunks(chunks)
 
     def compile_highstate(self):
         '''
@@ -185,6 +185,10 @@ from salt._compat import string_types
 
 log = logging.getLogger(__name__)
 
+# The states which can run in a process of their own, alongside other states,
+# when state_workers is set
+__parallel__ = ['run', 'wait', 'script', 'wait_script']
+
 
 def _reinterpreted_state(state):
     '''
@@ -237,6 +237,11 @@ from salt._compat import string_types, integer_types
 
 log = logging.getLogger(__name__)
 
+# The states which can run in a process of their own, alongside other states,
+# when state_workers is set. The accumulators are left to the state process.
+__parallel__ = ['symlink', 'absent', 'exists', 'missing', 'managed',
+                'directory', 'recurse', 'touch', 'copy', 'rename']
+
 COMMENT_REGEX = r'^([[:space:]]*){0}[[:space:]]?'
 
 _ACCUMULATORS = {}
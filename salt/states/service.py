@@ -42,6 +42,10 @@ service, then set the reload value to True:
 
 '''
 
+# The states can run in a process of their own, alongside other states, when
+# state_workers is set
+__parallel__ = True
+
 
 def __virtual__():
     '''
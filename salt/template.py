@@ -153,6 +153,20 @@ for comb in """
     OLD_STYLE_RENDERERS[comb] = "%s|%s" % (tmpl, fmt)
 
 
+def render_pipe(template, default):
+    '''
+    Return the names of the renderers the template is rendered with, from its
+    shebang line or the default render pipe
+    '''
+    pipe = default
+    with salt.utils.fopen(template, 'r') as ifile:
+        line = ifile.readline()
+        if line.startswith('#!'):
+            pipe = line.strip()[2:]
+    pipe = OLD_STYLE_RENDERERS.get(pipe, pipe)
+    return [(part.strip() + ' ').split(' ', 1)[0] for part in pipe.split('|')]
+
+
 def check_render_pipe_str(pipestr, renderers):
     '''
     Check that all renderers specified in the pipe string are available.
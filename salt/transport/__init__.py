@@ -3,9 +3,20 @@
 Encapsulate the different transports available to Salt.  Currently this is only ZeroMQ.
 '''
 
+# Import python libs
+import collections
+
+# Import third party libs
+try:
+    import zmq
+except ImportError:
+    # Only the zeromq transport needs zmq
+    pass
+
 # Import Salt Libs
 import salt.payload
 import salt.auth
+from salt.exceptions import SaltReqTimeoutError
 try:
     from salt.transport.road.raet import stacking
     from salt.transport.road.raet import yarding
@@ -94,11 +105,15 @@ class ZeroMQChannel(Channel):
             else:
                 self.auth = salt.crypt.SAuth(opts)
         if 'master_uri' in kwargs:
-            master_uri = kwargs['master_uri']
+            self.master_uri = kwargs['master_uri']
         else:
-            master_uri = opts['master_uri']
+            self.master_uri = opts['master_uri']
 
-        self.sreq = salt.payload.SREQ(master_uri)
+        self.sreq = salt.payload.SREQ(self.master_uri)
+        # The extra sockets of send_iter, kept between calls, and the one
+        # zeromq context they share
+        self.window = []
+        self.window_context = None
 
     def crypted_transfer_decode_dictentry(self, load, dictkey=None, tries=3, timeout=60):
         ret = self.sreq.send('aes', self.auth.crypticle.dumps(load), tries, timeout)
@@ -143,3 +158,65 @@ class ZeroMQChannel(Channel):
         else:
             return self._uncrypted_transfer(load, tries, timeout)
         # Do we ever do non-crypted transfers?
+
+    def send_iter(self, loads, window=4, tries=3, timeout=60):
+        '''
+        Send the loads with up to window requests in flight at once and
+        yield the replies in the order of the loads. A REQ socket carries a
+        single request at a time, so the window is a set of sockets. The
+        loads are only drawn as sockets become free, the generator can be
+        closed at any time and the requests still in flight are drained.
+        '''
+        if self.window_context is None:
+            self.window_context = zmq.Context()
+        while len(self.window) < window:
+            self.window.append(salt.payload.SREQ(
+                self.master_uri, context=self.window_context))
+        idle = self.window[:window]
+        pending = collections.deque()
+        loads = iter(loads)
+        try:
+            while True:
+                for load in loads:
+                    if self.crypt != 'clear':
+                        load = self.auth.crypticle.dumps(load)
+                    sreq = idle.pop()
+                    sreq.send_nowait(self.crypt, load)
+                    pending.append(sreq)
+                    if not idle:
+                        break
+                if not pending:
+                    return
+                try:
+                    data = pending[0].recv(tries, timeout)
+                except SaltReqTimeoutError:
+                    self._reset_window()
+                    pending.clear()
+                    raise
+                idle.append(pending.popleft())
+                if self.crypt != 'clear' and data:
+                    data = self.auth.crypticle.loads(data)
+                yield data
+        finally:
+            try:
+                while pending:
+                    pending[0].recv(1, timeout)
+                    pending.popleft()
+            except SaltReqTimeoutError:
+                self._reset_window()
+
+    def _reset_window(self):
+        '''
+        The sockets of the window are stuck mid request, start over with new
+        ones on the next call of send_iter
+        '''
+        for sreq in self.window:
+            sreq.destroy()
+        self.window = []
+
+    def __del__(self):
+        # The sockets have to be closed before their context is terminated
+        if getattr(self, 'window_context', None) is not None:
+            self._reset_window()
+            self.window_context.term()
+            self.window_context = None
@@ -49,6 +49,7 @@ Namspaced tag
 
 # Import python libs
 import os
+import re
 import fnmatch
 import glob
 import hashlib
@@ -98,6 +99,7 @@ TAGS = {
     'wheel': 'wheel',  # prefix for all salt/wheel events
     'cloud': 'cloud',  # prefix for all salt/cloud events
     'fileserver': 'fileserver',  # prefix for all salt/fileserver events
+    'stats': 'stats',  # prefix for all salt/stats events (master worker stats)
 }
 
 
@@ -132,6 +134,17 @@ def tagify(suffix='', prefix='', base=SALT):
     return TAGPARTER.join([part for part in parts if part])
 
 
+def shard_uri(sock_dir, prefix):
+    '''
+    Return the URI of the master event PUB socket of the shard of the events
+    under the tag prefix
+    '''
+    return 'ipc://{0}'.format(os.path.join(
+        sock_dir,
+        'master_event_{0}_pub.ipc'.format(hashlib.md5(prefix).hexdigest()[:10])
+        ))
+
+
 class SaltEvent(object):
     '''
     The base class used to manage salt events
@@ -143,6 +156,15 @@ class SaltEvent(object):
         self.cpub = False
         self.cpush = False
         self.puburi, self.pulluri = self.__load_uri(sock_dir, node, **kwargs)
+        self.shard_uris = {}
+        # Moving between the shards needs to disconnect the SUB socket
+        if node == 'master' and hasattr(zmq.Socket, 'disconnect'):
+            for prefix in kwargs.get('shards') or []:
+                self.shard_uris[str(prefix)] = shard_uri(sock_dir, str(prefix))
+                salt.utils.check_ipc_path_max_len(
+                    self.shard_uris[str(prefix)])
+        self.suburi = None
+        self.subscriptions = set()
         self.pending_events = []
 
     def __load_uri(self, sock_dir, node, **kwargs):
@@ -192,24 +214,68 @@ class SaltEvent(object):
     def subscribe(self, tag=None):
         '''
         Subscribe to events matching the passed tag.
+
+        The tag is a prefix the publisher filters the events on, the events
+        of the other tags are not sent to this listener. The empty tag
+        subscribes to every event. Return whether the subscription is new.
         '''
+        tag = str(tag or '')
+        if tag in self.subscriptions:
+            return False
+        self.subscriptions.add(tag)
         if not self.cpub:
             self.connect_pub()
+        self.sub.setsockopt(zmq.SUBSCRIBE, tag)
+        self._route_pub()
+        return True
 
     def unsubscribe(self, tag=None):
         '''
         Un-subscribe to events matching the passed tag.
         '''
-        return
+        tag = str(tag or '')
+        if tag not in self.subscriptions:
+            return
+        self.subscriptions.remove(tag)
+        self.sub.setsockopt(zmq.UNSUBSCRIBE, tag)
+        self._route_pub()
+
+    def _pub_uri(self):
+        '''
+        Return the URI of the PUB socket to receive the subscribed events
+        from, the shard with the longest prefix all the subscriptions are
+        under or the socket of every event
+        '''
+        if self.subscriptions:
+            for prefix in sorted(self.shard_uris, key=len, reverse=True):
+                if all(tag.startswith(prefix) for tag in self.subscriptions):
+                    return self.shard_uris[prefix]
+        return self.puburi
+
+    def _route_pub(self):
+        '''
+        Move the SUB socket over to the PUB socket of the subscriptions. The
+        new socket is connected before the old one is disconnected, an event
+        published in between may be received twice but none is missed.
+        '''
+        uri = self._pub_uri()
+        if uri == self.suburi:
+            return
+        self.sub.connect(uri)
+        self.sub.disconnect(self.suburi)
+        log.debug('{0} moved from {1} to {2}'.format(
+            self.__class__.__name__, self.suburi, uri))
+        self.suburi = uri
 
     def connect_pub(self):
         '''
-        Establish the publish connection
+        Establish the publish connection, the events are received once they
+        are subscribed to
         '''
         self.sub = self.context.socket(zmq.SUB)
-        self.sub.connect(self.puburi)
+        self.suburi = self._pub_uri()
+        self.sub.connect(self.suburi)
         self.poller.register(self.sub, zmq.POLLIN)
-        self.sub.setsockopt(zmq.SUBSCRIBE, '')
         self.cpub = True
 
     def connect_pull(self, timeout=1000):
@@ -251,8 +317,11 @@ class SaltEvent(object):
         AND either return publication OR None IF no publication available.
 
         IF wait is 0 then block forever.
+
+        Without a subscription every event is subscribed to.
         '''
-        self.subscribe()
+        if not self.subscriptions:
+            self.subscribe()
 
         for evt in [x for x in self.pending_events if x['tag'].startswith(tag)]:
             self.pending_events.remove(evt)
@@ -415,9 +484,9 @@ class MasterEvent(SaltEvent):
     '''
     Create a master event management object
     '''
-    def __init__(self, sock_dir):
-        super(MasterEvent, self).__init__('master', sock_dir)
-        self.connect_pub()
+    def __init__(self, sock_dir, **kwargs):
+        super(MasterEvent, self).__init__('master', sock_dir, **kwargs)
+        self.subscribe()
 
 
 class LocalClientEvent(MasterEvent):
@@ -439,6 +508,9 @@ class EventPublisher(Process):
     '''
     The interface that takes master events and republishes them out to anyone
     who wants to listen
+
+    The events under each of the master_event_shards tag prefixes are
+    published on a socket of their own as well
     '''
     def __init__(self, opts):
         super(EventPublisher, self).__init__()
@@ -463,18 +535,29 @@ class EventPublisher(Process):
                 os.path.join(self.opts['sock_dir'], 'master_event_pull.ipc')
                 )
         salt.utils.check_ipc_path_max_len(epull_uri)
+        # Prepare the shard publishers
+        self.shard_socks = []
+        for prefix in self.opts.get('master_event_shards', []):
+            uri = shard_uri(self.opts['sock_dir'], str(prefix))
+            salt.utils.check_ipc_path_max_len(uri)
+            self.shard_socks.append(
+                (str(prefix), uri, self.context.socket(zmq.PUB)))
 
         # Start the master event publisher
         old_umask = os.umask(0177)
         try:
             self.epull_sock.bind(epull_uri)
             self.epub_sock.bind(epub_uri)
+            for prefix, uri, sock in self.shard_socks:
+                sock.bind(uri)
             if self.opts.get('client_acl') or self.opts.get('external_auth'):
                 os.chmod(
                         os.path.join(self.opts['sock_dir'],
                             'master_event_pub.ipc'),
                         0666
                         )
+                for prefix, uri, sock in self.shard_socks:
+                    os.chmod(uri[len('ipc://'):], 0666)
         finally:
             os.umask(old_umask)
         try:
@@ -484,6 +567,10 @@ class EventPublisher(Process):
                 try:
                     package = self.epull_sock.recv()
                     self.epub_sock.send(package)
+                    # The event starts with its tag
+                    for prefix, uri, sock in self.shard_socks:
+                        if package.startswith(prefix):
+                            sock.send(package)
                 except zmq.ZMQError as exc:
                     if exc.errno == errno.EINTR:
                         continue
@@ -492,6 +579,10 @@ class EventPublisher(Process):
             if self.epub_sock.closed is False:
                 self.epub_sock.setsockopt(zmq.LINGER, linger)
                 self.epub_sock.close()
+            for prefix, uri, sock in self.shard_socks:
+                if sock.closed is False:
+                    sock.setsockopt(zmq.LINGER, linger)
+                    sock.close()
             if self.epull_sock.closed is False:
                 self.epull_sock.setsockopt(zmq.LINGER, linger)
                 self.epull_sock.close()
@@ -566,6 +657,21 @@ class Reactor(multiprocessing.Process, salt.state.Compiler):
                     reactors.extend(val)
         return reactors
 
+    def subscriptions(self):
+        '''
+        Return the tag prefixes the events of the reactor map start with, a
+        reactor map read from a file can change so every event is subscribed
+        to then
+        '''
+        if isinstance(self.opts['reactor'], string_types):
+            return ['']
+        prefixes = set()
+        for ropt in self.opts['reactor']:
+            if not isinstance(ropt, dict) or len(ropt) != 1:
+                continue
+            prefixes.add(re.split(r'[*?[]', str(ropt.keys()[0]), 1)[0])
+        return sorted(prefixes)
+
     def reactions(self, tag, data, reactors):
         '''
         Render a list of reactor files and returns a reaction struct
@@ -593,7 +699,11 @@ class Reactor(multiprocessing.Process, salt.state.Compiler):
         '''
         Enter into the server loop
         '''
-        self.event = SaltEvent('master', self.opts['sock_dir'])
+        self.event = SaltEvent('master',
+                               self.opts['sock_dir'],
+                               shards=self.opts.get('master_event_shards'))
+        for tag in self.subscriptions():
+            self.event.subscribe(tag)
         for data in self.event.iter_events(full=True):
             reactors = self.list_reactors(data['tag'])
             if not reactors:
@@ -50,6 +50,11 @@ class SaltCacheLoader(BaseLoader):
     Templates are cached like regular salt states
     and only loaded once per loader instance.
     '''
+    # While this is a list the [saltenv, salt:// path] of every template
+    # loaded is appended to it, the state render cache uses it to learn the
+    # files an SLS file depends on
+    recorded = None
+
     def __init__(self, opts, saltenv='base', encoding='utf-8', env=None):
         if env is not None:
             salt.utils.warn_until(
@@ -103,6 +108,9 @@ class SaltCacheLoader(BaseLoader):
             )
             raise TemplateNotFound(template)
 
+        if SaltCacheLoader.recorded is not None:
+            SaltCacheLoader.recorded.append(
+                [self.saltenv, path.join('salt://', template)])
         self.check_cache(template)
         for spath in self.searchpath:
             filepath = path.join(spath, template)
@@ -16,6 +16,7 @@ import salt.log
 import salt.client
 import salt.pillar
 import salt.utils
+import salt.utils.minions
 import salt.payload
 from salt.exceptions import SaltException
 
@@ -381,4 +382,7 @@ class MasterPillarUtil(object):
                                 fp_.write(self.serial.dumps(mine_data))
         except (OSError, IOError):
             return True
+        finally:
+            if clear_pillar or clear_grains:
+                salt.utils.minions.touch_registry(self.opts)
         return True
@@ -6,13 +6,19 @@ expected to return
 
 # Import python libs
 import os
-import glob
 import re
+import time
+import bisect
+import fnmatch
+import socket
+import struct
 import logging
 
 # Import salt libs
 import salt.payload
 import salt.utils
+import salt.utils.atomicfile
+from salt._compat import string_types
 from salt.exceptions import CommandExecutionError
 
 HAS_RANGE = False
@@ -24,6 +30,24 @@ except ImportError:
 
 log = logging.getLogger(__name__)
 
+# Per-process minion registries, see get_registry
+_REGISTRIES = {}
+
+GLOB_CHARS = re.compile(r'[*?[]')
+
+
+def exact_target(expr, expr_form):
+    '''
+    Return whether the target only matches the minions it names, a list or a
+    glob without wildcards, so that the minions check_minions returns are
+    the only ones which can run the publication
+    '''
+    if expr_form == 'list':
+        return True
+    if expr_form == 'glob':
+        return isinstance(expr, string_types) and not GLOB_CHARS.search(expr)
+    return False
+
 
 def get_minion_data(minion, opts):
     '''
@@ -83,6 +107,447 @@ def nodegroup_comp(group, nodegroups, skip=None):
     return ret
 
 
+def _eval_set_expr(tokens):
+    '''
+    Evaluate a list of sets, "&", "|" and "-" operators and parentheses,
+    with the same precedence the Python set operators have
+    '''
+    precedence = {'|': 1, '&': 2, '-': 3}
+    operands = []
+    operators = []
+
+    def _reduce():
+        oper = operators.pop()
+        right = operands.pop()
+        left = operands.pop()
+        if oper == '&':
+            operands.append(left & right)
+        elif oper == '|':
+            operands.append(left | right)
+        else:
+            operands.append(left - right)
+
+    for token in tokens:
+        if isinstance(token, set):
+            operands.append(token)
+        elif token == '(':
+            operators.append(token)
+        elif token == ')':
+            while operators[-1] != '(':
+                _reduce()
+            operators.pop()
+        else:
+            while operators and operators[-1] != '(' \
+                    and precedence[operators[-1]] >= precedence[token]:
+                _reduce()
+            operators.append(token)
+    while operators:
+        if operators[-1] == '(':
+            raise ValueError('Unbalanced parenthesis')
+        _reduce()
+    if len(operands) != 1:
+        raise ValueError('Malformed set expression')
+    return operands[0]
+
+
+class MinionIndex(object):
+    '''
+    Inverted index of the grains or pillar of a set of minions.
+
+    Every leaf value is indexed under its colon delimited path, so that
+    matching ``os:Ubuntu`` is a dict lookup and a glob only has to look at
+    the distinct values found under a path instead of at every minion. The
+    results are the same as running :func:`salt.utils.subdict_match` on
+    every minion; expressions the index cannot answer exactly make
+    :meth:`match` return None so that the caller can fall back to a scan.
+    '''
+    def __init__(self, delim=':'):
+        self.delim = delim
+        # path -> {lowercased value: set of minion ids}
+        self.values = {}
+        # path -> set of minion ids where the path is a non-empty dict
+        self.nodes = {}
+        # path -> set of minion ids where the path is a list holding dicts
+        self.opaque = {}
+        self._entries = {}
+
+    def _flatten(self, data, prefix, entries):
+        '''
+        Collect the (kind, path, value) entries of a data dict
+        '''
+        for key, val in data.items():
+            if not isinstance(key, string_types) or self.delim in key:
+                # Such keys can never be reached by subdict_match
+                continue
+            path = '{0}{1}{2}'.format(prefix, self.delim, key) if prefix else key
+            if isinstance(val, dict):
+                if val:
+                    entries.add(('node', path, None))
+                    self._flatten(val, path, entries)
+                continue
+            if not isinstance(val, list):
+                val = [val]
+            for member in val:
+                if isinstance(member, dict):
+                    entries.add(('opaque', path, None))
+                    continue
+                try:
+                    entries.add(('value', path, str(member).lower()))
+                except UnicodeError:
+                    entries.add(('opaque', path, None))
+
+    def add(self, id_, data):
+        '''
+        Index the data of a minion, replacing what was indexed before
+        '''
+        self.remove(id_)
+        entries = set()
+        if isinstance(data, dict):
+            self._flatten(data, '', entries)
+        for kind, path, value in entries:
+            if kind == 'value':
+                self.values.setdefault(path, {}).setdefault(value, set()).add(id_)
+            else:
+                index = self.nodes if kind == 'node' else self.opaque
+                index.setdefault(path, set()).add(id_)
+        self._entries[id_] = entries
+
+    def remove(self, id_):
+        '''
+        Drop a minion from the index
+        '''
+        for kind, path, value in self._entries.pop(id_, ()):
+            if kind == 'value':
+                ids = self.values[path][value]
+                ids.discard(id_)
+                if not ids:
+                    del self.values[path][value]
+                    if not self.values[path]:
+                        del self.values[path]
+                continue
+            index = self.nodes if kind == 'node' else self.opaque
+            index[path].discard(id_)
+            if not index[path]:
+                del index[path]
+
+    def match(self, expr, regex_match=False):
+        '''
+        Return the set of minion ids whose data matches the expression, or
+        None if the expression can not be answered from the index
+        '''
+        ret = set()
+        splits = expr.split(self.delim)
+        for idx in range(1, len(splits)):
+            key = self.delim.join(splits[:idx])
+            matchstr = self.delim.join(splits[idx:])
+            if key in self.opaque:
+                return None
+            if matchstr == '*':
+                ret.update(self.nodes.get(key, ()))
+            values = self.values.get(key)
+            if not values:
+                continue
+            pattern = matchstr.lower()
+            if regex_match:
+                try:
+                    regex = re.compile(pattern)
+                except Exception:
+                    log.error('Invalid regex {0!r} in match'.format(pattern))
+                    continue
+                for value, ids in values.items():
+                    if regex.match(value):
+                        ret.update(ids)
+            elif not GLOB_CHARS.search(pattern):
+                ret.update(values.get(pattern, ()))
+            else:
+                for value, ids in values.items():
+                    if fnmatch.fnmatch(value, pattern):
+                        ret.update(ids)
+        return ret
+
+
+class CidrIndex(object):
+    '''
+    Index of the ``ipv4`` grains of a set of minions, kept as a sorted table
+    of integer addresses so that a CIDR match is a range lookup
+    '''
+    def __init__(self):
+        self.table = []
+        self.addrs = {}
+        self._entries = {}
+
+    @staticmethod
+    def _to_int(addr):
+        '''
+        Convert a dotted quad to an integer, return None if it is not one
+        '''
+        if not isinstance(addr, string_types) or addr.count('.') != 3:
+            return None
+        try:
+            return struct.unpack('!I', socket.inet_aton(addr))[0]
+        except (socket.error, struct.error):
+            return None
+
+    def add(self, id_, addrs):
+        '''
+        Index the addresses of a minion, replacing what was indexed before
+        '''
+        self.remove(id_)
+        entries = set()
+        for addr in addrs or ():
+            num = self._to_int(addr)
+            if num is None:
+                continue
+            entries.add((num, addr))
+            self.addrs.setdefault(addr, set()).add(id_)
+        for num in set(num for num, _ in entries):
+            bisect.insort(self.table, (num, id_))
+        self._entries[id_] = entries
+
+    def remove(self, id_):
+        '''
+        Drop a minion from the index
+        '''
+        entries = self._entries.pop(id_, ())
+        for num in set(num for num, _ in entries):
+            del self.table[bisect.bisect_left(self.table, (num, id_))]
+        for _, addr in entries:
+            self.addrs[addr].discard(id_)
+            if not self.addrs[addr]:
+                del self.addrs[addr]
+
+    def match(self, expr):
+        '''
+        Return the set of minion ids with an address in the passed CIDR, or
+        equal to the passed address. None is returned for expressions that
+        are not a dotted quad, those are left to a scan
+        '''
+        if '/' not in expr:
+            if self._to_int(expr) is None:
+                return None
+            return set(self.addrs.get(expr, ()))
+        netstart, netsize = expr.split('/', 1)
+        start = self._to_int(netstart)
+        try:
+            netsize = int(netsize)
+        except ValueError:
+            return None
+        if start is None or not 0 <= netsize <= 32:
+            return None
+        mask = (0xffffffff << (32 - netsize)) & 0xffffffff
+        if start & mask != start:
+            # Host bits are set, in_subnet refuses such a network
+            return set()
+        end = start | (~mask & 0xffffffff)
+        low = bisect.bisect_left(self.table, (start, ''))
+        high = bisect.bisect_left(self.table, (end + 1, ''))
+        return set(id_ for _, id_ in self.table[low:high])
+
+
+class MinionRegistry(object):
+    '''
+    Keep the accepted minion ids and the cached grains and pillar of every
+    minion in memory so that targeting does not need to hit the disk for
+    each expression.
+
+    The registry is refreshed lazily. A change in the accepted key set is
+    detected by the mtime of ``pki_dir/minions``, and writers of the minion
+    data cache touch the ``cachedir/minions/.registry`` stamp file, so that a
+    registry in another process only re-reads the ``data.p`` files whose
+    mtime changed.
+    '''
+    # Directory and stamp mtimes younger than this are not trusted, the
+    # filesystem may only have second resolution
+    fresh = 1
+
+    def __init__(self, opts):
+        self.opts = opts
+        self.serial = salt.payload.Serial(opts)
+        self.pki_dir = os.path.join(opts['pki_dir'], 'minions')
+        self.cdir = os.path.join(opts['cachedir'], 'minions')
+        self.stamp = os.path.join(self.cdir, '.registry')
+        self.accepted = set()
+        self.data = {}
+        self.indexes = {'grains': MinionIndex(), 'pillar': MinionIndex()}
+        self.cidr = CidrIndex()
+        self._data_mtimes = {}
+        self._pki_mtime = None
+        self._stamp_mtime = None
+
+    def _mtime(self, path):
+        '''
+        Return the mtime of the path, or None if it does not exist or is too
+        recent to be relied upon
+        '''
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        if time.time() - mtime < self.fresh:
+            return None
+        return mtime
+
+    def refresh(self):
+        '''
+        Bring the in-memory registry in line with the key and data caches
+        '''
+        pki_mtime = self._mtime(self.pki_dir)
+        if pki_mtime is None or pki_mtime != self._pki_mtime:
+            try:
+                self.accepted = set(os.listdir(self.pki_dir))
+            except OSError:
+                self.accepted = set()
+            self._pki_mtime = pki_mtime
+            for id_ in set(self.data).difference(self.accepted):
+                self._drop(id_)
+            # New minions may already have data on disk
+            self._stamp_mtime = None
+        if not self.opts.get('minion_data_cache', False):
+            return
+        # Read the stamp before the data files, a write that lands during
+        # the scan will move the stamp again and be picked up next time
+        stamp_mtime = self._mtime(self.stamp)
+        if stamp_mtime is not None and stamp_mtime == self._stamp_mtime:
+            return
+        for id_ in self.accepted:
+            self._load(id_)
+        self._stamp_mtime = stamp_mtime
+
+    def _load(self, id_):
+        '''
+        Re-read the data.p file of the named minion if it has changed
+        '''
+        datap = os.path.join(self.cdir, id_, 'data.p')
+        try:
+            mtime = os.path.getmtime(datap)
+        except OSError:
+            self._drop(id_)
+            return
+        if id_ in self.data and mtime == self._data_mtimes.get(id_) \
+                and time.time() - mtime >= self.fresh:
+            return
+        try:
+            with salt.utils.fopen(datap, 'rb') as fp_:
+                miniondata = self.serial.load(fp_)
+        except Exception as exc:
+            log.debug(
+                'Failed to load cached data for minion {0}: {1}'.format(
+                    id_, exc
+                )
+            )
+            return
+        self._set(id_, miniondata.get('grains'), miniondata.get('pillar'))
+        self._data_mtimes[id_] = mtime
+
+    def _set(self, id_, grains, pillar):
+        '''
+        Replace the data of a minion and reindex it
+        '''
+        grains = grains or {}
+        pillar = pillar or {}
+        self.data[id_] = {'grains': grains, 'pillar': pillar}
+        self.indexes['grains'].add(id_, grains)
+        self.indexes['pillar'].add(id_, pillar)
+        ipv4 = grains.get('ipv4') if isinstance(grains, dict) else None
+        self.cidr.add(id_, ipv4 if isinstance(ipv4, list) else None)
+
+    def _drop(self, id_):
+        '''
+        Forget the data of a minion
+        '''
+        self.data.pop(id_, None)
+        self._data_mtimes.pop(id_, None)
+        for index in self.indexes.values():
+            index.remove(id_)
+        self.cidr.remove(id_)
+
+    def store(self, id_, grains, pillar):
+        '''
+        Write the grains and pillar of a minion to the minion data cache,
+        update the registry and notify the registries of other processes
+        '''
+        cdir = os.path.join(self.cdir, id_)
+        if not os.path.isdir(cdir):
+            os.makedirs(cdir)
+        datap = os.path.join(cdir, 'data.p')
+        with salt.utils.atomicfile.atomic_open(datap, 'w+b') as fp_:
+            fp_.write(self.serial.dumps({'grains': grains, 'pillar': pillar}))
+        self._set(id_, grains, pillar)
+        self._data_mtimes[id_] = os.path.getmtime(datap)
+        touch_registry(self.opts)
+
+    def minions(self):
+        '''
+        Return the set of accepted minion ids
+        '''
+        self.refresh()
+        return set(self.accepted)
+
+    def items(self, key):
+        '''
+        Return a list of (minion id, data) tuples for the accepted minions
+        which have cached data, key is either "grains" or "pillar"
+        '''
+        self.refresh()
+        return [(id_, data[key]) for id_, data in self.data.items()
+                if id_ in self.accepted]
+
+    def cached(self):
+        '''
+        Return the set of accepted minion ids which have cached data
+        '''
+        self.refresh()
+        return self.accepted.intersection(self.data)
+
+    def match(self, key, expr, regex_match=False):
+        '''
+        Return the set of minion ids whose grains or pillar, selected by
+        key, match the expression
+        '''
+        self.refresh()
+        ret = self.indexes[key].match(expr, regex_match=regex_match)
+        if ret is None:
+            ret = set(
+                id_ for id_, data in self.items(key)
+                if salt.utils.subdict_match(
+                    data, expr, regex_match=regex_match))
+        return ret.intersection(self.accepted)
+
+    def match_cidr(self, expr):
+        '''
+        Return the set of minion ids with an ipv4 grain in the passed CIDR
+        or equal to the passed address, or None if the expression can not be
+        answered from the index
+        '''
+        self.refresh()
+        ret = self.cidr.match(expr)
+        if ret is None:
+            return None
+        return ret.intersection(self.accepted)
+
+
+def touch_registry(opts):
+    '''
+    Notify the minion registries that the minion data cache has changed
+    '''
+    stamp = os.path.join(opts['cachedir'], 'minions', '.registry')
+    try:
+        with salt.utils.fopen(stamp, 'a'):
+            os.utime(stamp, None)
+    except (IOError, OSError) as exc:
+        log.debug('Unable to touch the minion registry stamp: {0}'.format(exc))
+
+
+def get_registry(opts):
+    '''
+    Return the minion registry of this process for the passed opts
+    '''
+    key = (opts['pki_dir'], opts['cachedir'])
+    if key not in _REGISTRIES:
+        _REGISTRIES[key] = MinionRegistry(opts)
+    return _REGISTRIES[key]
+
+
 class CkMinions(object):
     '''
     Used to check what minions should respond from a target
@@ -91,22 +556,13 @@ class CkMinions(object):
         self.opts = opts
         self.serial = salt.payload.Serial(opts)
         self.ip_addrs = salt.utils.network.ip_addrs()
+        self.registry = get_registry(opts)
 
     def _check_glob_minions(self, expr):
         '''
         Return the minions found by looking via globs
         '''
-        cwd = os.getcwd()
-        os.chdir(os.path.join(self.opts['pki_dir'], 'minions'))
-        ret = set(glob.glob(expr))
-        try:
-            os.chdir(cwd)
-        except OSError as exc:
-            if exc.errno != 13:
-                # If it's not a permission denied, perhaps we're running with
-                # sudo
-                raise
-        return list(ret)
+        return fnmatch.filter(self.registry.minions(), expr)
 
     def _check_list_minions(self, expr):
         '''
@@ -114,140 +570,89 @@ class CkMinions(object):
         '''
         if isinstance(expr, str):
             expr = [m for m in expr.split(',') if m]
-        ret = []
-        for fn_ in os.listdir(os.path.join(self.opts['pki_dir'], 'minions')):
-            if fn_ in expr:
-                if fn_ not in ret:
-                    ret.append(fn_)
-        return ret
+        minions = self.registry.minions()
+        return [fn_ for fn_ in set(expr) if fn_ in minions]
 
     def _check_pcre_minions(self, expr):
         '''
         Return the minions found by looking via regular expressions
         '''
-        cwd = os.getcwd()
-        os.chdir(os.path.join(self.opts['pki_dir'], 'minions'))
         reg = re.compile(expr)
-        ret = [fn_ for fn_ in os.listdir('.') if reg.match(fn_)]
-        os.chdir(cwd)
-        return ret
+        return [fn_ for fn_ in self.registry.minions() if reg.match(fn_)]
+
+    def _check_cache_minions(self, matched):
+        '''
+        Return the accepted minions which are in the matched set or which
+        have no cached data to match against
+        '''
+        minions = self.registry.minions()
+        minions.difference_update(self.registry.cached())
+        minions.update(matched)
+        return list(minions)
+
+    def _scan_cache_minions(self, key, match):
+        '''
+        Return the set of minions with cached grains or pillar, selected by
+        key, for which match returns True
+        '''
+        return set(
+            id_ for id_, data in self.registry.items(key) if match(data))
 
     def _check_grain_minions(self, expr):
         '''
         Return the minions found by looking via grains
         '''
-        minions = set(
-            os.listdir(os.path.join(self.opts['pki_dir'], 'minions'))
-        )
-        if self.opts.get('minion_data_cache', False):
-            cdir = os.path.join(self.opts['cachedir'], 'minions')
-            if not os.path.isdir(cdir):
-                return list(minions)
-            for id_ in os.listdir(cdir):
-                if id_ not in minions:
-                    continue
-                datap = os.path.join(cdir, id_, 'data.p')
-                if not os.path.isfile(datap):
-                    continue
-                grains = self.serial.load(
-                    salt.utils.fopen(datap, 'rb')
-                ).get('grains')
-                if not salt.utils.subdict_match(grains, expr):
-                    minions.remove(id_)
-        return list(minions)
+        if not self.opts.get('minion_data_cache', False):
+            return list(self.registry.minions())
+        return self._check_cache_minions(self.registry.match('grains', expr))
 
     def _check_grain_pcre_minions(self, expr):
         '''
         Return the minions found by looking via grains with PCRE
         '''
-        minions = set(
-            os.listdir(os.path.join(self.opts['pki_dir'], 'minions'))
-        )
-        if self.opts.get('minion_data_cache', False):
-            cdir = os.path.join(self.opts['cachedir'], 'minions')
-            if not os.path.isdir(cdir):
-                return list(minions)
-            for id_ in os.listdir(cdir):
-                if id_ not in minions:
-                    continue
-                datap = os.path.join(cdir, id_, 'data.p')
-                if not os.path.isfile(datap):
-                    continue
-                grains = self.serial.load(
-                    salt.utils.fopen(datap, 'rb')
-                ).get('grains')
-                if not salt.utils.subdict_match(grains, expr,
-                                                delim=':', regex_match=True):
-                    minions.remove(id_)
-        return list(minions)
+        if not self.opts.get('minion_data_cache', False):
+            return list(self.registry.minions())
+        return self._check_cache_minions(
+            self.registry.match('grains', expr, regex_match=True))
 
     def _check_pillar_minions(self, expr):
         '''
         Return the minions found by looking via pillar
         '''
-        minions = set(
-            os.listdir(os.path.join(self.opts['pki_dir'], 'minions'))
-        )
-        if self.opts.get('minion_data_cache', False):
-            cdir = os.path.join(self.opts['cachedir'], 'minions')
-            if not os.path.isdir(cdir):
-                return list(minions)
-            for id_ in os.listdir(cdir):
-                if id_ not in minions:
-                    continue
-                datap = os.path.join(cdir, id_, 'data.p')
-                if not os.path.isfile(datap):
-                    continue
-                pillar = self.serial.load(
-                    salt.utils.fopen(datap, 'rb')
-                ).get('pillar')
-                if not salt.utils.subdict_match(pillar, expr):
-                    minions.remove(id_)
-        return list(minions)
+        if not self.opts.get('minion_data_cache', False):
+            return list(self.registry.minions())
+        return self._check_cache_minions(self.registry.match('pillar', expr))
 
     def _check_ipcidr_minions(self, expr):
         '''
         Return the minions found by looking via ipcidr
         '''
-        minions = set(
-            os.listdir(os.path.join(self.opts['pki_dir'], 'minions'))
-        )
-        if self.opts.get('minion_data_cache', False):
-            cdir = os.path.join(self.opts['cachedir'], 'minions')
-            if not os.path.isdir(cdir):
-                return list(minions)
-            for id_ in os.listdir(cdir):
-                if id_ not in minions:
-                    continue
-                datap = os.path.join(cdir, id_, 'data.p')
-                if not os.path.isfile(datap):
-                    continue
-                grains = self.serial.load(
-                    salt.utils.fopen(datap, 'rb')
-                ).get('grains')
-
-                num_parts = len(expr.split('/'))
-                if num_parts > 2:
-                    # Target is not valid CIDR, no minions match
-                    return []
-                elif num_parts == 2:
-                    # Target is CIDR
-                    if not salt.utils.network.in_subnet(
-                            expr,
-                            addrs=grains.get('ipv4', [])):
-                        minions.remove(id_)
-                else:
-                    # Target is an IPv4 address
-                    import socket
-                    try:
-                        socket.inet_aton(expr)
-                    except socket.error:
-                        # Not a valid IPv4 address, no minions match
-                        return []
-                    else:
-                        if not expr in grains.get('ipv4', []):
-                            minions.remove(id_)
-        return list(minions)
+        if not self.opts.get('minion_data_cache', False):
+            return list(self.registry.minions())
+        num_parts = len(expr.split('/'))
+        if num_parts > 2:
+            # Target is not valid CIDR, no minions match
+            return []
+        elif num_parts == 2:
+            # Target is CIDR
+            def match(grains):
+                return salt.utils.network.in_subnet(
+                    expr,
+                    addrs=grains.get('ipv4', []))
+        else:
+            # Target is an IPv4 address
+            try:
+                socket.inet_aton(expr)
+            except socket.error:
+                # Not a valid IPv4 address, no minions match
+                return []
+
+            def match(grains):
+                return expr in grains.get('ipv4', [])
+        matched = self.registry.match_cidr(expr)
+        if matched is None:
+            matched = self._scan_cache_minions('grains', match)
+        return self._check_cache_minions(matched)
 
     def _check_range_minions(self, expr):
         '''
@@ -258,41 +663,26 @@ class CkMinions(object):
                 'Range matcher unavailble (unable to import seco.range, '
                 'module most likely not installed)'
             )
-        minions = set(
-            os.listdir(os.path.join(self.opts['pki_dir'], 'minions'))
-        )
-        if self.opts.get('minion_data_cache', False):
-            cdir = os.path.join(self.opts['cachedir'], 'minions')
-            if not os.path.isdir(cdir):
-                return list(minions)
-            for id_ in os.listdir(cdir):
-                if id_ not in minions:
-                    continue
-                datap = os.path.join(cdir, id_, 'data.p')
-                if not os.path.isfile(datap):
-                    continue
-                grains = self.serial.load(
-                    salt.utils.fopen(datap, 'rb')
-                ).get('grains')
-
-                range_ = seco.range.Range(self.opts['range_server'])
-                try:
-                    if grains.get('fqdn', '') not in range_.expand(expr):
-                        minions.remove(id_)
-                except seco.range.RangeException as exc:
-                    log.debug(
-                        'Range exception in compound match: {0}'.format(exc)
-                    )
-                    minions.remove(id_)
-        return list(minions)
+        if not self.opts.get('minion_data_cache', False):
+            return list(self.registry.minions())
+        range_ = seco.range.Range(self.opts['range_server'])
+        try:
+            hosts = set(range_.expand(expr))
+        except seco.range.RangeException as exc:
+            log.debug(
+                'Range exception in compound match: {0}'.format(exc)
+            )
+            hosts = set()
+        return self._check_cache_minions(
+            self._scan_cache_minions(
+                'grains',
+                lambda grains: grains.get('fqdn', '') in hosts))
 
     def _check_compound_minions(self, expr):
         '''
         Return the minions found by looking via compound matcher
         '''
-        minions = set(
-            os.listdir(os.path.join(self.opts['pki_dir'], 'minions'))
-        )
+        minions = self.registry.minions()
         if self.opts.get('minion_data_cache', False):
             ref = {'G': self._check_grain_minions,
                    'P': self._check_grain_pcre_minions,
@@ -315,11 +705,11 @@ class CkMinions(object):
                         # If an unknown matcher is called at any time, fail out
                         return []
                     if unmatched and unmatched[-1] == '-':
-                        results.append(str(set(matcher('@'.join(comps[1:])))))
+                        results.append(set(matcher('@'.join(comps[1:]))))
                         results.append(')')
                         unmatched.pop()
                     else:
-                        results.append(str(set(matcher('@'.join(comps[1:])))))
+                        results.append(set(matcher('@'.join(comps[1:]))))
                 elif match in opers:
                     # We didn't match a target, so append a boolean operator or
                     # subexpression
@@ -332,7 +722,7 @@ class CkMinions(object):
                             else:
                                 results.append('&')
                             results.append('(')
-                            results.append(str(set(minions)))
+                            results.append(minions)
                             results.append('-')
                             unmatched.append('-')
                         elif match == 'and':
@@ -368,19 +758,21 @@ class CkMinions(object):
                     # The match is not explicitly defined, evaluate as a glob
                     if unmatched and unmatched[-1] == '-':
                         results.append(
-                                str(set(self._check_glob_minions(match))))
+                                set(self._check_glob_minions(match)))
                         results.append(')')
                         unmatched.pop()
                     else:
                         results.append(
-                                str(set(self._check_glob_minions(match))))
+                                set(self._check_glob_minions(match)))
             for token in unmatched:
                 results.append(')')
-            results = ' '.join(results)
             log.debug('Evaluating final compound matching expr: {0}'
-                      .format(results))
+                      .format(' '.join(
+                          '<{0} minions>'.format(len(token))
+                          if isinstance(token, set) else token
+                          for token in results)))
             try:
-                return list(eval(results))
+                return list(_eval_set_expr(results))
             except Exception:
                 log.error('Invalid compound target: {0}'.format(expr))
                 return []
@@ -392,23 +784,12 @@ class CkMinions(object):
         '''
         minions = set()
         if self.opts.get('minion_data_cache', False):
-            cdir = os.path.join(self.opts['cachedir'], 'minions')
-            if not os.path.isdir(cdir):
-                return list(minions)
             addrs = salt.utils.network.local_port_tcp(int(self.opts['publish_port']))
             if '127.0.0.1' in addrs:
                 addrs.update(self.ip_addrs)
-            if subset:
-                search = subset
-            else:
-                search = os.listdir(cdir)
-            for id_ in search:
-                datap = os.path.join(cdir, id_, 'data.p')
-                if not os.path.isfile(datap):
+            for id_, grains in self.registry.items('grains'):
+                if subset and id_ not in subset:
                     continue
-                grains = self.serial.load(
-                    salt.utils.fopen(datap, 'rb')
-                ).get('grains')
                 for ipv4 in grains.get('ipv4', []):
                     if ipv4 == '127.0.0.1' or ipv4 == '0.0.0.0':
                         continue
@@ -421,7 +802,7 @@ class CkMinions(object):
         '''
         Return a list of all minions that have auth'd
         '''
-        return os.listdir(os.path.join(self.opts['pki_dir'], 'minions'))
+        return list(self.registry.minions())
 
     def check_minions(self, expr, expr_form='glob'):
         '''
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+'''
+Block level file deltas in the style of rsync
+
+The receiver of a file sends the signature of the version it already has, a
+weak rolling checksum and a strong hash for every block. The sender slides
+the rolling checksum over its version of the file and answers with a delta,
+the indexes of the blocks the receiver can copy from its own version and the
+literal data in between. The receiver then patches its version into the new
+one.
+'''
+
+# Import python libs
+import hashlib
+import math
+import zlib
+
+# The modulus of adler32, the weak checksum
+MOD_ADLER = 65521
+
+MIN_BLOCK_SIZE = 700
+MAX_BLOCK_SIZE = 131072
+
+
+def block_size(size):
+    '''
+    Return the block size used to sign a file of size bytes, about the square
+    root of the size like rsync does
+    '''
+    bsize = int(math.sqrt(size)) & ~7
+    return min(max(bsize, MIN_BLOCK_SIZE), MAX_BLOCK_SIZE)
+
+
+def _weak(block):
+    '''
+    Return the adler32 checksum of block
+    '''
+    return zlib.adler32(block) & 0xffffffff
+
+
+def _strong(block):
+    '''
+    Return the strong hash of block
+    '''
+    return hashlib.md5(block).hexdigest()
+
+
+def signature(fp_, bsize):
+    '''
+    Return the signature of the file object fp_, a [weak, strong] pair for
+    every full block of bsize bytes
+    '''
+    ret = []
+    while True:
+        block = fp_.read(bsize)
+        if len(block) < bsize:
+            return ret
+        ret.append([_weak(block), _strong(block)])
+
+
+def delta(data, sig, bsize):
+    '''
+    Return the delta which turns the file signed by sig into data. The delta
+    is a list of operations, an int copies that block of the old file and a
+    string is literal data.
+    '''
+    return delta_chunk(data, sig, bsize, len(data))[0]
+
+
+def delta_chunk(data, sig, bsize, limit):
+    '''
+    Return the delta of the start of data up to about limit bytes and the
+    offset in data it ends at. The blocks starting before limit are matched,
+    so data needs to hold limit + bsize - 1 bytes unless it holds the end of
+    the file. The delta of a whole file is the deltas of its chunks.
+    '''
+    index = {}
+    for num, (weak, strong) in enumerate(sig):
+        index.setdefault(weak, {}).setdefault(strong, num)
+    view = bytearray(data)
+    size = len(data)
+    ret = []
+    literal = 0
+    pos = 0
+    weak = None
+    while pos < limit and pos + bsize <= size:
+        if weak is None:
+            weak = _weak(data[pos:pos + bsize])
+            low, high = weak & 0xffff, weak >> 16
+        if weak in index:
+            num = index[weak].get(_strong(data[pos:pos + bsize]))
+            if num is not None:
+                if literal < pos:
+                    ret.append(data[literal:pos])
+                ret.append(num)
+                pos += bsize
+                literal = pos
+                weak = None
+                continue
+        if pos + bsize < size:
+            # Roll the checksum one byte forward
+            out, in_ = view[pos], view[pos + bsize]
+            low = (low - out + in_) % MOD_ADLER
+            high = (high - bsize * out + low - 1) % MOD_ADLER
+            weak = (high << 16) | low
+        pos += 1
+    # Short of a full block left, the end of the file
+    end = pos if pos >= limit else size
+    if literal < end:
+        ret.append(data[literal:end])
+    return ret, end
+
+
+def patch(basis, ops, bsize, out):
+    '''
+    Write the file described by the delta ops to the file object out, taking
+    the copied blocks from the file object basis
+    '''
+    for op_ in ops:
+        if isinstance(op_, basestring):
+            out.write(op_)
+        else:
+            basis.seek(op_ * bsize)
+            out.write(basis.read(bsize))
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+'''
+Time a re-authentication storm: every minion of a pki dir of accepted keys
+authenticates with the master worker threads at once, the way they all do
+after a master restart. The first round runs with the public keys of the
+minions not cached yet, the next rounds with the keys cached by the workers.
+'''
+
+# Import Python Libs
+from __future__ import print_function
+import multiprocessing
+import optparse
+import os
+import shutil
+import tempfile
+import time
+
+# Import salt libs
+import salt.config
+import salt.crypt
+import salt.master
+import salt.utils
+
+
+class NullEvent(object):
+    '''
+    Drop the auth events, there is no event publisher to send them to
+    '''
+    def fire_event(self, data, tag):
+        pass
+
+
+def parse():
+    '''
+    Parse the cli options
+    '''
+    parser = optparse.OptionParser()
+    parser.add_option('-c',
+            '--config',
+            dest='config',
+            default='/etc/salt/master',
+            help='The master config file to authenticate the minions with')
+    parser.add_option('-m',
+            '--minions',
+            dest='minions',
+            default=200,
+            type='int',
+            help='The number of minions authenticating')
+    parser.add_option('-w',
+            '--workers',
+            dest='workers',
+            default=5,
+            type='int',
+            help='The number of worker processes authenticating them')
+    parser.add_option('-r',
+            '--rounds',
+            dest='rounds',
+            default=3,
+            type='int',
+            help='The number of times every minion authenticates')
+    options, args = parser.parse_args()
+    return options.__dict__
+
+
+def make_minions(opts, count):
+    '''
+    Accept count minion keys and return the sign in loads of the minions
+    '''
+    loads = []
+    keydir = tempfile.mkdtemp()
+    master_pub = salt.master.RSA.load_pub_key(
+        os.path.join(opts['pki_dir'], 'master.pub'))
+    try:
+        for num in range(count):
+            id_ = 'minion{0}'.format(num)
+            salt.crypt.gen_keys(keydir, id_, opts['keysize'])
+            with salt.utils.fopen(
+                    os.path.join(keydir, '{0}.pub'.format(id_))) as fp_:
+                pub = fp_.read()
+            with salt.utils.fopen(
+                    os.path.join(opts['pki_dir'], 'minions', id_), 'w') as fp_:
+                fp_.write(pub)
+            loads.append({'cmd': '_auth',
+                          'id': id_,
+                          'pub': pub,
+                          'token': master_pub.public_encrypt(
+                              'salty bacon', salt.master.RSA.pkcs1_oaep_padding)
+                          })
+    finally:
+        shutil.rmtree(keydir)
+    return loads
+
+
+def work(opts, master_key, loads, rounds, queue):
+    '''
+    Authenticate the minions rounds times and put the time of every round on
+    the queue
+    '''
+    funcs = salt.master.ClearFuncs(opts, {}, master_key, None)
+    funcs.event = NullEvent()
+    times = []
+    for _ in range(rounds):
+        start = time.time()
+        for load in loads:
+            ret = funcs._auth(load)
+            if ret['enc'] != 'pub':
+                raise Exception('{0} was not authenticated'.format(load['id']))
+        times.append(time.time() - start)
+    queue.put(times)
+
+
+def run(opts, workers, rounds, loads):
+    '''
+    Spread the minions on the workers and time the rounds
+    '''
+    master_key = salt.crypt.MasterKeys(opts)
+    queue = multiprocessing.Queue()
+    procs = []
+    for num in range(workers):
+        procs.append(multiprocessing.Process(
+            target=work,
+            args=(opts, master_key, loads[num::workers], rounds, queue)))
+    for proc in procs:
+        proc.start()
+    # The round is over when the slowest worker is done
+    times = [max(col) for col in zip(*[queue.get() for proc in procs])]
+    for proc in procs:
+        proc.join()
+    for num, took in enumerate(times):
+        print('{0:<14} {1:8.4f}s  {2:8.1f} auths/s'.format(
+            'cold keys' if num == 0 else 'cached keys',
+            took,
+            len(loads) / took))
+
+
+if __name__ == '__main__':
+    cli = parse()
+    master_opts = salt.config.master_config(cli['config'])
+    master_opts['pki_dir'] = tempfile.mkdtemp()
+    master_opts['sock_dir'] = master_opts['pki_dir']
+    master_opts['aes'] = salt.crypt.Crypticle.generate_key_string()
+    try:
+        os.makedirs(os.path.join(master_opts['pki_dir'], 'minions'))
+        salt.crypt.MasterKeys(master_opts)
+        minion_loads = make_minions(master_opts, cli['minions'])
+        run(master_opts, cli['workers'], cli['rounds'], minion_loads)
+    finally:
+        shutil.rmtree(master_opts['pki_dir'])
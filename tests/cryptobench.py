@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+'''
+Time the symmetric encryption of the payloads sent between the master and
+the minions, in MB/s for payloads of 1KB, 64KB and 1MB.
+'''
+
+# Import Python Libs
+from __future__ import print_function
+import optparse
+import os
+import time
+
+# Import salt libs
+import salt.crypt
+
+SIZES = (('1KB', 1024), ('64KB', 64 * 1024), ('1MB', 1024 * 1024))
+
+
+def parse():
+    '''
+    Parse the cli options
+    '''
+    parser = optparse.OptionParser()
+    parser.add_option('-s',
+            '--seconds',
+            dest='seconds',
+            default=2.0,
+            type='float',
+            help='The number of seconds each operation is timed for')
+    parser.add_option('--serial',
+            dest='serial',
+            default='msgpack',
+            help='The serializer of the dumps and loads timings')
+    options, args = parser.parse_args()
+    return options.__dict__
+
+
+def rate(func, data, size, seconds):
+    '''
+    Run func on data for seconds and return the MB/s of size bytes a run
+    '''
+    runs = 0
+    start = time.time()
+    while time.time() - start < seconds:
+        func(data)
+        runs += 1
+    return runs * size / (time.time() - start) / (1024 * 1024)
+
+
+def run(opts, seconds):
+    '''
+    Time the operations for every payload size
+    '''
+    crypticle = salt.crypt.Crypticle(
+        opts, salt.crypt.Crypticle.generate_key_string())
+    print('{0:<6} {1:>12} {2:>12} {3:>12} {4:>12}'.format(
+        'size', 'encrypt', 'decrypt', 'dumps', 'loads'))
+    for name, size in SIZES:
+        data = os.urandom(size)
+        load = {'cmd': '_return', 'id': 'minion', 'return': data}
+        print('{0:<6} {1:>7.1f} MB/s {2:>7.1f} MB/s {3:>7.1f} MB/s '
+              '{4:>7.1f} MB/s'.format(
+                  name,
+                  rate(crypticle.encrypt, data, size, seconds),
+                  rate(crypticle.decrypt, crypticle.encrypt(data), size,
+                       seconds),
+                  rate(crypticle.dumps, load, size, seconds),
+                  rate(crypticle.loads, crypticle.dumps(load), size,
+                       seconds)))
+
+
+if __name__ == '__main__':
+    cli = parse()
+    run({'serial': cli['serial']}, cli['seconds'])
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+'''
+Time loading the execution modules the way the minion and salt-call do when
+they start, with the virtual cache off, cold and warm, and with the lazy
+loader. Every load runs in a fresh process so that the modules imported by
+an earlier load do not make the next one look faster.
+'''
+
+# Import Python Libs
+from __future__ import print_function
+import multiprocessing
+import optparse
+import os
+import shutil
+import tempfile
+import time
+
+# Import salt libs
+import salt.config
+import salt.loader
+
+
+def parse():
+    '''
+    Parse the cli options
+    '''
+    parser = optparse.OptionParser()
+    parser.add_option('-c',
+            '--config',
+            dest='config',
+            default='/etc/salt/minion',
+            help='The minion config file to load the modules with')
+    parser.add_option('-r',
+            '--runs',
+            dest='runs',
+            default=5,
+            type='int',
+            help='The number of times the modules are loaded in each mode')
+    options, args = parser.parse_args()
+    return options.__dict__
+
+
+def load(opts, queue):
+    '''
+    Load the modules and put the time it took and the number of functions on
+    the queue
+    '''
+    start = time.time()
+    functions = salt.loader.minion_mods(opts)
+    if opts['lazy_loader']:
+        # Do what salt-call test.ping needs
+        functions['test.ping']()
+        count = len(functions._dict)
+    else:
+        count = len(functions)
+    queue.put((time.time() - start, count))
+
+
+def time_load(opts):
+    '''
+    Load the modules in a new process, return the time it took and the
+    number of functions loaded
+    '''
+    queue = multiprocessing.Queue()
+    proc = multiprocessing.Process(target=load, args=(opts, queue))
+    proc.start()
+    ret = queue.get()
+    proc.join()
+    return ret
+
+
+def run(opts, runs):
+    '''
+    Time the loads in each mode
+    '''
+    cache = os.path.join(opts['cachedir'], 'loader')
+    modes = (('no cache', {'virtual_cache': False}, False),
+             ('cold cache', {'virtual_cache': True}, True),
+             ('warm cache', {'virtual_cache': True}, False),
+             ('lazy, cold cache', {'virtual_cache': True,
+                                   'lazy_loader': True}, True),
+             ('lazy, warm cache', {'virtual_cache': True,
+                                   'lazy_loader': True}, False))
+    for name, mode, cold in modes:
+        mode_opts = dict(opts, lazy_loader=False)
+        mode_opts.update(mode)
+        times = []
+        for _ in range(runs):
+            if cold and os.path.isdir(cache):
+                shutil.rmtree(cache)
+            took, count = time_load(mode_opts)
+            times.append(took)
+        print('{0:<18} {1:8.4f}s  best {2:8.4f}s  {3} functions'.format(
+            name, sum(times) / runs, min(times), count))
+
+
+if __name__ == '__main__':
+    cli = parse()
+    minion_opts = salt.config.minion_config(cli['config'])
+    minion_opts['cachedir'] = tempfile.mkdtemp()
+    minion_opts['grains'] = salt.loader.grains(minion_opts)
+    try:
+        run(minion_opts, cli['runs'])
+    finally:
+        shutil.rmtree(minion_opts['cachedir'])
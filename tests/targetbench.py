@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+'''
+Compare grain, ipcidr and compound targeting through the inverted minion
+index against a scan of every minion with salt.utils.subdict_match, using
+synthetic minion data
+'''
+
+# Import Python Libs
+from __future__ import print_function
+import random
+import optparse
+import timeit
+
+# Import salt libs
+import salt.utils
+import salt.utils.network
+import salt.utils.minions
+
+OSES = ('Ubuntu', 'CentOS', 'Debian', 'RedHat', 'Fedora', 'SUSE')
+ROLES = ('web', 'db', 'cache', 'queue', 'lb', 'build')
+
+
+def parse():
+    '''
+    Parse the cli options
+    '''
+    parser = optparse.OptionParser()
+    parser.add_option('-m',
+            '--minions',
+            dest='minions',
+            default='1000,10000,50000',
+            help='Comma delimited list of minion counts to run against')
+    parser.add_option('-r',
+            '--runs',
+            dest='runs',
+            default=5,
+            type='int',
+            help='The number of times each expression is matched')
+    options, args = parser.parse_args()
+    return options.__dict__
+
+
+def make_grains(num):
+    '''
+    Generate the grains of a synthetic minion
+    '''
+    rand = random.Random(num)
+    return {'id': 'minion{0}'.format(num),
+            'os': rand.choice(OSES),
+            'roles': rand.sample(ROLES, 2),
+            'num_cpus': rand.choice((1, 2, 4, 8, 16)),
+            'ipv4': ['127.0.0.1',
+                     '10.{0}.{1}.{2}'.format(num >> 16, (num >> 8) & 255, num & 255)],
+            'datacenter': {'name': 'dc{0}'.format(num % 8),
+                           'rack': 'r{0}'.format(num % 64)}}
+
+
+def scan_grains(minions, expr):
+    '''
+    The pre-index way, run subdict_match against every minion
+    '''
+    return set(id_ for id_, grains in minions.items()
+               if salt.utils.subdict_match(grains, expr))
+
+
+def scan_cidr(minions, expr):
+    '''
+    The pre-index way, run in_subnet against every minion
+    '''
+    return set(id_ for id_, grains in minions.items()
+               if salt.utils.network.in_subnet(expr, addrs=grains['ipv4']))
+
+
+def run(count, runs):
+    '''
+    Build the data for count minions and time the matchers
+    '''
+    minions = dict(('minion{0}'.format(num), make_grains(num))
+                   for num in range(count))
+    index = salt.utils.minions.MinionIndex()
+    cidr = salt.utils.minions.CidrIndex()
+
+    def build():
+        for id_, grains in minions.items():
+            index.add(id_, grains)
+            cidr.add(id_, grains['ipv4'])
+    print('{0} minions, index built in {1:.3f}s'.format(
+        count, timeit.timeit(build, number=1)))
+
+    grain_exprs = ('os:Ubuntu', 'roles:db', 'os:*Hat', 'datacenter:name:dc3')
+    for expr in grain_exprs:
+        assert scan_grains(minions, expr) == index.match(expr)
+        scan = timeit.timeit(lambda: scan_grains(minions, expr), number=runs)
+        idx = timeit.timeit(lambda: index.match(expr), number=runs)
+        print('  grain {0:<24} scan {1:8.4f}s  index {2:8.4f}s'.format(
+            expr, scan / runs, idx / runs))
+
+    expr = '10.0.0.0/20'
+    assert scan_cidr(minions, expr) == cidr.match(expr)
+    scan = timeit.timeit(lambda: scan_cidr(minions, expr), number=runs)
+    idx = timeit.timeit(lambda: cidr.match(expr), number=runs)
+    print('  ipcidr {0:<23} scan {1:8.4f}s  index {2:8.4f}s'.format(
+        expr, scan / runs, idx / runs))
+
+    def compound_scan():
+        return ((scan_grains(minions, 'os:Ubuntu') |
+                 scan_grains(minions, 'os:Debian')) &
+                scan_grains(minions, 'roles:web')) - \
+            scan_cidr(minions, '10.0.0.0/20')
+
+    def compound_index():
+        return salt.utils.minions._eval_set_expr(
+            ['(', index.match('os:Ubuntu'), '|', index.match('os:Debian'),
+             ')', '&', index.match('roles:web'), '-', cidr.match('10.0.0.0/20')])
+    assert compound_scan() == compound_index()
+    scan = timeit.timeit(compound_scan, number=runs)
+    idx = timeit.timeit(compound_index, number=runs)
+    print('  compound (G or G) and G and not S\n{0:<32} scan {1:8.4f}s  '
+          'index {2:8.4f}s'.format('', scan / runs, idx / runs))
+
+
+if __name__ == '__main__':
+    opts = parse()
+    for count in opts['minions'].split(','):
+        run(int(count), opts['runs'])
@@ -84,3 +84,81 @@ class LocalClientTestCase(TestCase,
                 self.assertRaises(SaltInvocationError,
                                   self.local_client.pub,
                                   'non_existant_group', 'test.ping', expr_form='nodegroup')
+
+    def test_get_returns_from_events(self):
+        # m1 returns on the event bus, m2 returned before the client was
+        # listening and is only in the job cache
+        cache = {'get_load': lambda jid: {'jid': jid},
+                 'get_jid': lambda jid: {'m1': {'return': True},
+                                         'm2': {'return': False}}}
+        with patch.object(self.local_client, '_job_cache', cache.get):
+            with patch.object(self.local_client.event, 'get_event',
+                              side_effect=[{'id': 'm1', 'return': True}, None]):
+                self.assertEqual(
+                    list(self.local_client.get_cli_returns('1', ['m1', 'm2'])),
+                    [{'m1': {'ret': True}}, {'m2': {'ret': False}}])
+            with patch.object(self.local_client.event, 'get_event',
+                              side_effect=[{'id': 'm1', 'return': True}, None]):
+                self.assertEqual(
+                    self.local_client.get_returns('1', ['m1', 'm2']),
+                    {'m1': True, 'm2': False})
+
+    def test_job_subscriptions(self):
+        # The client listens to the events of the job only while waiting on
+        # its returns
+        event = self.local_client.event
+        cache = {'get_load': lambda jid: {'jid': jid},
+                 'get_jid': lambda jid: {}}
+        pub_data = {'jid': '1234', 'minions': ['m1']}
+        with patch.object(self.local_client, '_job_cache', cache.get):
+            with patch.object(self.local_client, 'pub',
+                              return_value=pub_data):
+                # Nothing waits on the returns of a bare run_job
+                self.assertEqual(self.local_client.run_job('*', 'test.ping'),
+                                 pub_data)
+                self.assertEqual(event.subscriptions, set())
+
+                self.assertEqual(
+                    self.local_client.run_job('*', 'test.ping', listen=True),
+                    pub_data)
+                self.assertEqual(event.subscriptions,
+                                 set(['salt/job/1234']))
+                with patch.object(event, 'get_event',
+                                  return_value={'id': 'm1',
+                                                'return': True}) as get:
+                    self.assertEqual(
+                        self.local_client.get_returns('1234', ['m1']),
+                        {'m1': True})
+                get.assert_called_with(1, 'salt/job/1234')
+                self.assertEqual(event.subscriptions, set())
+
+                self.local_client.cmd_async('*', 'test.ping')
+                self.assertEqual(event.subscriptions, set())
+
+                self.local_client.run_job('*', 'test.ping', listen=True)
+                with patch.object(event, 'get_event',
+                                  return_value={'id': 'm1',
+                                                'return': True}):
+                    returns = self.local_client.get_iter_returns(
+                        '1234', ['m1'])
+                    self.assertEqual(next(returns), {'m1': {'ret': True}})
+                    returns.close()
+                self.assertEqual(event.subscriptions, set())
+
+    def test_syndic_minions(self):
+        # The master of masters refires the list of the minions behind a
+        # syndic under the tag of the job, the client waits for them as well
+        cache = {'get_load': lambda jid: {'jid': jid},
+                 'get_jid': lambda jid: {}}
+        events = [{'tag': 'salt/job/1/minions',
+                   'data': {'minions': ['s1'], '_stamp': 'now'}},
+                  {'id': 'm1', 'return': True},
+                  None,
+                  {'id': 's1', 'return': True}]
+        with patch.object(self.local_client, '_job_cache', cache.get):
+            with patch.object(self.local_client.event, 'get_event',
+                              side_effect=events) as get:
+                self.assertEqual(
+                    list(self.local_client.get_cli_returns('1', ['m1'])),
+                    [{'m1': {'ret': True}}, {'s1': {'ret': True}}])
+            self.assertEqual(get.call_args[0][1], 'salt/job/1')
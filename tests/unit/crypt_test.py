@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.crypt_test
+    ~~~~~~~~~~~~~~~~~~~~~
+'''
+
+# Import python libs
+import os
+import shutil
+import tempfile
+
+# Import Salt Testing libs
+from salttesting import TestCase
+from salttesting import skipIf
+from salttesting.helpers import ensure_in_syspath
+from salttesting.mock import patch, NO_MOCK, NO_MOCK_REASON
+ensure_in_syspath('../')
+
+# Import Salt libs
+import integration
+import salt.crypt
+from salt.exceptions import AuthenticationError
+
+OPTS = {'serial': 'msgpack'}
+
+
+class CrypticleTestCase(TestCase):
+
+    def setUp(self):
+        self.crypticle = salt.crypt.Crypticle(
+            OPTS, salt.crypt.Crypticle.generate_key_string())
+
+    def test_round_trip(self):
+        for size in (0, 1, 15, 16, 17, 65536):
+            data = os.urandom(size)
+            self.assertEqual(
+                self.crypticle.decrypt(self.crypticle.encrypt(data)), data)
+            self.assertEqual(
+                self.crypticle.loads(self.crypticle.dumps({'data': data})),
+                {'data': data})
+        self.assertEqual(
+            self.crypticle.decrypt(self.crypticle.encrypt('data', 'prefix')),
+            'prefixdata')
+
+    def test_tampered(self):
+        data = self.crypticle.dumps({'cmd': '_return'})
+        for bad in (data[:-1] + chr(ord(data[-1]) ^ 1),
+                    chr(ord(data[0]) ^ 1) + data[1:],
+                    data[:40], ''):
+            self.assertRaises(AuthenticationError, self.crypticle.loads, bad)
+        self.assertFalse(salt.crypt.compare_digest('abc', 'abd'))
+        self.assertFalse(salt.crypt.compare_digest('abc', 'ab'))
+        self.assertTrue(salt.crypt.compare_digest('abc', 'abc'))
+
+
+class CrypticleRolloverTestCase(TestCase):
+
+    def setUp(self):
+        self.current = salt.crypt.Crypticle.generate_key_string()
+        self.next = salt.crypt.Crypticle.generate_key_string()
+
+    def tearDown(self):
+        salt.crypt.Crypticle.ROLLOVERS.clear()
+
+    def test_accept(self):
+        master = salt.crypt.Crypticle(OPTS, self.current)
+        minion = salt.crypt.Crypticle(OPTS, self.next)
+        self.assertRaises(AuthenticationError, master.loads,
+                          minion.dumps({'cmd': '_return'}))
+        master.accept(self.next)
+        self.assertEqual(master.loads(minion.dumps({'cmd': '_return'})),
+                         {'cmd': '_return'})
+        # The master keeps encrypting with the current key
+        self.assertRaises(AuthenticationError, minion.loads,
+                          master.dumps({'ret': True}))
+
+    def test_rollover(self):
+        master = salt.crypt.Crypticle(OPTS, self.current)
+        minion = salt.crypt.Crypticle(OPTS, self.current)
+        channel = salt.crypt.Crypticle(OPTS, self.current)
+        old = master.dumps({'ret': True})
+        minion.rollover(self.next)
+        self.assertEqual(minion.key_string, self.next)
+        # The data encrypted with the old key is still decrypted
+        self.assertEqual(minion.loads(old), {'ret': True})
+        self.assertEqual(
+            salt.crypt.Crypticle(OPTS, self.next).loads(
+                minion.dumps({'cmd': '_return'})),
+            {'cmd': '_return'})
+        # The other crypticles of the process with the old key roll over too
+        self.assertEqual(
+            salt.crypt.Crypticle(OPTS, self.next).loads(
+                channel.dumps({'cmd': '_pillar'})),
+            {'cmd': '_pillar'})
+        self.assertEqual(channel.loads(old), {'ret': True})
+
+
+class DropfileTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(dir=integration.SYS_TMP_DIR)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read(self, name):
+        with open(os.path.join(self.tmpdir, name)) as fp_:
+            return fp_.read()
+
+    def test_dropfile(self):
+        aes = salt.crypt.dropfile(self.tmpdir, name='.dfn_next')
+        self.assertEqual(self.read('.dfn_next'), aes)
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir, '.dfnt')))
+        # A new key aborts the rollover
+        aes = salt.crypt.dropfile(self.tmpdir)
+        self.assertEqual(self.read('.dfn'), aes)
+        self.assertFalse(
+            os.path.exists(os.path.join(self.tmpdir, '.dfn_next')))
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class AuthDeferTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(dir=integration.SYS_TMP_DIR)
+        self.opts = {'serial': 'msgpack',
+                     'pki_dir': self.tmpdir,
+                     'master': 'salt',
+                     'master_uri': 'tcp://127.0.0.1:4506',
+                     'ipv6': False,
+                     'caller': True,
+                     'auth_timeout': 3,
+                     'acceptance_wait_time': 0}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_sign_in(self):
+        auth = salt.crypt.Auth(self.opts)
+        with patch('salt.utils.dns_check', return_value='127.0.0.1'):
+            with patch.object(salt.crypt.Auth, 'minion_sign_in_payload'):
+                with patch('salt.payload.SREQ.send_auto',
+                           return_value={'enc': 'clear',
+                                         'load': {'ret': True,
+                                                  'defer': True}}):
+                    self.assertEqual(auth.sign_in(), 'defer')
+                with patch('salt.payload.SREQ.send_auto',
+                           return_value={'enc': 'clear',
+                                         'load': {'ret': True}}):
+                    self.assertEqual(auth.sign_in(), 'retry')
+
+    def test_caller_waits(self):
+        aes = salt.crypt.Crypticle.generate_key_string()
+        with patch.object(salt.crypt.SAuth, 'sign_in',
+                          side_effect=['defer', 'defer', {'aes': aes}]):
+            sauth = salt.crypt.SAuth(self.opts)
+        self.assertEqual(sauth.crypticle.key_string, aes)
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests(CrypticleTestCase, CrypticleRolloverTestCase, DropfileTestCase,
+              AuthDeferTestCase, needs_daemon=False)
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.fileclient_test
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+'''
+
+# Import python libs
+import hashlib
+import os
+import shutil
+import tempfile
+
+# Import Salt Testing libs
+from salttesting import TestCase, skipIf
+from salttesting.helpers import ensure_in_syspath
+from salttesting.mock import patch, NO_MOCK, NO_MOCK_REASON
+ensure_in_syspath('../')
+
+# Import Salt libs
+import integration
+from salt import fileclient
+from salt import fileserver
+from salt.exceptions import SaltReqTimeoutError
+import salt.utils.rdiff
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class RemoteClientTestCase(TestCase):
+
+    @patch('salt.transport.Channel.factory')
+    def test_channel_reuse(self, factory):
+        factory.return_value.send.return_value = ['top.sls']
+        client = fileclient.RemoteClient({'cachedir': '/tmp'})
+        for _ in range(4):
+            self.assertEqual(client.file_list(), ['top.sls'])
+        client.dir_list()
+        client.hash_file('salt://top.sls')
+        self.assertEqual(factory.call_count, 1)
+        self.assertEqual(client.channel_stats, {'requests': 6, 'opened': 1})
+
+        # A timed out request drops the channel, the next one opens a new
+        # channel transparently
+        factory.return_value.send.side_effect = SaltReqTimeoutError
+        self.assertEqual(client.file_list(), '')
+        factory.return_value.send.side_effect = None
+        self.assertEqual(client.file_list(), ['top.sls'])
+        self.assertEqual(factory.call_count, 2)
+        self.assertEqual(client.channel_reuse(), 0.75)
+
+
+class FakeChannel(object):
+    '''
+    Serve files in chunks of three bytes like the master file server
+    '''
+    data = 'salt file data!'
+    ttype = 'zeromq'
+    auth = None
+
+    def __init__(self):
+        self.files = {'top.sls': self.data, 'a.sls': 'a', 'b/c.sls': 'bc' * 4}
+        self.sent = []
+        self.windows = []
+        self.cmds = []
+        with patch('salt.loader.fileserver', return_value={}):
+            self.fileserver = fileserver.Fileserver(
+                {'file_buffer_size': 3, 'fileserver_backend': []})
+        self.fileserver.serve_file = self.serve_file
+        self.fileserver.file_hash = self.file_hash
+        self.fileserver.file_delta = self.file_delta
+
+    def serve_file(self, load):
+        if load['path'] not in self.files:
+            return {'data': '', 'dest': ''}
+        return {'data': self.files[load['path']][load['loc']:load['loc'] + 3],
+                'dest': load['path']}
+
+    def file_hash(self, load):
+        if load['path'] not in self.files:
+            return ''
+        return {'hsum': hashlib.md5(self.files[load['path']]).hexdigest(),
+                'hash_type': 'md5'}
+
+    def file_delta(self, load):
+        data = self.files[load['path']]
+        loc = load['loc']
+        ops, end = salt.utils.rdiff.delta_chunk(
+                data[loc:loc + 2048 + load['block_size'] - 1],
+                load['sig'], load['block_size'], 2048)
+        return {'delta': ops,
+                'hash': self.file_hash(load),
+                'loc': loc + end,
+                'done': loc + end >= len(data)}
+
+    def send(self, load):
+        self.cmds.append(load['cmd'])
+        if load['cmd'] == '_serve_file':
+            self.sent.append(load['loc'])
+        return getattr(self.fileserver, load['cmd'][1:])(load)
+
+    def send_iter(self, loads, window):
+        self.windows.append(window)
+        for load in loads:
+            yield self.send(load)
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class GetFileTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(dir=integration.SYS_TMP_DIR)
+        self.channel = FakeChannel()
+        with patch('salt.transport.Channel.factory',
+                   return_value=self.channel):
+            self.client = fileclient.RemoteClient(
+                {'cachedir': self.tmpdir, 'file_transfer_window': 4})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_get_file(self):
+        dest = os.path.join(self.tmpdir, 'top.sls')
+        self.assertEqual(self.client.get_file('salt://top.sls', dest), dest)
+        with open(dest) as fp_:
+            self.assertEqual(fp_.read(), FakeChannel.data)
+        self.assertFalse(os.path.exists(dest + '.partial'))
+        self.assertEqual(self.channel.windows, [4])
+        self.assertEqual(self.channel.sent, [0, 3, 6, 9, 12, 15])
+
+        # The file is current, nothing is transferred
+        self.channel.sent = []
+        self.assertEqual(self.client.get_file('salt://top.sls', dest), dest)
+        self.assertEqual(self.channel.sent, [])
+
+    def test_resume(self):
+        dest = os.path.join(self.tmpdir, 'top.sls')
+        with open(dest + '.partial', 'w') as fp_:
+            fp_.write(FakeChannel.data[:7])
+        self.assertEqual(self.client.get_file('salt://top.sls', dest), dest)
+        self.assertEqual(self.channel.sent[0], 7)
+        with open(dest) as fp_:
+            self.assertEqual(fp_.read(), FakeChannel.data)
+
+    def test_bad_partial(self):
+        dest = os.path.join(self.tmpdir, 'top.sls')
+        with open(dest + '.partial', 'w') as fp_:
+            fp_.write('junk')
+        self.assertEqual(self.client.get_file('salt://top.sls', dest), dest)
+        with open(dest) as fp_:
+            self.assertEqual(fp_.read(), FakeChannel.data)
+
+    def test_unverified_partial(self):
+        dest = os.path.join(self.tmpdir, 'top.sls')
+        with open(dest + '.partial', 'w') as fp_:
+            fp_.write('junk')
+        # Without a hash from the master the partial file is not resumed
+        self.channel.fileserver.file_hash = lambda load: ''
+        self.assertEqual(self.client.get_file('salt://top.sls', dest), dest)
+        self.assertEqual(self.channel.sent[0], 0)
+        with open(dest) as fp_:
+            self.assertEqual(fp_.read(), FakeChannel.data)
+
+    def test_missing(self):
+        dest = os.path.join(self.tmpdir, 'missing')
+        self.assertEqual(self.client.get_file('salt://missing', dest), '')
+        self.assertFalse(os.path.exists(dest))
+        self.assertFalse(os.path.exists(dest + '.partial'))
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class GetFilesTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(dir=integration.SYS_TMP_DIR)
+        self.channel = FakeChannel()
+        with patch('salt.transport.Channel.factory',
+                   return_value=self.channel):
+            self.client = fileclient.RemoteClient({'cachedir': self.tmpdir})
+        self.paths = ['salt://top.sls', 'salt://a.sls', 'salt://b/c.sls',
+                      'salt://missing']
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _cached(self, path):
+        return os.path.join(self.tmpdir, 'files', 'base', path)
+
+    def test_get_files(self):
+        ret = self.client.get_files(self.paths)
+        self.assertEqual(
+            ret,
+            [self._cached('top.sls'), self._cached('a.sls'),
+             self._cached('b/c.sls'), ''])
+        for path, data in self.channel.files.items():
+            with open(self._cached(path)) as fp_:
+                self.assertEqual(fp_.read(), data)
+        self.assertEqual(self.channel.cmds[0], '_file_hashes')
+        self.assertEqual(set(self.channel.cmds[1:]), set(['_serve_files']))
+
+        # Only the changed file is sent again
+        self.channel.cmds = []
+        self.channel.files['a.sls'] = 'aa'
+        self.assertEqual(self.client.get_files(self.paths), ret)
+        self.assertEqual(self.channel.cmds, ['_file_hashes', '_serve_files'])
+        with open(self._cached('a.sls')) as fp_:
+            self.assertEqual(fp_.read(), 'aa')
+
+        self.channel.cmds = []
+        self.assertEqual(self.client.get_files(self.paths), ret)
+        self.assertEqual(self.channel.cmds, ['_file_hashes'])
+
+    def test_old_master(self):
+        send = self.channel.send
+        self.channel.send = lambda load: False \
+            if load['cmd'] == '_file_hashes' else send(load)
+        self.assertEqual(
+            self.client.get_files(self.paths[:2]),
+            [self._cached('top.sls'), self._cached('a.sls')])
+        self.assertNotIn('_serve_files', self.channel.cmds)
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class BlobTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(dir=integration.SYS_TMP_DIR)
+        self.channel = FakeChannel()
+        self.data = ''.join(chr(num % 251) for num in range(5000))
+        self.channel.files['big'] = self.data
+        with patch('salt.transport.Channel.factory',
+                   return_value=self.channel):
+            self.client = fileclient.RemoteClient(
+                {'cachedir': self.tmpdir, 'file_blobs': True,
+                 'file_buffer_size': 3})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_delta(self):
+        dest = self.client.get_file('salt://big')
+        blob = os.path.join(self.tmpdir, 'blobs', 'md5',
+                            hashlib.md5(self.data).hexdigest()[:2],
+                            hashlib.md5(self.data).hexdigest())
+        self.assertEqual(os.stat(dest).st_ino, os.stat(blob).st_ino)
+
+        # Only the changed block is sent, in chunks of the file
+        self.channel.cmds = []
+        self.channel.files['big'] = self.data[:2000] + 'x' + self.data[2000:]
+        self.assertEqual(self.client.get_file('salt://big'), dest)
+        self.assertEqual(self.channel.cmds,
+                         ['_file_hash'] + ['_file_delta'] * 3)
+        with open(dest, 'rb') as fp_:
+            self.assertEqual(fp_.read(), self.channel.files['big'])
+        with open(blob, 'rb') as fp_:
+            self.assertEqual(fp_.read(), self.data)
+
+    def test_saltenvs(self):
+        base = self.client.get_file('salt://big')
+        self.channel.cmds = []
+        dev = self.client.get_file('salt://big', saltenv='dev')
+        self.assertNotEqual(base, dev)
+        self.assertEqual(self.channel.cmds, ['_file_hash'])
+        self.assertEqual(os.stat(base).st_ino, os.stat(dev).st_ino)
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests(RemoteClientTestCase, GetFileTestCase, GetFilesTestCase,
+              BlobTestCase, needs_daemon=False)
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.fileserver_test
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+'''
+
+# Import python libs
+import hashlib
+import os
+import shutil
+import tempfile
+from StringIO import StringIO
+
+# Import Salt Testing libs
+from salttesting import TestCase, skipIf
+from salttesting.helpers import ensure_in_syspath
+from salttesting.mock import patch, NO_MOCK, NO_MOCK_REASON
+ensure_in_syspath('../')
+
+# Import Salt libs
+import integration
+from salt import fileserver
+from salt.fileserver import roots
+from salt.utils import rdiff
+
+
+class HashIndexTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(dir=integration.SYS_TMP_DIR)
+        self.opts = {'cachedir': self.tmpdir, 'hash_type': 'md5'}
+        self.path = os.path.join(self.tmpdir, 'top.sls')
+        self._write('base:\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, data):
+        with open(self.path, 'w') as fp_:
+            fp_.write(data)
+
+    def test_get(self):
+        index = fileserver.HashIndex(self.opts, 'roots')
+        self.assertEqual(index.get(self.path),
+                         hashlib.md5('base:\n').hexdigest())
+        # A file which changed size is hashed again
+        self._write('base:\n  \'*\':\n')
+        self.assertEqual(index.get(self.path),
+                         hashlib.md5('base:\n  \'*\':\n').hexdigest())
+
+    @skipIf(NO_MOCK, NO_MOCK_REASON)
+    def test_shared(self):
+        fileserver.HashIndex(self.opts, 'roots').update([self.path])
+        self.assertTrue(os.path.isfile(
+            os.path.join(self.tmpdir, 'roots', 'hash_index.p')))
+        # Another process takes the hash from the saved index
+        index = fileserver.HashIndex(self.opts, 'roots')
+        with patch('salt.utils.get_hash') as get_hash:
+            self.assertEqual(index.get(self.path),
+                             hashlib.md5('base:\n').hexdigest())
+            self.assertFalse(get_hash.called)
+
+        # Files which are gone are dropped from the index
+        os.remove(self.path)
+        index.update([self.path])
+        self.assertEqual(index.hashes, {})
+
+    @skipIf(NO_MOCK, NO_MOCK_REASON)
+    def test_update_paths(self):
+        other = os.path.join(self.tmpdir, 'other.sls')
+        with open(other, 'w') as fp_:
+            fp_.write('other')
+        index = fileserver.HashIndex(self.opts, 'roots')
+        index.update([self.path, other])
+        self._write('base:\n  \'*\':\n')
+        with patch('salt.utils.get_hash', return_value='new') as get_hash, \
+                patch('os.stat', side_effect=os.stat) as stat:
+            index.update_paths([self.path], [other])
+            # Only the changed file is stat'ed and hashed
+            self.assertEqual(get_hash.call_count, 1)
+            self.assertEqual([call[0][0] for call in stat.call_args_list
+                              if call[0][0].endswith('.sls')],
+                             [self.path])
+        self.assertEqual(index.hashes.keys(), [self.path])
+        self.assertEqual(
+            fileserver.HashIndex(self.opts, 'roots').get(self.path), 'new')
+
+
+class MtimeMapTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(dir=integration.SYS_TMP_DIR)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_diff_mtime_map(self):
+        self.assertFalse(fileserver.diff_mtime_map({'a': 1.0}, {'a': 1.0}))
+        self.assertTrue(fileserver.diff_mtime_map({'a': 1.0}, {'b': 1.0}))
+        self.assertTrue(fileserver.diff_mtime_map({'a': 1.0}, {'a': 2.0}))
+
+    def test_changed_mtime_map(self):
+        changed, removed = fileserver.changed_mtime_map(
+            {'a': 1.0, 'b': 1.0, 'c': 1.0}, {'a': 1.0, 'b': 2.0, 'd': 1.0})
+        self.assertEqual(sorted(changed), ['b', 'd'])
+        self.assertEqual(removed, ['c'])
+
+    @skipIf(not roots.HAS_PYINOTIFY, 'pyinotify is not installed')
+    def test_watcher(self):
+        path = os.path.join(self.tmpdir, 'top.sls')
+        watcher = roots._MtimeMapWatcher({'base': [self.tmpdir]})
+        self.assertEqual(watcher.mtime_map, {})
+        self.assertFalse(watcher.update())
+
+        with open(path, 'w') as fp_:
+            fp_.write('base:\n')
+        self.assertTrue(watcher.update())
+        self.assertEqual(watcher.mtime_map, {path: os.path.getmtime(path)})
+        self.assertEqual(watcher.modified, set([path]))
+
+        os.makedirs(os.path.join(self.tmpdir, 'web'))
+        init = os.path.join(self.tmpdir, 'web', 'init.sls')
+        with open(init, 'w') as fp_:
+            fp_.write('nginx:\n')
+        self.assertTrue(watcher.update())
+        self.assertIn(init, watcher.mtime_map)
+
+        shutil.rmtree(os.path.join(self.tmpdir, 'web'))
+        self.assertTrue(watcher.update())
+        self.assertEqual(list(watcher.mtime_map), [path])
+        self.assertEqual(watcher.modified, set())
+        self.assertEqual(watcher.removed, set([init]))
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class FileDeltaTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(dir=integration.SYS_TMP_DIR)
+        self.path = os.path.join(self.tmpdir, 'big')
+        self.old = ''.join(chr(num % 251) for num in range(5000))
+        self.new = self.old[:2000] + 'x' + self.old[2000:]
+        with open(self.path, 'wb') as fp_:
+            fp_.write(self.new)
+        with patch('salt.loader.fileserver', return_value={}):
+            self.fileserver = fileserver.Fileserver(
+                {'file_buffer_size': 2048,
+                 'file_delta_max_size': 8192,
+                 'fileserver_backend': []})
+        self.fileserver.find_file = \
+            lambda path, saltenv, back=None: {'path': self.path,
+                                              'back': 'roots'}
+        self.bsize = rdiff.block_size(len(self.old))
+        self.load = {'path': 'big',
+                     'saltenv': 'base',
+                     'sig': rdiff.signature(StringIO(self.old), self.bsize),
+                     'block_size': self.bsize}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_chunks(self):
+        out = StringIO()
+        loc = 0
+        chunks = 0
+        while True:
+            ret = self.fileserver.file_delta(dict(self.load, loc=loc))
+            rdiff.patch(StringIO(self.old), ret['delta'], self.bsize, out)
+            chunks += 1
+            if ret['done']:
+                break
+            self.assertGreater(ret['loc'], loc)
+            loc = ret['loc']
+        self.assertEqual(out.getvalue(), self.new)
+        self.assertEqual(chunks, 3)
+
+    def test_max_size(self):
+        self.fileserver.opts['file_delta_max_size'] = 4096
+        self.assertIsNone(self.fileserver.file_delta(self.load)['delta'])
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests(HashIndexTestCase, MtimeMapTestCase, FileDeltaTestCase,
+              needs_daemon=False)
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.loader_test
+    ~~~~~~~~~~~~~~~~~~~~~~
+'''
+
+# Import python libs
+import os
+import shutil
+import tempfile
+
+# Import Salt Testing libs
+from salttesting import TestCase, skipIf
+from salttesting.helpers import ensure_in_syspath
+from salttesting.mock import patch, NO_MOCK, NO_MOCK_REASON
+ensure_in_syspath('../')
+
+# Import Salt libs
+import integration
+import salt.loader
+
+MODULES = {
+    'foo.py': (
+        'def ping():\n'
+        '    return True\n'
+    ),
+    'barpkg.py': (
+        '__virtualname__ = \'bar\'\n'
+        '\n'
+        '\n'
+        'def __virtual__():\n'
+        '    return __virtualname__\n'
+        '\n'
+        '\n'
+        'def install():\n'
+        '    return __salt__[\'foo.ping\']()\n'
+    ),
+    'bazbsd.py': (
+        'def __virtual__():\n'
+        '    return \'baz\'\n'
+    ),
+    'nope.py': (
+        'def __virtual__():\n'
+        '    return False\n'
+        '\n'
+        '\n'
+        'def ping():\n'
+        '    return True\n'
+    ),
+}
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class LazyLoaderTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(dir=integration.SYS_TMP_DIR)
+        self.module_dir = os.path.join(self.tmpdir, 'modules')
+        os.makedirs(self.module_dir)
+        for name, source in MODULES.items():
+            with open(os.path.join(self.module_dir, name), 'w') as fp_:
+                fp_.write(source)
+        salt.loader._generate_module('salt.loaded.ext')
+        salt.loader._generate_module('salt.loaded.ext.lazytest')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _loader(self):
+        return salt.loader.Loader(
+            [self.module_dir], {'cachedir': self.tmpdir}, tag='lazytest')
+
+    def test_module_index(self):
+        index = self._loader().module_index()
+        self.assertEqual(
+            sorted(index),
+            ['bar', 'barpkg', 'baz', 'bazbsd', 'foo', 'nope'])
+        self.assertEqual(index['bar'], index['barpkg'])
+        self.assertTrue(os.path.isfile(
+            os.path.join(self.tmpdir, 'loader', 'lazytest.p')))
+
+        # The saved index is used while the module_dirs are unchanged
+        with patch.object(salt.loader.Loader, '_module_files') as files:
+            self.assertEqual(self._loader().module_index(), index)
+            self.assertFalse(files.called)
+
+    def test_lazy(self):
+        functions = salt.loader.LazyLoader(self._loader())
+        self.assertTrue(functions['bar.install']())
+        self.assertEqual(functions.loaded_modules, set(['barpkg', 'foo']))
+
+        self.assertNotIn('nope.ping', functions)
+        self.assertTrue(functions.loaded_all)
+        self.assertEqual(sorted(functions), ['bar.install', 'foo.ping'])
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class VirtualCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(dir=integration.SYS_TMP_DIR)
+        self.module_dir = os.path.join(self.tmpdir, 'modules')
+        os.makedirs(self.module_dir)
+        for name, source in MODULES.items():
+            with open(os.path.join(self.module_dir, name), 'w') as fp_:
+                fp_.write(source)
+        salt.loader._generate_module('salt.loaded.ext')
+        salt.loader._generate_module('salt.loaded.ext.virtualtest')
+        self.imported = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _loader(self, grains=None):
+        return salt.loader.Loader(
+            [self.module_dir],
+            {'cachedir': self.tmpdir,
+             'virtual_cache': True,
+             'grains': grains or {'os': 'Linux'}},
+            tag='virtualtest')
+
+    def _gen_functions(self, loader=None):
+        import_module = salt.loader.Loader._import_module
+
+        def _import(loader, name, path):
+            self.imported.append(name)
+            return import_module(loader, name, path)
+        self.imported = []
+        with patch.object(salt.loader.Loader, '_import_module', _import):
+            return (loader or self._loader()).gen_functions()
+
+    def test_skip(self):
+        funcs = self._gen_functions()
+        self.assertEqual(sorted(funcs), ['bar.install', 'foo.ping'])
+        self.assertEqual(sorted(self.imported),
+                         ['barpkg', 'bazbsd', 'foo', 'nope'])
+        self.assertTrue(os.path.isfile(
+            os.path.join(self.tmpdir, 'loader', 'virtualtest.virtual.p')))
+
+        # The module __virtual__ turned down is not imported again
+        self.assertEqual(sorted(self._gen_functions()), sorted(funcs))
+        self.assertEqual(sorted(self.imported), ['barpkg', 'bazbsd', 'foo'])
+
+    def test_invalidate(self):
+        self._gen_functions()
+
+        # Changed grains drop the cache
+        self._gen_functions(self._loader({'os': 'FreeBSD'}))
+        self.assertIn('nope', self.imported)
+
+        # So does a changed module, as when synced
+        self._gen_functions()
+        path = os.path.join(self.module_dir, 'nope.py')
+        with open(path, 'w') as fp_:
+            fp_.write(MODULES['foo.py'])
+        mtime = os.path.getmtime(path) + 10
+        os.utime(path, (mtime, mtime))
+        self.assertIn('nope.ping', self._gen_functions())
+        self.assertIn('nope', self.imported)
+
+    def test_lazy(self):
+        self._gen_functions()
+        functions = salt.loader.LazyLoader(self._loader())
+        self.assertTrue(functions['bar.install']())
+        self.assertEqual(functions.loaded_modules, set(['barpkg', 'foo']))
+
+        # Every module is in the cache, a missing function is known missing
+        # without loading all of the modules
+        self.assertNotIn('nope.ping', functions)
+        self.assertNotIn('bar.missing', functions)
+        self.assertFalse(functions.loaded_all)
+        self.assertNotIn('bazbsd', functions.loaded_modules)
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests(LazyLoaderTestCase, VirtualCacheTestCase, needs_daemon=False)
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.master_test
+    ~~~~~~~~~~~~~~~~~~~~~~
+'''
+
+# Import python libs
+import os
+import shutil
+import collections
+import tempfile
+
+# Import Salt Testing libs
+from salttesting import TestCase, skipIf
+from salttesting.helpers import ensure_in_syspath
+from salttesting.mock import MagicMock, patch, NO_MOCK, NO_MOCK_REASON
+ensure_in_syspath('../')
+
+# Import Salt libs
+import integration
+import salt.crypt
+import salt.master
+import salt.utils
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class MWorkerStatsTestCase(TestCase):
+
+    def setUp(self):
+        self.opts = {'serial': 'msgpack',
+                     'master_stats': True,
+                     'master_stats_event_iter': 60}
+        self.worker = salt.master.MWorker(self.opts, None, None, None)
+        self.worker.aes_funcs = MagicMock()
+        self.fire = self.worker.aes_funcs.event.fire_event
+
+    @patch('time.time')
+    def test_stats(self, now):
+        now.return_value = self.worker.stats_start + 1
+        self.worker._stat('_pillar', self.worker.stats_start)
+        now.return_value += 2
+        self.worker._stat('_pillar', now.return_value - 3)
+        self.worker._stat('_return', now.return_value)
+        self.assertFalse(self.fire.called)
+        self.assertEqual(self.worker.stats['_pillar'],
+                         {'runs': 2, 'total': 4, 'max': 3})
+
+        now.return_value += 60
+        self.worker._stat('_return', now.return_value - 1)
+        data, tag = self.fire.call_args[0]
+        self.assertEqual(tag, 'salt/stats/{0}'.format(self.worker.name))
+        self.assertEqual(data['lane'], 'fast')
+        self.assertEqual(data['stats'],
+                         {'_pillar': {'runs': 2, 'mean': 2, 'max': 3},
+                          '_return': {'runs': 2, 'mean': 0.5, 'max': 1}})
+        self.assertEqual(self.worker.stats, {})
+        self.assertEqual(self.worker.stats_start, now.return_value)
+
+    def test_off(self):
+        self.opts['master_stats'] = False
+        self.worker._stat('_pillar', 0)
+        self.assertEqual(self.worker.stats, {})
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class MWorkerSlowLaneTestCase(TestCase):
+
+    def setUp(self):
+        self.opts = {'serial': 'msgpack',
+                     'master_stats': False,
+                     'slow_worker_timeout': 60}
+        self.worker = salt.master.MWorker(self.opts, None, None, None,
+                                          lane='slow')
+        self.worker.aes_funcs = MagicMock()
+        self.worker.aes_funcs.run_func.return_value = 'pillar'
+
+    def test_decrypted(self):
+        with patch.object(salt.master.MWorker, '_decrypt') as decrypt:
+            ret = self.worker._handle_slow('aes', {'cmd': '_pillar',
+                                                   'id': 'minion'})
+        self.assertEqual(ret, 'pillar')
+        self.assertFalse(decrypt.called)
+        self.worker.aes_funcs.run_func.assert_called_once_with(
+            '_pillar', {'cmd': '_pillar', 'id': 'minion'})
+
+    @patch('time.time')
+    def test_expire(self, now):
+        now.return_value = 1000
+        pending = collections.OrderedDict()
+        pending['1'] = (['old'], 900)
+        pending['2'] = (['old'], 940)
+        pending['3'] = (['new'], 950)
+        pending['4'] = (['new'], 990)
+        self.worker._expire_slow(pending)
+        self.assertEqual(list(pending), ['3', '4'])
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class AuthTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(dir=integration.SYS_TMP_DIR)
+        for name in ('minions', 'minions_pre', 'minions_rejected',
+                     'minions_denied'):
+            os.makedirs(os.path.join(self.tmpdir, name))
+        self.opts = {'pki_dir': self.tmpdir,
+                     'keysize': 1024,
+                     'aes': salt.crypt.Crypticle.generate_key_string(),
+                     'id_valid_regex': '.*',
+                     'open_mode': False,
+                     'auto_accept': False,
+                     'auth_mode': 1,
+                     'auth_rate_limit': 0,
+                     'publish_port': 4505}
+        with patch.object(salt.master.ClearFuncs, '__init__',
+                          return_value=None):
+            self.funcs = salt.master.ClearFuncs()
+        self.funcs.opts = self.opts
+        self.funcs.event = MagicMock()
+        self.funcs.master_key = salt.crypt.MasterKeys(self.opts)
+        self.funcs.pub_cache = {}
+        self.funcs.aes_sig = (None, None)
+        self.funcs.auth_admitted = (0, 0)
+        salt.crypt.gen_keys(self.tmpdir, 'minion', 1024)
+        with salt.utils.fopen(os.path.join(self.tmpdir, 'minion.pub')) as fp_:
+            self.pub = fp_.read()
+        self.pubfn = os.path.join(self.tmpdir, 'minions', 'minion')
+        with salt.utils.fopen(self.pubfn, 'w') as fp_:
+            fp_.write(self.pub)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def auth(self, pub=None):
+        return self.funcs._auth({'id': 'minion', 'pub': pub or self.pub})
+
+    def test_cached_key(self):
+        with patch('salt.master.RSA.load_pub_key',
+                   side_effect=salt.master.RSA.load_pub_key) as load:
+            first = self.auth()
+            second = self.auth()
+            self.assertEqual(load.call_count, 1)
+        self.assertEqual(first['enc'], 'pub')
+        self.assertEqual(second['enc'], 'pub')
+        # The signature of the AES key is made once
+        self.assertEqual(first['sig'], second['sig'])
+
+        # Another key is not let in from the cache
+        self.assertEqual(self.auth(pub='bad key')['load']['ret'], False)
+
+        # A rejected key is not let in either
+        os.rename(self.pubfn,
+                  os.path.join(self.tmpdir, 'minions_rejected', 'minion'))
+        self.assertEqual(self.auth()['load']['ret'], False)
+
+    def test_deleted_key(self):
+        self.auth()
+        os.remove(self.pubfn)
+        # The minion is a new minion again and waits in pending
+        self.assertEqual(self.auth()['load']['ret'], True)
+        self.assertNotIn('minion', self.funcs.pub_cache)
+        self.assertTrue(os.path.isfile(
+            os.path.join(self.tmpdir, 'minions_pre', 'minion')))
+
+    def test_rate_limit(self):
+        self.opts['auth_rate_limit'] = 1
+        with patch('time.time', return_value=1000):
+            self.assertEqual(self.auth()['enc'], 'pub')
+            self.assertEqual(self.auth(),
+                             {'enc': 'clear',
+                              'load': {'ret': True, 'defer': True}})
+        with patch('time.time', return_value=1001):
+            self.assertEqual(self.auth()['enc'], 'pub')
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests(MWorkerStatsTestCase, MWorkerSlowLaneTestCase, AuthTestCase,
+              needs_daemon=False)
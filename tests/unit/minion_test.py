@@ -3,17 +3,25 @@
     :codauthor: :email:`Mike Place <mp@saltstack.com>`
 '''
 
+# Import python libs
+import os
+import shutil
+import tempfile
+import time
+
 # Import Salt Testing libs
 from salttesting import TestCase, skipIf
 from salttesting.helpers import ensure_in_syspath
 from salttesting.mock import NO_MOCK, NO_MOCK_REASON, patch
 
-from salt import minion
-from salt.exceptions import SaltSystemExit
-
-
 ensure_in_syspath('../')
 
+# Import Salt libs
+import integration
+import salt.crypt
+from salt import minion
+from salt.exceptions import SaltSystemExit, SaltReqTimeoutError
+
 __opts__ = {}
 
 
@@ -22,3 +30,275 @@ class MinionTestCase(TestCase):
     def test_invalid_master_address(self):
         with patch.dict(__opts__, {'ipv6': False, 'master': float('127.0'), 'master_port': '4555', 'retry_dns': False}):
             self.assertRaises(SaltSystemExit, minion.resolve_dns, __opts__)
+
+
+def _run_job(minion_instance, opts, data):
+    time.sleep(data['arg'][0])
+    with open(os.path.join(minion_instance.proc_dir, data['jid']), 'w') as fp_:
+        fp_.write(str(os.getpid()))
+
+
+class FakeMinion(object):
+
+    def __init__(self, proc_dir):
+        self.proc_dir = proc_dir
+        self.opts = {}
+        self.returns = []
+
+    def _return_pub(self, ret):
+        self.returns.append(ret)
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class WorkerPoolTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(dir=integration.SYS_TMP_DIR)
+        self.minion = FakeMinion(self.tmpdir)
+        self.patcher = patch.object(minion.Minion, '_thread_return',
+                                    staticmethod(_run_job))
+        self.patcher.start()
+        self.pool = None
+
+    def tearDown(self):
+        if self.pool is not None:
+            self.pool.stop()
+        self.patcher.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def start(self, size, **kwargs):
+        self.pool = minion.WorkerPool(self.minion, size, **kwargs)
+        self.pool.start()
+
+    def job(self, jid, length=0):
+        return {'jid': jid, 'fun': 'test.sleep', 'arg': [length], 'ret': ''}
+
+    def wait(self, timeout=10):
+        end = time.time() + timeout
+        while time.time() < end:
+            self.pool.process()
+            if not self.pool.pending and all(
+                    worker['data'] is None for worker in self.pool.workers):
+                return
+            time.sleep(0.05)
+        self.fail('The jobs did not finish')
+
+    def pids(self, jids):
+        ret = []
+        for jid in jids:
+            with open(os.path.join(self.tmpdir, jid)) as fp_:
+                ret.append(int(fp_.read()))
+        return ret
+
+    def test_run(self):
+        self.start(2)
+        workers = set(worker['proc'].pid for worker in self.pool.workers)
+        jids = [str(num) for num in range(6)]
+        for jid in jids:
+            self.assertTrue(self.pool.submit(self.job(jid)))
+        self.wait()
+        self.assertEqual(set(self.pids(jids)), workers)
+        self.assertNotIn(os.getpid(), self.pids(jids))
+
+    def test_queue(self):
+        self.start(1, queue_size=1)
+        self.assertTrue(self.pool.submit(self.job('1', 0.5)))
+        self.assertTrue(self.pool.submit(self.job('2')))
+        self.assertFalse(self.pool.submit(self.job('3')))
+        self.wait()
+        self.assertEqual(len(self.pids(['1', '2'])), 2)
+
+    def test_recycle(self):
+        self.start(1, recycle=1)
+        self.pool.submit(self.job('1'))
+        self.wait()
+        self.pool.submit(self.job('2'))
+        self.wait()
+        first, second = self.pids(['1', '2'])
+        self.assertNotEqual(first, second)
+        self.assertEqual(len(self.pool.workers), 1)
+
+    def test_timeout(self):
+        self.start(1, timeout=1)
+        self.pool.submit(self.job('slow', 30))
+        self.wait()
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir, 'slow')))
+        self.assertEqual(len(self.minion.returns), 1)
+        self.assertEqual(self.minion.returns[0]['jid'], 'slow')
+        self.assertFalse(self.minion.returns[0]['success'])
+        # The worker was replaced
+        self.pool.submit(self.job('fast'))
+        self.wait()
+        self.assertEqual(len(self.pids(['fast'])), 1)
+
+    def test_killed(self):
+        self.start(1)
+        self.pool.submit(self.job('killed', 30))
+        pid = self.pool.workers[0]['proc'].pid
+        os.kill(pid, 9)
+        self.wait()
+        self.assertEqual(self.minion.returns, [])
+        self.assertNotEqual(self.pool.workers[0]['proc'].pid, pid)
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class ReturnBatchTestCase(TestCase):
+
+    def setUp(self):
+        self.minion = object.__new__(minion.Minion)
+        self.minion.opts = {'id': 'minion', 'return_batch_delay': 0.05}
+        self.minion._return_queue = []
+        self.loads = [{'cmd': '_return', 'id': 'minion', 'jid': str(num),
+                       'return': True, '_stamp': 'now'} for num in range(3)]
+
+    def test_batch(self):
+        for load in self.loads:
+            self.minion._queue_return(load)
+        self.assertNotIn('_stamp', self.loads[0])
+        self.assertLessEqual(self.minion._return_wait(10), 0.05)
+        with patch.object(minion.Minion, '_send_master',
+                          return_value=True) as send:
+            self.minion._flush_returns()
+            self.assertFalse(send.called)
+            time.sleep(0.06)
+            self.assertEqual(self.minion._return_wait(10), 0)
+            self.minion._flush_returns()
+            send.assert_called_once_with({'cmd': '_return_batch',
+                                          'id': 'minion',
+                                          'returns': self.loads})
+        self.assertEqual(self.minion._return_queue, [])
+        self.assertEqual(self.minion._return_wait(10), 10)
+
+    def test_old_master(self):
+        for load in self.loads:
+            self.minion._queue_return(load)
+        self.minion._return_due = 0
+        with patch.object(minion.Minion, '_send_master',
+                          return_value='encrypted False') as send:
+            self.minion._flush_returns()
+        self.assertEqual(send.call_count, 4)
+        self.assertEqual([call[0][0] for call in send.call_args_list[1:]],
+                         self.loads)
+        self.assertTrue(self.minion._return_batch_unsupported)
+
+    def test_timeout(self):
+        for load in self.loads:
+            self.minion._queue_return(load)
+        self.minion._return_due = 0
+        with patch.object(minion.Minion, '_send_master',
+                          side_effect=SaltReqTimeoutError) as send:
+            self.minion._flush_returns()
+        self.assertEqual(send.call_count, 1)
+        self.assertEqual(self.minion._return_queue, [])
+
+
+def _return_job(minion_instance, opts, data):
+    minion_instance._return_pub({'jid': data['jid'],
+                                 'fun': data['fun'],
+                                 'return': True})
+
+
+def _mark(minion_instance, load, how):
+    path = os.path.join(minion_instance.proc_dir,
+                        '{0}-{1}'.format(how, load['jid']))
+    with open(path, 'w') as fp_:
+        fp_.write(load['cmd'])
+    return True
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class WorkerReturnBatchTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(dir=integration.SYS_TMP_DIR)
+        self.minion = object.__new__(minion.Minion)
+        self.minion.opts = {'id': 'minion',
+                            'multiprocessing': True,
+                            'cache_jobs': False,
+                            'return_batch_delay': 0.05,
+                            'minion_workers': 1,
+                            'minion_worker_queue': 10,
+                            'minion_worker_timeout': 0,
+                            'minion_worker_recycle': 0}
+        self.minion.proc_dir = self.tmpdir
+        self.minion.functions = {}
+        self.minion.poller = None
+
+    def tearDown(self):
+        if self.minion.pool is not None:
+            self.minion.pool.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def test_worker_batches(self):
+        with patch.object(minion.Minion, '_thread_return',
+                          staticmethod(_return_job)):
+            with patch.object(
+                    minion.Minion, '_batch_return',
+                    lambda self, load: _mark(self, load, 'batched')):
+                with patch.object(
+                        minion.Minion, '_send_master',
+                        lambda self, load: _mark(self, load, 'sent')):
+                    self.minion._start_workers()
+                    self.assertEqual(self.minion._return_queue, [])
+                    pool = self.minion.pool
+                    self.assertTrue(pool.submit(
+                        {'jid': '1', 'fun': 'test.ping', 'arg': [],
+                         'ret': ''}))
+                    end = time.time() + 10
+                    while pool.workers[0]['data'] is not None \
+                            and time.time() < end:
+                        pool.process()
+                        time.sleep(0.05)
+        self.assertEqual(os.listdir(self.tmpdir), ['batched-1'])
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class PubHeaderTestCase(TestCase):
+
+    def setUp(self):
+        self.crypticle = salt.crypt.Crypticle(
+            {'serial': 'msgpack'}, salt.crypt.Crypticle.generate_key_string())
+        self.minion = object.__new__(minion.Minion)
+        self.minion.crypticle = self.crypticle
+        self.minion.matcher = minion.Matcher({'id': 'web1', 'grains': {}},
+                                             {})
+
+    def payload(self, tgt, **kwargs):
+        load = {'tgt': tgt, 'jid': '1', 'fun': 'test.ping', 'arg': []}
+        load.update(kwargs)
+        header = dict((key, load[key]) for key in ('tgt', 'jid', 'fun'))
+        return {'enc': 'aes',
+                'load': self.crypticle.dumps(load),
+                'header': self.crypticle.dumps(header)}
+
+    def test_header(self):
+        with patch.object(minion.Minion, '_handle_aes') as handle:
+            self.minion._handle_payload(self.payload('db*'))
+            self.assertFalse(handle.called)
+            self.minion._handle_payload(self.payload('web*'))
+            self.assertEqual(handle.call_count, 1)
+            # A payload without a header goes to _handle_aes like before
+            payload = self.payload('db*')
+            del payload['header']
+            self.minion._handle_payload(payload)
+            self.assertEqual(handle.call_count, 2)
+            # So does a header encrypted with another key
+            payload = self.payload('db*')
+            payload['header'] = salt.crypt.Crypticle(
+                {'serial': 'msgpack'},
+                salt.crypt.Crypticle.generate_key_string()).dumps({})
+            self.minion._handle_payload(payload)
+            self.assertEqual(handle.call_count, 3)
+
+    def test_load_not_decrypted(self):
+        with patch.object(self.crypticle, 'loads',
+                          side_effect=self.crypticle.loads) as loads:
+            self.minion._handle_payload(self.payload('db*', arg=['x' * 4096]))
+            self.assertEqual(loads.call_count, 1)
+            self.assertLess(len(loads.call_args[0][0]), 200)
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests(MinionTestCase, WorkerPoolTestCase, ReturnBatchTestCase,
+              PubHeaderTestCase, needs_daemon=False)
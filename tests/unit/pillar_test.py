@@ -9,6 +9,8 @@
     ~~~~~~~~~~~~~~~~~~~~~~
 '''
 
+import os
+import shutil
 import tempfile
 
 # Import Salt Testing libs
@@ -18,6 +20,7 @@ from salttesting.mock import NO_MOCK, NO_MOCK_REASON, MagicMock, patch
 ensure_in_syspath('../')
 
 # Import salt libs
+import integration
 import salt.pillar
 
 
@@ -173,3 +176,85 @@ ssh:
             }[sls]
 
         client.get_state.side_effect = get_state
+
+
+class PillarCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(dir=integration.SYS_TMP_DIR)
+        self.opts = {'pillar_roots': {'base': [self.tmpdir]},
+                     'pillar_cache_ttl': 3600,
+                     'pillar_cache_events': [],
+                     'renderer': 'yaml_jinja',
+                     'ext_pillar': []}
+        self.grains = {'os': 'Debian'}
+        self.cache = salt.pillar.PillarCache(self.opts)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, data):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'w') as fp_:
+            fp_.write(data)
+        return path
+
+    def test_minion(self):
+        self.write('top.sls', 'base: {}')
+        key = self.cache.key('web1', self.grains)
+        self.assertIsNone(self.cache.get(key))
+        self.cache.set(key, {'port': 80})
+        pillar = self.cache.get(key)
+        self.assertEqual(pillar, {'port': 80})
+        pillar['port'] = 8080
+        self.assertEqual(self.cache.get(key), {'port': 80})
+
+        self.assertNotEqual(self.cache.key('web2', self.grains), key)
+        self.assertNotEqual(self.cache.key('web1', {'os': 'RedHat'}), key)
+        self.assertNotEqual(self.cache.key('web1', self.grains, 'dev'), key)
+        # A new file in the pillar_roots changes the key
+        self.write('web.sls', 'port: 80')
+        self.cache.roots = (0, None)
+        self.assertNotEqual(self.cache.key('web1', self.grains), key)
+
+    def test_ttl(self):
+        key = self.cache.key('web1', self.grains)
+        self.cache.set(key, {'port': 80})
+        self.cache.minions[key] = (0, {'port': 80})
+        self.assertIsNone(self.cache.get(key))
+        self.cache.ttl = 0
+        self.assertEqual(self.cache.get(key), {'port': 80})
+
+    def test_sls(self):
+        plain = self.write('plain.sls', 'port: 80')
+        templated = self.write('templated.sls', 'os: {{ grains.os }}')
+        web1 = {'id': 'web1', 'grains': self.grains}
+        web2 = {'id': 'web2', 'grains': self.grains}
+        # The files without templating are shared by the minions
+        key = self.cache.sls_key(web1, plain, 'base', 'plain', {})
+        self.assertEqual(self.cache.sls_key(web2, plain, 'base', 'plain', {}),
+                         key)
+        self.assertNotEqual(
+            self.cache.sls_key(web1, plain, 'base', 'plain', {'a': 1}), key)
+        self.assertNotEqual(
+            self.cache.sls_key(web1, templated, 'base', 'templated', {}),
+            self.cache.sls_key(web2, templated, 'base', 'templated', {}))
+        self.assertIsNone(
+            self.cache.sls_key(web1, plain + '.missing', 'base', 'plain', {}))
+
+        # A templated file is rendered again when a file it may import
+        # changes, a plain file is not
+        templated_key = self.cache.sls_key(web1, templated, 'base',
+                                           'templated', {})
+        self.write('map.jinja', '{% set port = 80 %}')
+        self.cache.roots = (0, None)
+        self.assertNotEqual(
+            self.cache.sls_key(web1, templated, 'base', 'templated', {}),
+            templated_key)
+        self.assertEqual(self.cache.sls_key(web1, plain, 'base', 'plain', {}),
+                         key)
+
+        self.cache.set_sls(key, {'port': 80})
+        self.assertEqual(self.cache.get_sls(key), {'port': 80})
+        self.cache.clear()
+        self.assertIsNone(self.cache.get_sls(key))
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.returners.local_cache_test
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Test the sqlite3 backed master job cache
+'''
+
+# Import python libs
+import os
+import shutil
+import datetime
+import tempfile
+
+# Import Salt Testing libs
+from salttesting import TestCase
+from salttesting.helpers import ensure_in_syspath
+ensure_in_syspath('../../')
+
+# Import salt libs
+import integration
+from salt.returners import local_cache
+
+
+class LocalCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(dir=integration.SYS_TMP_DIR)
+        local_cache.__opts__ = {'cachedir': self.tmpdir, 'keep_jobs': 24}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_job(self):
+        jid = local_cache.prep_jid()
+        load = {'jid': jid, 'fun': 'test.ping', 'arg': [], 'tgt': '*'}
+        local_cache.save_load(jid, load)
+        local_cache.save_minions(jid, ['web1', 'web2'])
+        self.assertEqual(
+            local_cache.get_load(jid), dict(load, Minions=['web1', 'web2']))
+        self.assertEqual(local_cache.get_jids(), {jid: load})
+
+        local_cache.returner({'jid': jid, 'id': 'web1', 'return': True})
+        local_cache.returner_batch([
+            {'jid': jid, 'id': 'web2', 'return': {'a': 1}, 'out': 'nested'}])
+        self.assertEqual(
+            local_cache.get_jid(jid),
+            {'web1': {'return': True},
+             'web2': {'return': {'a': 1}, 'out': 'nested'}})
+
+        # A second return from the same minion is a replay
+        self.assertFalse(
+            local_cache.returner({'jid': jid, 'id': 'web1', 'return': False}))
+        self.assertTrue(local_cache.get_jid(jid)['web1']['return'])
+        # Returns for unknown jobs are dropped
+        self.assertFalse(
+            local_cache.returner({'jid': '1', 'id': 'web1', 'return': 1}))
+
+    def test_nocache(self):
+        jid = local_cache.prep_jid(nocache=True)
+        self.assertIsNone(
+            local_cache.returner({'jid': jid, 'id': 'web1', 'return': True}))
+        self.assertEqual(local_cache.get_jid(jid), {})
+
+    def test_clean_old_jobs(self):
+        old = '{0:%Y%m%d%H%M%S%f}'.format(
+            datetime.datetime.now() - datetime.timedelta(hours=25))
+        new = local_cache.prep_jid()
+        for jid in (old, new):
+            local_cache.save_load(jid, {'jid': jid})
+            local_cache.returner({'jid': jid, 'id': 'web1', 'return': True})
+        legacy = os.path.join(self.tmpdir, 'jobs', 'ab', 'cdef')
+        os.makedirs(legacy)
+
+        local_cache.clean_old_jobs()
+        self.assertEqual(local_cache.get_jids().keys(), [new])
+        self.assertEqual(local_cache.get_jid(old), {})
+        self.assertEqual(local_cache.get_jid(new).keys(), ['web1'])
+        self.assertFalse(os.path.exists(os.path.dirname(legacy)))
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests(LocalCacheTestCase, needs_daemon=False)
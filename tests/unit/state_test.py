@@ -0,0 +1,359 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.state_test
+    ~~~~~~~~~~~~~~~~~~~~~
+'''
+
+# Import python libs
+import imp
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Import Salt Testing libs
+from salttesting import TestCase, skipIf
+from salttesting.helpers import ensure_in_syspath
+from salttesting.mock import patch, NO_MOCK, NO_MOCK_REASON
+ensure_in_syspath('../')
+
+# Import Salt libs
+import integration
+import salt.state
+import salt.utils
+
+STATE_MODULE = '''
+import os
+import time
+
+__parallel__ = ['sleep']
+
+
+def sleep(name, length=0.3):
+    start = time.time()
+    time.sleep(length)
+    return {'name': name,
+            'result': True,
+            'changes': {},
+            'comment': '{0} {1} {2}'.format(os.getpid(), start, time.time())}
+
+
+def fail(name):
+    return {'name': name,
+            'result': False,
+            'changes': {},
+            'comment': str(os.getpid())}
+'''
+
+
+def _low(name, fun='sleep', **kwargs):
+    low = {'state': 'partest',
+           'fun': fun,
+           'name': name,
+           '__id__': name,
+           '__sls__': 'partest',
+           '__env__': 'base'}
+    low.update(kwargs)
+    return low
+
+
+def _tag(name, fun='sleep'):
+    return 'partest_|-{0}_|-{0}_|-{1}'.format(name, fun)
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+@skipIf(salt.utils.is_windows(), 'States only run in parallel with fork')
+class ParallelStateTestCase(TestCase):
+
+    def setUp(self):
+        mod = imp.new_module('salt.loaded.int.states.partest')
+        exec STATE_MODULE in mod.__dict__
+        sys.modules[mod.__name__] = mod
+        with patch.object(salt.state.State, '_gather_pillar',
+                          return_value={}), \
+                patch.object(salt.state.State, 'load_modules'):
+            self.state = salt.state.State(
+                {'grains': {}, 'id': 'minion', 'failhard': False,
+                 'test': False, 'state_workers': 4})
+        self.state.functions = {}
+        self.state.states = {'partest.sleep': mod.sleep,
+                             'partest.fail': mod.fail}
+
+    def tearDown(self):
+        sys.modules.pop('salt.loaded.int.states.partest', None)
+
+    def test_parallel(self):
+        chunks = [_low('a'), _low('b'), _low('c'),
+                  _low('d', require=[{'partest': 'a'}])]
+        start = time.time()
+        running = self.state.call_chunks(chunks)
+        self.assertLess(time.time() - start, 1.0)
+        self.assertEqual(
+            dict((tag, ret['__run_num__']) for tag, ret in running.items()),
+            {_tag('a'): 0, _tag('b'): 1, _tag('c'): 2, _tag('d'): 3})
+        rets = dict((tag, ret['comment'].split())
+                    for tag, ret in running.items())
+        for tag in rets:
+            self.assertNotEqual(int(rets[tag][0]), os.getpid())
+        # d starts once a is done
+        self.assertGreaterEqual(float(rets[_tag('d')][1]),
+                                float(rets[_tag('a')][2]))
+
+    def test_serialized(self):
+        chunks = [_low('x', fun='fail'),
+                  _low('y', require=[{'partest': 'x'}])]
+        running = self.state.call_chunks(chunks)
+        # fail is not parallel safe, it runs in this process
+        self.assertEqual(running[_tag('x', 'fail')]['comment'],
+                         str(os.getpid()))
+        self.assertEqual(running[_tag('y')]['comment'],
+                         'One or more requisite failed')
+
+    def test_failhard(self):
+        chunks = [_low('x', fun='fail', failhard=True),
+                  _low('y', require=[{'partest': 'x'}]),
+                  _low('z')]
+        running = self.state.call_chunks(chunks)
+        self.assertFalse(running[_tag('x', 'fail')]['result'])
+        self.assertNotIn(_tag('y'), running)
+        self.assertTrue(running[_tag('z')]['result'])
+
+    def test_dispatch(self):
+        self.state.opts['state_workers'] = 2
+        chunks = [_low('a', length=0.1), _low('b', length=0.1),
+                  _low('c', length=0.1), _low('x', fun='fail'),
+                  _low('d', length=0.1, require=[{'partest': 'a'}])]
+        with patch.object(self.state, 'check_requisite',
+                          wraps=self.state.check_requisite) as check:
+            running = self.state.call_chunks(chunks)
+        # The requisites of every chunk are checked once, when it starts
+        self.assertEqual(check.call_count, len(chunks))
+        self.assertEqual(len(running), len(chunks))
+
+    def test_order(self):
+        chunks = [_low('first', order=1), _low('a', order=10000),
+                  _low('b', order=10001), _low('last', order=1000101)]
+        running = self.state.call_chunks(chunks)
+        rets = dict((tag, [float(num) for num in ret['comment'].split()[1:]])
+                    for tag, ret in running.items())
+        # The automatic orders run in parallel, between the explicit ones
+        self.assertLess(rets[_tag('a')][0], rets[_tag('b')][1])
+        self.assertLess(rets[_tag('b')][0], rets[_tag('a')][1])
+        for name in ('a', 'b'):
+            self.assertGreaterEqual(rets[_tag(name)][0],
+                                    rets[_tag('first')][1])
+            self.assertGreaterEqual(rets[_tag('last')][0],
+                                    rets[_tag(name)][1])
+
+    def test_order_requisite(self):
+        # A requisite runs before the chunk requiring it whatever its order
+        chunks = [_low('x', order=1, require=[{'partest': 'y'}]),
+                  _low('a', order=10000),
+                  _low('y', order=1000101)]
+        running = self.state.call_chunks(chunks)
+        self.assertEqual(
+            dict((tag, ret['__run_num__']) for tag, ret in running.items()),
+            {_tag('y'): 0, _tag('x'): 1, _tag('a'): 2})
+        rets = dict((tag, [float(num) for num in ret['comment'].split()[1:]])
+                    for tag, ret in running.items())
+        self.assertGreaterEqual(rets[_tag('x')][0], rets[_tag('y')][1])
+        self.assertGreaterEqual(rets[_tag('a')][0], rets[_tag('x')][1])
+
+    def test_serial(self):
+        self.state.opts['state_workers'] = 1
+        with patch.object(salt.state.State, 'call_chunks_parallel') as par:
+            running = self.state.call_chunks([_low('a', length=0)])
+            self.assertFalse(par.called)
+        self.assertTrue(running[_tag('a')]['result'])
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class RequisiteIndexTestCase(TestCase):
+
+    def setUp(self):
+        self.chunks = []
+        for num in range(20):
+            self.chunks.append({'state': ('pkg', 'file')[num % 2],
+                                'fun': 'installed',
+                                'name': 'name{0}'.format(num),
+                                '__id__': 'id{0}'.format(num % 10),
+                                '__sls__': 'sls{0}'.format(num % 3)})
+        self.chunks.append({'state': 'file',
+                            'fun': 'managed',
+                            'name': 'sls1',
+                            '__id__': 'conf',
+                            '__sls__': 'sls1'})
+        self.index = salt.state.RequisiteIndex(self.chunks)
+
+    def test_match(self):
+        for req_key, req_val in (('pkg', 'id4'), ('file', 'name7'),
+                                 ('file', 'id4'), ('sls', 'sls1'),
+                                 ('pkg', 'id*'), ('sls', 'sls[12]'),
+                                 ('file', 'missing'), ('file', 'sls1')):
+            self.assertEqual(self.index.match(req_key, req_val),
+                             self.index._scan(req_key, req_val))
+        self.assertEqual(
+            [chunk['name'] for chunk in self.index.match('pkg', 'id4')],
+            ['name4', 'name14'])
+        # The chunk named after the sls is not matched by it
+        self.assertNotIn(self.chunks[-1], self.index.match('sls', 'sls1'))
+        self.assertEqual(self.index.match('pkg', None), [])
+
+    def test_no_sls(self):
+        # The high data of state.high and of the template strings has no sls
+        chunks = [{'state': 'test', 'fun': 'succeed_without_changes',
+                   'name': 'a', '__id__': 'a'}]
+        index = salt.state.RequisiteIndex(chunks)
+        self.assertEqual(index.match('test', 'a'), chunks)
+        self.assertEqual(index.match('sls', 'a'), [])
+
+    def test_exact_lookup(self):
+        with patch('fnmatch.fnmatch') as fnmatch:
+            self.index.match('file', 'name7')
+            self.assertFalse(fnmatch.called)
+
+    def test_find_name(self):
+        high = {'vim': {'pkg': ['installed', {'name': 'vim-enhanced'}]},
+                'conf': {'file': ['managed', {'name': '/etc/vimrc'}]}}
+        index = salt.state.name_index(high)
+        for name, state in (('vim-enhanced', 'pkg'), ('/etc/vimrc', 'file'),
+                            ('conf', 'file'), ('missing', 'pkg'),
+                            ('/etc/vimrc', 'pkg')):
+            self.assertEqual(salt.state.find_name(name, state, high, index),
+                             salt.state.find_name(name, state, high))
+
+
+class FakeClient(object):
+    '''
+    Serve the salt:// files from a directory and count the requests
+    '''
+    def __init__(self, root):
+        self.root = root
+        self.requests = 0
+
+    def get_files(self, paths, saltenv='base'):
+        self.requests += 1
+        ret = []
+        for path in paths:
+            dest = os.path.join(self.root, path[len('salt://'):])
+            ret.append(dest if os.path.isfile(dest) else '')
+        return ret
+
+    def is_cached(self, path, saltenv='base'):
+        dest = os.path.join(self.root, path[len('salt://'):])
+        return dest if os.path.isfile(dest) else ''
+
+
+class RenderCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(dir=integration.SYS_TMP_DIR)
+        self.roots = os.path.join(self.tmpdir, 'roots')
+        os.makedirs(os.path.join(self.roots, 'web'))
+        self.write('web/init.sls', '#!jinja|yaml\nnginx: {pkg: [installed]}')
+        self.write('web/map.jinja', '{% set port = 80 %}')
+        self.opts = {'cachedir': self.tmpdir,
+                     'pillar': {'port': 80},
+                     'grains': {'os': 'Debian'},
+                     'jid': '1'}
+        self.state = {'nginx': {'pkg': ['installed'], '__sls__': 'web'}}
+        self.files = [['base', 'salt://web/init.sls'],
+                      ['base', 'salt://web.sls'],
+                      ['base', 'salt://web/map.jinja']]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, path, data):
+        with salt.utils.fopen(os.path.join(self.roots, path), 'w') as fp_:
+            fp_.write(data)
+
+    def cache(self):
+        self.client = FakeClient(self.roots)
+        return salt.state.RenderCache(self.opts, self.client)
+
+    def test_key(self):
+        cache = self.cache()
+        key = cache.key(self.opts)
+        self.assertEqual(cache.key(dict(self.opts, jid='2')), key)
+        self.assertNotEqual(
+            cache.key(dict(self.opts, pillar={'port': 8080})), key)
+        self.assertNotEqual(cache.key(self.opts, matches={'base': ['web']}),
+                            key)
+
+    def test_sls(self):
+        cache = self.cache()
+        key = cache.key(self.opts)
+        self.assertIsNone(cache.get_sls('base', 'web', key))
+        cache.set_sls('base', 'web', key, self.files, self.state)
+        cache.save()
+
+        cache = self.cache()
+        state = cache.get_sls('base', 'web', key)
+        self.assertEqual(state, self.state)
+        # The files are refreshed in one request and hashed once
+        self.assertEqual(self.client.requests, 1)
+        state['nginx']['pkg'].append('removed')
+        self.assertEqual(cache.get_sls('base', 'web', key), self.state)
+        self.assertEqual(self.client.requests, 1)
+        self.assertIsNone(cache.get_sls('base', 'web', 'other'))
+
+        # A change in an imported template renders the SLS file again
+        self.write('web/map.jinja', '{% set port = 8080 %}')
+        self.assertIsNone(self.cache().get_sls('base', 'web', key))
+        # So does a file which now shadows init.sls
+        self.write('web/map.jinja', '{% set port = 80 %}')
+        self.assertEqual(self.cache().get_sls('base', 'web', key), self.state)
+        self.write('web.sls', '{}')
+        self.assertIsNone(self.cache().get_sls('base', 'web', key))
+
+    def test_chunks(self):
+        chunks = [{'state': 'pkg', 'fun': 'installed', 'name': 'nginx',
+                   '__id__': 'nginx', '__sls__': 'web', '__env__': 'base'}]
+        cache = self.cache()
+        cache.set_sls('base', 'web', 'sls', self.files, self.state)
+        cache.set_chunks('run', chunks)
+        cache.save()
+        self.assertEqual(self.cache().get_chunks('run'), chunks)
+        self.assertIsNone(self.cache().get_chunks('other'))
+        self.write('web/init.sls', '#!jinja|yaml\n{}')
+        self.assertIsNone(self.cache().get_chunks('run'))
+
+        # A SLS file rendered without the cache keeps the chunks out
+        cache = self.cache()
+        cache.run_files = None
+        cache.set_chunks('run', chunks)
+        self.assertFalse(cache.changed)
+
+    def test_calls_modules(self):
+        cache = self.cache()
+        self.assertFalse(cache.calls_modules(self.files))
+        for template in ("{% set lb = salt['mine.get']('*', 'ip') %}",
+                         "{{ salt.cmd.run('hostname') }}",
+                         "{{ __salt__['file.file_exists']('/etc') }}"):
+            self.write('web/map.jinja', template)
+            self.assertTrue(cache.calls_modules(self.files))
+        self.write('web/map.jinja',
+                   "{% set url = 'salt://web/nginx.conf' %}"
+                   "{% set host = 'master.salt.example.com' %}")
+        self.assertFalse(cache.calls_modules(self.files))
+        self.assertFalse(cache.file_calls_modules(
+            os.path.join(self.roots, 'missing')))
+
+    def test_render_pipe(self):
+        fn_ = os.path.join(self.roots, 'web', 'init.sls')
+        self.assertEqual(salt.state.render_pipe(fn_, 'yaml_jinja'),
+                         ['jinja', 'yaml'])
+        self.write('web/init.sls', 'nginx: {}')
+        self.assertEqual(salt.state.render_pipe(fn_, 'yaml_jinja'),
+                         ['jinja', 'yaml'])
+        self.write('web/init.sls', '#!pydsl\n')
+        self.assertEqual(salt.state.render_pipe(fn_, 'yaml_jinja'),
+                         ['pydsl'])
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests(ParallelStateTestCase, RequisiteIndexTestCase,
+              RenderCacheTestCase, needs_daemon=False)
@@ -35,8 +35,9 @@ if getattr(zmq, 'IPC_PATH_MAX_LEN', 103) <= 103:
 
 
 @contextmanager
-def eventpublisher_process():
-    proc = event.EventPublisher({'sock_dir': SOCK_DIR})
+def eventpublisher_process(shards=()):
+    proc = event.EventPublisher({'sock_dir': SOCK_DIR,
+                                 'master_event_shards': list(shards)})
     proc.start()
     try:
         if os.environ.get('TRAVIS_PYTHON_VERSION', None) is not None:
@@ -274,6 +275,45 @@ class TestSaltEvent(TestCase):
                 evt = me.get_event(tag='testevents')
                 self.assertGotEvent(evt, {'data': '{0}'.format(i)}, 'Event {0}'.format(i))
 
+    def test_event_tag_subscription(self):
+        '''Test the events of the other tags are not received'''
+        with eventpublisher_process():
+            me = event.MasterEvent(sock_dir=SOCK_DIR)
+            self.assertTrue(me.subscribe('evt1'))
+            self.assertFalse(me.subscribe('evt1'))
+            me.unsubscribe('')
+            self.assertEqual(me.subscriptions, set(['evt1']))
+            # Let the subscriptions reach the publisher
+            time.sleep(0.5)
+            me.fire_event({'data': 'foo2'}, 'evt2')
+            me.fire_event({'data': 'foo1'}, 'evt1')
+            evt1 = me.get_event(tag='evt1')
+            self.assertGotEvent(evt1, {'data': 'foo1'})
+            self.assertEqual(me.pending_events, [])
+
+    def test_event_shard(self):
+        '''Test the events of a shard are received from its socket'''
+        with eventpublisher_process(shards=['salt/job/']):
+            me = event.MasterEvent(sock_dir=SOCK_DIR, shards=['salt/job/'])
+            self.assertEqual(me.suburi, me.puburi)
+            me.subscribe('salt/job/1')
+            me.unsubscribe('')
+            self.assertEqual(me.suburi,
+                             event.shard_uri(SOCK_DIR, 'salt/job/'))
+            time.sleep(0.5)
+            me.fire_event({'data': 'foo2'}, 'salt/auth')
+            me.fire_event({'data': 'foo1'}, 'salt/job/1/ret/minion')
+            evt1 = me.get_event(tag='salt/job/1')
+            self.assertGotEvent(evt1, {'data': 'foo1'})
+            self.assertEqual(me.pending_events, [])
+            # A subscription outside of the shard moves back to every event
+            me.subscribe('salt/auth')
+            self.assertEqual(me.suburi, me.puburi)
+            time.sleep(0.5)
+            me.fire_event({'data': 'foo2'}, 'salt/auth')
+            evt2 = me.get_event(tag='salt/auth')
+            self.assertGotEvent(evt2, {'data': 'foo2'})
+
 
 if __name__ == '__main__':
     from integration import run_tests
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.utils.minions_test
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Test the in-memory minion registry used for targeting
+'''
+
+# Import python libs
+import os
+import shutil
+import tempfile
+
+# Import Salt Testing libs
+from salttesting import TestCase
+from salttesting.helpers import ensure_in_syspath
+ensure_in_syspath('../../')
+
+# Import salt libs
+import integration
+import salt.payload
+import salt.utils
+import salt.utils.minions
+
+
+class MinionRegistryTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(dir=integration.SYS_TMP_DIR)
+        self.opts = {'pki_dir': os.path.join(self.tmpdir, 'pki'),
+                     'cachedir': os.path.join(self.tmpdir, 'cache'),
+                     'minion_data_cache': True}
+        os.makedirs(os.path.join(self.opts['pki_dir'], 'minions'))
+        os.makedirs(os.path.join(self.opts['cachedir'], 'minions'))
+        self.registry = salt.utils.minions.MinionRegistry(self.opts)
+        # Trust every mtime, the tests write faster than a second
+        self.registry.fresh = 0
+        for id_, os_ in (('web1', 'Ubuntu'), ('web2', 'CentOS'), ('db1', 'Ubuntu')):
+            self._accept(id_)
+            self.registry.store(
+                id_,
+                {'os': os_, 'ipv4': ['10.0.0.{0}'.format(len(id_))]},
+                {'role': id_[:-1]})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _accept(self, id_):
+        path = os.path.join(self.opts['pki_dir'], 'minions', id_)
+        with salt.utils.fopen(path, 'w+') as fp_:
+            fp_.write('')
+
+    def test_store(self):
+        datap = os.path.join(self.opts['cachedir'], 'minions', 'web1', 'data.p')
+        self.assertTrue(os.path.isfile(datap))
+        self.assertEqual(self.registry.minions(), set(['web1', 'web2', 'db1']))
+        self.assertEqual(
+            dict(self.registry.items('grains'))['web2']['os'], 'CentOS')
+
+    def test_refresh_from_disk(self):
+        other = salt.utils.minions.MinionRegistry(self.opts)
+        other.fresh = 0
+        self.assertEqual(dict(other.items('pillar'))['db1'], {'role': 'db'})
+        self.registry.store('db1', {'os': 'Debian'}, {'role': 'db'})
+        self.assertEqual(dict(other.items('grains'))['db1']['os'], 'Debian')
+        os.remove(os.path.join(self.opts['pki_dir'], 'minions', 'web2'))
+        self.assertEqual(other.minions(), set(['web1', 'db1']))
+        self.assertNotIn('web2', dict(other.items('grains')))
+
+    def test_check_minions(self):
+        ckminions = salt.utils.minions.CkMinions(self.opts)
+        self.assertEqual(
+            sorted(ckminions.check_minions('os:Ubuntu', 'grain')),
+            ['db1', 'web1'])
+        self.assertEqual(
+            ckminions.check_minions('role:db', 'pillar'), ['db1'])
+        self.assertEqual(
+            sorted(ckminions.check_minions('web*', 'glob')), ['web1', 'web2'])
+        self.assertEqual(
+            sorted(ckminions.check_minions('10.0.0.4', 'ipcidr')),
+            ['web1', 'web2'])
+        self.assertEqual(
+            ckminions.check_minions('G@os:Ubuntu and web*', 'compound'),
+            ['web1'])
+        self.assertEqual(
+            ckminions.check_minions('G@os:Ubuntu and not I@role:web', 'compound'),
+            ['db1'])
+
+
+class MinionIndexTestCase(TestCase):
+
+    grains = {
+        'm1': {'os': 'Ubuntu', 'roles': ['web', 'db'], 'num_cpus': 4,
+               'ipv4': ['127.0.0.1', '10.0.1.5'],
+               'dc': {'name': 'east', 'rack': 'r1'},
+               'disks': [{'name': 'sda'}]},
+        'm2': {'os': 'CentOS', 'roles': ['db'], 'num_cpus': 8,
+               'ipv4': ['10.0.2.7'], 'dc': {'name': 'west'}},
+        'm3': {'os': 'ubuntu', 'roles': [], 'virtual': True, 'dc': {},
+               'ipv4': ['192.168.0.1']},
+    }
+
+    def setUp(self):
+        self.index = salt.utils.minions.MinionIndex()
+        self.cidr = salt.utils.minions.CidrIndex()
+        for id_, grains in self.grains.items():
+            self.index.add(id_, grains)
+            self.cidr.add(id_, grains['ipv4'])
+
+    def _scan(self, expr, regex_match=False):
+        return set(id_ for id_, grains in self.grains.items()
+                   if salt.utils.subdict_match(
+                       grains, expr, regex_match=regex_match))
+
+    def test_match_like_subdict_match(self):
+        for expr in ('os:Ubuntu', 'os:ubu*', 'os:*OS', 'roles:db', 'roles:w?b',
+                     'num_cpus:8', 'virtual:true', 'dc:name:east', 'dc:*',
+                     'dc:name:*', 'missing:foo', 'os:De[bv]ian', 'os'):
+            self.assertEqual(self.index.match(expr), self._scan(expr), expr)
+        self.assertEqual(self.index.match('os:cent.*', regex_match=True),
+                         self._scan('os:cent.*', regex_match=True))
+
+    def test_opaque_falls_back(self):
+        self.assertIs(self.index.match('disks:name:sda'), None)
+
+    def test_remove(self):
+        self.index.add('m1', {'os': 'Debian'})
+        self.assertEqual(self.index.match('os:ubuntu'), set(['m3']))
+        self.index.remove('m3')
+        self.assertEqual(self.index.match('os:ubuntu'), set())
+        self.assertEqual(self.index.match('os:debian'), set(['m1']))
+
+    def test_cidr(self):
+        self.assertEqual(self.cidr.match('10.0.0.0/16'), set(['m1', 'm2']))
+        self.assertEqual(self.cidr.match('10.0.2.0/24'), set(['m2']))
+        self.assertEqual(self.cidr.match('192.168.0.1'), set(['m3']))
+        self.assertEqual(self.cidr.match('10.0.2.1/16'), set())
+        self.assertIs(self.cidr.match('10.0/16'), None)
+        self.cidr.remove('m2')
+        self.assertEqual(self.cidr.match('10.0.0.0/16'), set(['m1']))
+
+    def test_eval_set_expr(self):
+        one, two, three = set([1, 2]), set([2, 3]), set([3, 4])
+        self.assertEqual(
+            salt.utils.minions._eval_set_expr([one, '|', two, '&', three]),
+            one | two & three)
+        self.assertEqual(
+            salt.utils.minions._eval_set_expr(
+                ['(', one, '|', two, ')', '&', '(', three, '-', two, ')']),
+            set())
+        self.assertRaises(
+            ValueError, salt.utils.minions._eval_set_expr, [one, two])
+
+
+class ExactTargetTestCase(TestCase):
+
+    def test_exact_target(self):
+        for expr, expr_form in (('web1', 'glob'), (['web1', 'db1'], 'list'),
+                                ('web1,db1', 'list')):
+            self.assertTrue(
+                salt.utils.minions.exact_target(expr, expr_form))
+        for expr, expr_form in (('web*', 'glob'), ('web[12]', 'glob'),
+                                ('web1', 'pcre'), ('os:Ubuntu', 'grain'),
+                                ('L@web1 or db1', 'compound')):
+            self.assertFalse(
+                salt.utils.minions.exact_target(expr, expr_form))
+
+    def test_topics(self):
+        topic = salt.payload.pub_topic('web1')
+        self.assertEqual(topic, salt.payload.pub_topic('web1'))
+        self.assertNotEqual(topic, salt.payload.pub_topic('web10'))
+        # A minion subscribed to its topic never gets the jobs of another
+        # minion whose topic starts with the same characters
+        self.assertFalse(salt.payload.pub_topic('web10').startswith(topic))
+        self.assertFalse(topic.startswith(salt.payload.BROADCAST_TOPIC))
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests(MinionRegistryTestCase, MinionIndexTestCase, ExactTargetTestCase,
+              needs_daemon=False)
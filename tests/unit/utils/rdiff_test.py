@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.utils.rdiff_test
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~
+'''
+
+# Import python libs
+from StringIO import StringIO
+
+# Import Salt Testing libs
+from salttesting import TestCase
+from salttesting.helpers import ensure_in_syspath
+ensure_in_syspath('../../')
+
+# Import salt libs
+from salt.utils import rdiff
+
+
+class RdiffTestCase(TestCase):
+
+    def setUp(self):
+        self.old = ''.join(chr(num % 251) for num in range(20000))
+
+    def _patch(self, new):
+        bsize = rdiff.block_size(len(self.old))
+        sig = rdiff.signature(StringIO(self.old), bsize)
+        ops = rdiff.delta(new, sig, bsize)
+        out = StringIO()
+        rdiff.patch(StringIO(self.old), ops, bsize, out)
+        self.assertEqual(out.getvalue(), new)
+        return ops
+
+    def test_unchanged(self):
+        ops = self._patch(self.old)
+        self.assertEqual(ops, range(len(self.old) // 700) + [self.old[19600:]])
+
+    def test_insert(self):
+        new = self.old[:5000] + 'inserted' + self.old[5000:]
+        ops = self._patch(new)
+        literal = sum(len(op_) for op_ in ops if isinstance(op_, str))
+        # The block holding the change and the short tail
+        self.assertTrue(literal < 2 * 700 + len('inserted'))
+
+    def test_unrelated(self):
+        self.assertEqual(self._patch('new data'), ['new data'])
+        self.assertEqual(self._patch(''), [])
+
+    def test_block_size(self):
+        self.assertEqual(rdiff.block_size(0), rdiff.MIN_BLOCK_SIZE)
+        self.assertEqual(rdiff.block_size(2 ** 24), 4096)
+        self.assertEqual(rdiff.block_size(2 ** 40), rdiff.MAX_BLOCK_SIZE)
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests(RdiffTestCase, needs_daemon=False)